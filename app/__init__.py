@@ -1,12 +1,41 @@
-from flask import Flask
-from app.audio import audio_bp
-from app.video import video_bp
+from flask import Flask, jsonify
 
 def create_app():
-    
+    # Imported here so the model-free modules (vector store, caches, pipeline,
+    # ...) can be imported, and tested, without torch and the model packages
+    from app.audio import audio_bp
+    from app.video import video_bp
+    from app.config import Config
+    from app.models import load_models
+    from app.jobs import job_queue
+    from app.cache import embedding_cache, query_cache
+    from app.uploads import StreamingRequest
+    from app import metrics
+
     app = Flask(__name__)
+    # File parts are spooled once while the body is parsed, see app.uploads
+    app.request_class = StreamingRequest
     
     app.register_blueprint(audio_bp, url_prefix='/audio')
     app.register_blueprint(video_bp, url_prefix='/video')
+
+    # Stage histograms, counters and in-flight gauges on /metrics
+    metrics.init_app(app)
+
+    @app.route('/cache/stats', methods=['GET'])
+    def cache_stats():
+        return jsonify({"status": "success", "data": {
+            "embedding_cache": embedding_cache.stats(),
+            "query_cache": query_cache.stats()
+        }}), 200
+
+    # Load the models up front so the first request doesn't pay for it,
+    # otherwise they are loaded lazily on first use
+    if Config.PRELOAD_MODELS:
+        load_models()
+
+    # Start processing queued ingest jobs, including the ones interrupted by a restart
+    if Config.START_JOB_WORKERS:
+        job_queue.start()
     
     return app
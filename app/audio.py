@@ -1,18 +1,52 @@
 import os
 import json
-import boto3
 import logging
-import tempfile
 import mimetypes
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 
-from app.utils import get_pinecone_index, convert_audio_to_wav, get_embedding
+from app.utils import get_audio_embedding, get_audio_embeddings, iter_query_results, iter_segment_embeddings
+from app.vector_store import get_vector_index
 from app.config import Config
+from app.upsert_buffer import UpsertBuffer, UploadGate
+from app.jobs import job_queue
+from app.storage import storage, upload_async
+from app.uploads import save_upload, remove_uploads
+from app.ingest_pool import run_ingest_tasks
+from app.cache import CachedIndex, query_cache
+from app.pipeline import batched
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 audio_bp = Blueprint('audio', __name__)
-index = get_pinecone_index(Config.PINECONE_API_KEY, Config.PINECONE_AUDIO_INDEX)
+# Queries go through the search result cache, upserts invalidate the namespace they write to
+index = CachedIndex(
+    get_vector_index(Config.PINECONE_AUDIO_INDEX),
+    Config.PINECONE_AUDIO_INDEX,
+    query_cache
+)
+
+
+def format_audio_matches(query_results):
+    """Extract audio matches ensuring serializable format and filter by score"""
+    audio_matches = []
+    for match in query_results["matches"]:
+        if match["score"] * 100 < 50:  # Convert score to percentage and check
+            continue
+
+        audio_match = {
+            "speaker": match["metadata"].get("speaker", ""),
+            "file_name": match["metadata"].get("file_name", ""),
+            "score": match["score"],
+            "link": match["metadata"].get("link", "")
+        }
+
+        # Time offsets of the matching segment, for recordings ingested in windowed mode
+        if "start" in match["metadata"]:
+            audio_match["start"] = match["metadata"]["start"]
+            audio_match["end"] = match["metadata"].get("end")
+
+        audio_matches.append(audio_match)
+    return audio_matches
 
 
 @audio_bp.route('/search', methods=['POST'])
@@ -30,38 +64,18 @@ def search_audio():
 
         top_k = int(request.form.get('top_k', 3))
         
-        # Save the file to a temporary location
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            file.save(temp_file.name)
-            audio_file_path = temp_file.name
+        # Decode the upload in memory and get embedding, served from the embedding cache for repeated clips
+        embedding = get_audio_embedding(file.read())
         
-        try:
-            # Convert to WAV and get embedding
-            wav_file = convert_audio_to_wav(audio_file_path)
-            embedding = get_embedding(wav_file)
-            
-            # Query Pinecone index
-            query_results = index.query(
-                namespace="processed-audio",
-                vector=embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
-            
-            os.remove(wav_file)
-        finally:
-            os.remove(audio_file_path)
+        # Query Pinecone index
+        query_results = index.query(
+            namespace="processed-audio",
+            vector=embedding,
+            top_k=top_k,
+            include_metadata=True
+        )
         
-        # Extract audio matches ensuring serializable format and filter by score
-        audio_matches = [
-            {
-                "speaker": match["metadata"].get("speaker", ""),
-                "file_name": match["metadata"].get("file_name", ""),
-                "score": match["score"],
-                "link": match["metadata"].get("link", "")
-            }
-            for match in query_results["matches"] if match["score"] * 100 >= 50  # Convert score to percentage and check
-        ]
+        audio_matches = format_audio_matches(query_results)
 
         # If no matches meet the threshold, respond with "no match found"
         if not audio_matches:
@@ -85,8 +99,169 @@ def search_audio():
         return jsonify({"status": "failed", "error": str(e)}), 500
 
 
-# Create an S3 client
-s3 = boto3.client('s3')
+@audio_bp.route('/search/batch', methods=['POST'])
+def search_audio_batch():
+    """Searches many audio files in one request, streaming one NDJSON line per file as its results are ready"""
+    try:
+        if 'files' not in request.files:
+            return jsonify({"status": "error", "message": "No files provided"}), 400
+
+        files = request.files.getlist('files')
+
+        # Check if the files are audio files based on their MIME type
+        for file in files:
+            mime_type, _ = mimetypes.guess_type(file.filename)
+            if not mime_type or not mime_type.startswith('audio'):
+                return jsonify({"status": "error", "message": f"Invalid file type for '{file.filename}'. Only audio files are allowed."}), 400
+
+        top_k = int(request.form.get('top_k', 3))
+
+        # Read the uploads before the response starts streaming, they are decoded in memory
+        inputs = [(file.filename, file.read()) for file in files]
+    except Exception as e:
+        logging.error(f"Error during batch audio search: {e}")
+        return jsonify({"status": "failed", "error": str(e)}), 500
+
+    def generate():
+        try:
+            # Convert and embed a batch of files, then fan out all of its queries at once
+            for chunk in batched(inputs, Config.SPEAKER_EMBED_BATCH_SIZE):
+                embeddings = get_audio_embeddings([data for _, data in chunk])
+
+                for (file_name, _), embedding in zip(chunk, embeddings):
+                    if embedding is None:
+                        yield json.dumps({"file_name": file_name, "status": "failed", "error": "Audio conversion failed. Please check the input format."}) + "\n"
+
+                embedded = [(file_name, embedding) for (file_name, _), embedding in zip(chunk, embeddings) if embedding is not None]
+                for position, results in iter_query_results(index, [[embedding] for _, embedding in embedded], ["processed-audio"], top_k):
+                    file_name = embedded[position][0]
+                    if isinstance(results, Exception):
+                        line = {"file_name": file_name, "status": "failed", "error": str(results)}
+                    else:
+                        audio_matches = format_audio_matches(results[0]["processed-audio"])
+                        line = {"file_name": file_name, "status": "success"}
+                        if audio_matches:
+                            line["data"] = {"audio_matches": audio_matches}
+                        else:
+                            line["message"] = "No match found"
+                    yield json.dumps(line) + "\n"
+        except Exception as e:
+            logging.error(f"Error during batch audio search: {e}")
+            yield json.dumps({"status": "failed", "error": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), status=200, mimetype='application/x-ndjson')
+
+
+def ingest_audio_file(file_name, upload_path, speaker_name, hex_id, upsert_buffer, progress):
+    """Queues the speaker vectors of one uploaded audio file, returns its link"""
+    # Create a unique vector ID
+    vector_id = os.path.basename(file_name).split('.')[0] + "_" + hex_id
+
+    # Metadata for Pinecone
+    metadata = {
+        "file_name": file_name,
+        "id": vector_id,
+        "link": storage.link_for(f'search/speaker_recoginition/{file_name}'),
+        "speaker": speaker_name
+    }
+
+    if Config.AUDIO_WINDOWED:
+        # One vector per window, streamed from the decoder so memory stays flat
+        segments = 0
+        for segment in iter_segment_embeddings(upload_path):
+            segment_id = f"{vector_id}_{int(segment['start'] * 1000)}"
+            upsert_buffer.add(
+                {
+                    "id": segment_id,
+                    "values": segment["embedding"],
+                    "metadata": {**metadata, "id": segment_id, "start": segment["start"], "end": segment["end"]}
+                }, namespace="processed-audio"
+            )
+            segments += 1
+        if segments == 0:
+            # Too short or silent throughout, the file would not be searchable
+            raise Exception(f"No voiced segment found in {file_name}")
+        progress.increment("segments_processed", segments)
+    else:
+        # Decode and get embeddings, skipped for content that was processed before
+        embedding = get_audio_embedding(upload_path)
+
+        # Queue the vector for Pinecone
+        upsert_buffer.add(
+            {
+                "id": vector_id,
+                "values": embedding,
+                "metadata": metadata
+            }, namespace="processed-audio"
+        )
+
+    return metadata["link"]
+
+
+def process_ingest_job(job_id, payload, progress):
+    """Processes the files of a queued /audio/ingest request"""
+    speaker_name = payload["speaker"]
+    hex_id = payload["hex_id"]
+    files = payload["files"]
+
+    ingested_files = []
+    failed_files = []
+
+    # Uploads to S3 run in the background while the files are embedded
+    uploads = [
+        upload_async(file["path"], f'search/speaker_recoginition/{file["file_name"]}', 'audio/mp3')
+        for file in files
+    ]
+
+    # Files are processed in parallel across the ingest process pool
+    tasks = [
+        (ingest_audio_file, (file["file_name"], file["path"], speaker_name, hex_id))
+        for file in files
+    ]
+
+    try:
+        # Vectors are upserted in batches, the buffer is drained before the job completes
+        with UpsertBuffer(index) as upsert_buffer:
+            # A file's vectors only reach the index once its original is stored
+            gates = [UploadGate(upsert_buffer, upload) for upload in uploads]
+            for position, result in run_ingest_tasks(tasks, gates, progress):
+                file_name = files[position]["file_name"]
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    gates[position].release()
+
+                    ingested_files.append({
+                        "file_name": file_name,
+                        "link": result,
+                        "speaker": speaker_name
+                    })
+                    progress.increment("files_processed")
+                except Exception as e:
+                    logging.error(f"Error processing or uploading file {file_name}: {e}")
+                    progress.add_error(f"{file_name}: {e}")
+                    failed_files.append({"file_name": file_name, "error": str(e)})
+
+        if failed_files and not ingested_files:
+            raise Exception(f"None of the {len(failed_files)} files could be ingested")
+
+        for failure in upsert_buffer.failures:
+            progress.add_error(f"Upsert of {len(failure['ids'])} vectors into '{failure['namespace']}' failed: {failure['error']}")
+        progress.set(vectors_upserted=upsert_buffer.upserted)
+
+        return {
+            "message": f"{len(ingested_files)} files ingested successfully",
+            "ingested_files": ingested_files,
+            "failed_files": failed_files,
+            "failed_upserts": upsert_buffer.failures
+        }
+    finally:
+        # The uploaded files are only needed until the job is done
+        remove_uploads(payload.get("upload_directory"), uploads)
+
+
+job_queue.register("audio_ingest", process_ingest_job)
+
 
 @audio_bp.route('/ingest', methods=['POST'])
 def ingest_audio():
@@ -96,87 +271,42 @@ def ingest_audio():
 
         speaker_name = request.form['speaker']
         files = request.files.getlist('files')
-       
-        hex_id = str(os.urandom(4).hex())
-        upload_directory = f"uploads/{hex_id}/"
-
-        ingested_files = []
 
+        #  Check if the files are audio files based on their MIME type
         for file in files:
-            #  Check if the file is an audio file based on its MIME type
             mime_type, _ = mimetypes.guess_type(file.filename)
             if not mime_type or not mime_type.startswith('audio'):
                 return jsonify({"status": "error", "message": "Invalid file type. Only audio files are allowed."}), 400
-            # Save the file locally
+       
+        hex_id = str(os.urandom(4).hex())
+        upload_directory = f"uploads/{hex_id}/"
+        os.makedirs(upload_directory, exist_ok=True)
+
+        # Save the files locally, the job worker picks them up from there
+        job_files = []
+        for file in files:
             upload_path = os.path.join(upload_directory, file.filename)
-            os.makedirs(upload_directory, exist_ok=True)
-            file.save(upload_path)
-
-
-            # Upload the file to S3
-            bucket_name = 'trainingdata-public'
-            object_name = f'search/speaker_recoginition/{file.filename}'
-            try:
-                s3.upload_file(
-                    upload_path,
-                    bucket_name,
-                    object_name,
-                    ExtraArgs={'ContentType': 'audio/mp3'}
-                )
-                logging.info(f"File {file.filename} uploaded successfully to {bucket_name}/{object_name}")
-
-                # Convert to WAV and get embeddings
-                wav_file = convert_audio_to_wav(upload_path)
-                embedding = get_embedding(wav_file)
-
-                # S3 link for the uploaded file
-                link = "https://trainingdata-public.s3.ap-south-1.amazonaws.com/search/speaker_recoginition/"
-                
-                # Create a unique vector ID
-                vector_id = os.path.basename(file.filename).split('.')[0] + "_" + hex_id
-
-                # Metadata for Pinecone
-                metadata = {
-                    "file_name": file.filename,
-                    "id": vector_id,
-                    "link": link + file.filename,
-                    "speaker": speaker_name
-                }
-
-                # Ingest into Pinecone
-                index.upsert(
-                    vectors=[
-                        {
-                            "id": vector_id,
-                            "values": embedding,
-                            "metadata": metadata
-                        }
-                    ], namespace="processed-audio"
-                )
-
-                ingested_files.append({
-                    "file_name": file.filename,
-                    "link": metadata["link"],
-                    "speaker": speaker_name
-                })
-
-                os.remove(wav_file)
-            except Exception as e:
-                logging.error(f"Error processing or uploading file {file.filename}: {e}")
-            finally:
-                pass
-                # Optionally, clean up the local upload file
-                #os.remove(upload_path)
+            save_upload(file, upload_path)
+            job_files.append({"file_name": file.filename, "path": upload_path})
+
+        job_id = job_queue.submit("audio_ingest", {
+            "speaker": speaker_name,
+            "hex_id": hex_id,
+            "files": job_files,
+            "upload_directory": upload_directory
+        })
 
         response = {
             "status": "success",
-            "message": f"{len(ingested_files)} files ingested successfully",
-            "data": ingested_files
+            "message": f"{len(job_files)} files queued for ingestion",
+            "data": {
+                "job_id": job_id
+            }
         }
 
         return Response(
             response=json.dumps(response, indent=2),
-            status=200,
+            status=202,
             mimetype='application/json'
         )
     except Exception as e:
@@ -184,3 +314,14 @@ def ingest_audio():
         return jsonify({"status": "failed", "error": str(e)}), 500
 
 
+@audio_bp.route('/jobs/<job_id>', methods=['GET'])
+def ingest_job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job["kind"] != "audio_ingest":
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+
+    return Response(
+        response=json.dumps({"status": "success", "data": job}, indent=2),
+        status=200,
+        mimetype='application/json'
+    )
@@ -0,0 +1,196 @@
+import os
+import time
+import queue
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+
+from flask import has_request_context
+
+from app.metrics import MICRO_BATCH_SIZE, attribute_timings, current_timings
+
+
+# Scheduling of the model calls: a priority queue per device and the
+# micro-batchers that coalesce concurrent requests. Kept apart from the
+# models themselves, see app.models for the executors they run on.
+
+# Priorities of model calls on a device executor, lower runs first
+SEARCH_PRIORITY = 0
+INGEST_PRIORITY = 1
+
+# Priority a micro-batcher thread is currently running a batch with
+_thread_state = threading.local()
+
+
+def caller_priority():
+    """Priority of the calling thread's model calls"""
+    priority = getattr(_thread_state, "priority", None)
+    if priority is not None:
+        return priority
+    # Calls made while serving a request are searches
+    return SEARCH_PRIORITY if has_request_context() else INGEST_PRIORITY
+
+
+def group_by_length(lengths, max_padded):
+    """Splits inputs into batches that are padded to their longest input.
+
+    Returns lists of positions. Inputs are grouped in order of length, so
+    short inputs are not padded to a long one, and a batch holds at most
+    `max_padded` padded elements unless a single input is longer.
+    """
+    groups = []
+    group = []
+    for position in sorted(range(len(lengths)), key=lambda position: lengths[position]):
+        if group and (len(group) + 1) * lengths[position] > max_padded:
+            groups.append(group)
+            group = []
+        group.append(position)
+    if group:
+        groups.append(group)
+    return groups
+
+
+class DeviceExecutor:
+    """Runs the model calls of one device on dedicated threads, highest priority first.
+
+    Serializing the forward passes keeps request threads from oversubscribing
+    the device, and because ingestion submits work in batches, a search only
+    ever waits for the batch in flight instead of a whole ingest job.
+    """
+
+    def __init__(self, device, workers=1):
+        self.device = device
+        self.workers = workers
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, a forked server worker starts its own
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.PriorityQueue()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"device-{self.device}-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def submit(self, fn, *args, priority=INGEST_PRIORITY, **kwargs):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((priority, next(self._sequence), future, fn, args, kwargs))
+        return future
+
+    def owns_current_thread(self):
+        return threading.current_thread() in self._threads
+
+    def _run(self):
+        while True:
+            _, _, future, fn, args, kwargs = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item model calls into batched calls.
+
+    The first pending item opens a batch, which closes after `max_wait`
+    seconds or at `max_batch_size` items. `batch_fn(items)` then runs once
+    and must return one result per item. Each caller's future resolves to its
+    own result. When a batch fails, its items are retried one by one, so one
+    bad input only fails its own caller. A batch runs with the most urgent
+    priority among its callers.
+    """
+
+    def __init__(self, name, batch_fn, max_batch_size, max_wait, enabled=True):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.enabled = enabled
+
+        self._queue = queue.Queue()
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, a forked server worker starts its own
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True).start()
+
+    def submit(self, item):
+        """Queues one item and returns a future of its result"""
+        future = Future()
+        if not self.enabled:
+            try:
+                future.set_result(self._call([item], caller_priority(), [current_timings()])[0])
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self._ensure_started()
+        self._queue.put((item, caller_priority(), current_timings(), future))
+        return future
+
+    def map(self, items):
+        """Results of several items, which may land in the same or different batches"""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def _call(self, items, priority, timings=()):
+        _thread_state.priority = priority
+        try:
+            with attribute_timings(timings):
+                return self.batch_fn(items)
+        finally:
+            _thread_state.priority = None
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            MICRO_BATCH_SIZE.observe(len(batch), batcher=self.name)
+            try:
+                results = self._call(
+                    [item for item, _, _, _ in batch],
+                    min(priority for _, priority, _, _ in batch),
+                    [timings for _, _, timings, _ in batch]
+                )
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][3].set_exception(e)
+                    continue
+                logging.warning(f"Batch of {len(batch)} items failed in '{self.name}', retrying them one by one: {e}")
+                for item, priority, timings, future in batch:
+                    try:
+                        future.set_result(self._call([item], priority, [timings])[0])
+                    except Exception as item_error:
+                        future.set_exception(item_error)
+                continue
+
+            for (_, _, _, future), result in zip(batch, results):
+                future.set_result(result)
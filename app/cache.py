@@ -0,0 +1,390 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app.config import Config
+from app.metrics import stage_timer, CACHE_LOOKUPS, VECTORS_UPSERTED
+
+
+def bytes_digest(data):
+    """SHA-256 of a bytes object"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """Content-addressed cache of computed embeddings and face boxes.
+
+    Entries live in a local SQLite file and are keyed on the content digest of
+    the input plus the model name and cache version, so changing the model
+    never serves stale embeddings. The store is bounded by `max_bytes`; the
+    least recently used entries are evicted first.
+
+    Lookups read through a connection per thread without the process lock,
+    so concurrent searches don't wait on each other. Their access times are
+    written in batches, at the latest before the next eviction.
+    """
+
+    # Access times kept in memory before they are written
+    TOUCH_BATCH_SIZE = 256
+
+    def __init__(self, db_path, max_bytes, enabled=True):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._touched = {}
+        self._total_bytes = 0
+        self._initialized = False
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _connection(self):
+        # Connections don't survive a fork, a forked worker opens its own
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._initialize()
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _initialize(self):
+        # The store is only created on first use
+        with self._lock:
+            if self._initialized:
+                return
+
+            db_directory = os.path.dirname(self.db_path)
+            if db_directory:
+                os.makedirs(db_directory, exist_ok=True)
+
+            with self._connect() as conn:
+                conn.execute(
+                    """CREATE TABLE IF NOT EXISTS embeddings (
+                        key TEXT PRIMARY KEY,
+                        value BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        last_access REAL NOT NULL
+                    )"""
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+                self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+            self._initialized = True
+
+    def _take_touched(self):
+        # Called with the lock held
+        touched, self._touched = self._touched, {}
+        return [(last_access, key) for key, last_access in touched.items()]
+
+    def key(self, digest, model_name, kind):
+        # Reduced precision models get their own entries, fp32 keys are unchanged
+        precision = {
+            Config.SPEAKER_MODEL_NAME: Config.SPEAKER_MODEL_PRECISION,
+            Config.FACE_MODEL_NAME: Config.FACE_MODEL_PRECISION
+        }.get(model_name, "fp32")
+        if precision != "fp32":
+            model_name = f"{model_name}@{precision}"
+        return f"{kind}:{model_name}:{Config.EMBEDDING_CACHE_VERSION}:{digest}"
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM embeddings WHERE key = ?", (key,)).fetchone()
+
+            touched = None
+            with self._lock:
+                if row is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self._touched[key] = time.time()
+                    if len(self._touched) >= self.TOUCH_BATCH_SIZE:
+                        touched = self._take_touched()
+            CACHE_LOOKUPS.inc(cache="embedding", result="miss" if row is None else "hit")
+
+            if touched:
+                with conn:
+                    conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", touched)
+            return None if row is None else pickle.loads(row[0])
+        except Exception as e:
+            logging.error(f"Error reading embedding cache entry '{key}': {e}")
+            return None
+
+    def put(self, key, value):
+        """Stores a value, evicting least recently used entries beyond the size bound"""
+        if not self.enabled:
+            return
+
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+
+        try:
+            conn = self._connection()
+            with self._lock:
+                with conn:
+                    # Other processes share the file, so the size is read back inside the write transaction
+                    conn.execute("BEGIN IMMEDIATE")
+                    # Pending access times first, the eviction below goes by them
+                    conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", self._take_touched())
+                    conn.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                        (key, blob, len(blob), time.time())
+                    )
+                    self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+                    while self._total_bytes > self.max_bytes:
+                        oldest = conn.execute(
+                            "SELECT key, size FROM embeddings ORDER BY last_access LIMIT 100"
+                        ).fetchall()
+                        if not oldest:
+                            break
+                        for oldest_key, size in oldest:
+                            if self._total_bytes <= self.max_bytes:
+                                break
+                            conn.execute("DELETE FROM embeddings WHERE key = ?", (oldest_key,))
+                            self._total_bytes -= size
+                            self.evictions += 1
+        except Exception as e:
+            logging.error(f"Error writing embedding cache entry '{key}': {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+class NamespaceGenerations:
+    """Write counters of the index namespaces, shared by every process using the same SQLite file.
+
+    Without a path the counters are kept in memory and only this process sees them.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+
+        self._counters = {}
+        self._local = threading.local()
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._lock:
+                if not self._initialized:
+                    db_directory = os.path.dirname(self.db_path)
+                    if db_directory:
+                        os.makedirs(db_directory, exist_ok=True)
+                    with sqlite3.connect(self.db_path, timeout=30) as init_conn:
+                        init_conn.execute(
+                            """CREATE TABLE IF NOT EXISTS namespace_generations (
+                                index_name TEXT NOT NULL,
+                                namespace TEXT NOT NULL,
+                                generation INTEGER NOT NULL,
+                                PRIMARY KEY (index_name, namespace)
+                            )"""
+                        )
+                    self._initialized = True
+            # One connection per thread, lookups run on every cached query
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=30)
+        return conn
+
+    def get(self, index_name, namespace):
+        if self.db_path is None:
+            with self._lock:
+                return self._counters.get((index_name, namespace), 0)
+
+        row = self._connection().execute(
+            "SELECT generation FROM namespace_generations WHERE index_name = ? AND namespace = ?",
+            (index_name, namespace)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, index_name, namespace):
+        if self.db_path is None:
+            with self._lock:
+                self._counters[(index_name, namespace)] = self._counters.get((index_name, namespace), 0) + 1
+            return
+
+        with self._connection() as conn:
+            conn.execute(
+                """INSERT INTO namespace_generations (index_name, namespace, generation) VALUES (?, ?, 1)
+                ON CONFLICT (index_name, namespace) DO UPDATE SET generation = generation + 1""",
+                (index_name, namespace)
+            )
+
+
+class QueryCache:
+    """In-memory TTL + LRU cache of vector index query results.
+
+    Keys are built from the query embedding quantized to `quantization`, so
+    near-identical probes share an entry, plus the index, namespace and top_k.
+    Upserts into a namespace bump its generation in `generations`, which is
+    part of the key, so every process stops serving the entries cached
+    before the write, also those of queries that were still running.
+    """
+
+    def __init__(self, max_entries, ttl, quantization, enabled=True, generations=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.quantization = quantization
+        self.enabled = enabled
+        self.generations = generations or NamespaceGenerations()
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, index_name, namespace, vector, top_k):
+        """Cache key of a query, None when the namespace generation can't be read"""
+        if not self.enabled:
+            return None
+        try:
+            generation = self.generations.get(index_name, namespace)
+        except Exception as e:
+            logging.error(f"Error reading the generation of '{index_name}/{namespace}': {e}")
+            return None
+        quantized = np.round(np.asarray(vector, dtype=np.float32) / self.quantization).astype(np.int32)
+        return (index_name, namespace, top_k, generation, hashlib.sha1(quantized.tobytes()).hexdigest())
+
+    def get(self, key):
+        if not self.enabled or key is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="query", result="miss")
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="query", result="hit")
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.enabled or key is None:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, index_name, namespace):
+        """Drops every cached result of one namespace, in every process sharing the generations"""
+        try:
+            self.generations.bump(index_name, namespace)
+        except Exception as e:
+            logging.error(f"Error bumping the generation of '{index_name}/{namespace}': {e}")
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == index_name and key[1] == namespace]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+
+class CachedIndex:
+    """Wraps a vector index so queries go through the query cache and upserts invalidate it"""
+
+    def __init__(self, index, index_name, cache):
+        self.index = index
+        self.index_name = index_name
+        self.cache = cache
+
+    def query(self, namespace, vector, top_k, include_metadata=True, **kwargs):
+        # The key holds the namespace generation read before the query, a result
+        # that finishes after an upsert is stored under the old generation and never served
+        key = self.cache.key(self.index_name, namespace, vector, top_k)
+        if key is not None:
+            key += (include_metadata,)
+        result = self.cache.get(key)
+        if result is None:
+            with stage_timer("index.query"):
+                result = self.index.query(
+                    namespace=namespace,
+                    vector=vector,
+                    top_k=top_k,
+                    include_metadata=include_metadata,
+                    **kwargs
+                )
+            self.cache.put(key, result)
+        return result
+
+    def upsert(self, vectors, namespace, **kwargs):
+        try:
+            with stage_timer("index.upsert"):
+                result = self.index.upsert(vectors=vectors, namespace=namespace, **kwargs)
+            VECTORS_UPSERTED.inc(len(vectors), index=self.index_name, namespace=namespace)
+            return result
+        finally:
+            self.cache.invalidate(self.index_name, namespace)
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+embedding_cache = EmbeddingCache(
+    Config.EMBEDDING_CACHE_PATH,
+    Config.EMBEDDING_CACHE_MAX_BYTES,
+    enabled=Config.EMBEDDING_CACHE_ENABLED
+)
+
+query_cache = QueryCache(
+    Config.QUERY_CACHE_MAX_ENTRIES,
+    Config.QUERY_CACHE_TTL,
+    Config.QUERY_CACHE_QUANTIZATION,
+    enabled=Config.QUERY_CACHE_ENABLED,
+    # Every server process shares the job store, upserts in one invalidate the others' entries
+    generations=NamespaceGenerations(Config.JOB_DB_PATH)
+)
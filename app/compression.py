@@ -0,0 +1,117 @@
+import numpy as np
+
+
+# Smaller vectors for the indexes: a PCA projection to fewer dimensions,
+# applied on the way into and out of an index, and float16 or int8 rows in
+# the local store.
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+
+def normalize_rows(values):
+    """L2-normalises a vector or the rows of a matrix, as float32"""
+    values = np.asarray(values, dtype=np.float32)
+    norms = np.linalg.norm(values, axis=-1, keepdims=True)
+    return values / np.where(norms == 0, 1, norms)
+
+
+class PCAProjection:
+    """Projects embeddings onto their top principal components.
+
+    The projected vectors are L2-normalised again so the indexes keep
+    scoring with cosine similarity. A projection is fitted offline on
+    representative embeddings and saved as an .npz of the mean and the
+    components.
+    """
+
+    def __init__(self, mean, components):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @property
+    def input_dimension(self):
+        return self.components.shape[1]
+
+    @property
+    def dimension(self):
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, embeddings, dimension):
+        embeddings = normalize_rows(embeddings)
+        if dimension > min(embeddings.shape):
+            raise ValueError(
+                f"Cannot fit {dimension} components to {len(embeddings)} embeddings of dimension {embeddings.shape[1]}"
+            )
+        mean = embeddings.mean(axis=0)
+        _, _, components = np.linalg.svd(embeddings - mean, full_matrices=False)
+        return cls(mean, components[:dimension])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["mean"], data["components"])
+
+    def save(self, path):
+        np.savez(path, mean=self.mean, components=self.components)
+
+    def project(self, vectors):
+        """Projects a vector or a matrix of row vectors, returns float32"""
+        vectors = normalize_rows(vectors)
+        if vectors.shape[-1] != self.input_dimension:
+            raise ValueError(f"Vector dimension {vectors.shape[-1]} does not match the projection input {self.input_dimension}")
+        return normalize_rows((vectors - self.mean) @ self.components.T)
+
+
+class ProjectedIndex:
+    """Wraps a vector index so every upserted and query vector is projected first"""
+
+    def __init__(self, index, projection):
+        self.index = index
+        self.projection = projection
+
+    def query(self, namespace, vector, top_k, include_metadata=True, **kwargs):
+        return self.index.query(
+            namespace=namespace,
+            vector=self.projection.project(vector).tolist(),
+            top_k=top_k,
+            include_metadata=include_metadata,
+            **kwargs
+        )
+
+    def upsert(self, vectors, namespace, **kwargs):
+        values = self.projection.project([vector["values"] for vector in vectors])
+        projected = [dict(vector, values=row.tolist()) for vector, row in zip(vectors, values)]
+        return self.index.upsert(vectors=projected, namespace=namespace, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+def encode_rows(values, dtype):
+    """Encodes L2-normalised float32 rows for storage.
+
+    Returns (rows, scales). int8 rows are scaled per row so their largest
+    component maps to 127; `scales` holds the factor back to float and is
+    None for the float types.
+    """
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector dtype '{dtype}', expected one of {', '.join(VECTOR_DTYPES)}")
+    values = np.asarray(values, dtype=np.float32)
+    if dtype == "int8":
+        scales = np.abs(values).max(axis=1) / 127
+        scales = np.where(scales == 0, 1, scales).astype(np.float32)
+        return np.round(values / scales[:, None]).astype(np.int8), scales
+    return values.astype(dtype), None
+
+
+def decode_rows(rows, scales=None):
+    """Stored rows back as float32"""
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows if scales is None else rows * scales[:, None]
+
+
+def row_scores(rows, query, scales=None):
+    """Dot products of stored rows with a float32 query vector"""
+    scores = rows.astype(np.float32, copy=False) @ query
+    return scores if scales is None else scores * scales
@@ -5,3 +5,135 @@ class Config:
     PINECONE_API_KEY = os.getenv("PINECONE_API_KEY","key")
     PINECONE_AUDIO_INDEX = "speaker-recognition"
     PINECONE_VIDEO_INDEX = "face-recognizer"
+
+    # Vector store backend: "pinecone" or "local" (in-process, persisted under LOCAL_VECTOR_STORE_PATH)
+    VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")
+    LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", "vector_store")
+    LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "exact")  # "exact" or "hnsw"
+    LOCAL_SEARCH_CHUNK_ROWS = int(os.getenv("LOCAL_SEARCH_CHUNK_ROWS", "65536"))
+    LOCAL_INDEX_SAVE_INTERVAL = float(os.getenv("LOCAL_INDEX_SAVE_INTERVAL", "60"))  # seconds between HNSW saves
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    # Storage type of the embeddings of new local namespaces: "float32", "float16" or "int8" (with a scale per row)
+    LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32")
+    # PCA projections (.npz, fitted by benchmarks/accuracy.py) applied to every vector upserted into or queried
+    # from the face and speaker indexes; the indexes must have the projected dimension
+    FACE_PCA_PATH = os.getenv("FACE_PCA_PATH", "")
+    SPEAKER_PCA_PATH = os.getenv("SPEAKER_PCA_PATH", "")
+
+    # Namespaces searched by /video/search and the response key of each one's matches
+    VIDEO_SEARCH_NAMESPACES = {
+        "preprocessed-videos": "video_matches",
+        "preprocessed-images": "image_matches"
+    }
+    QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "16"))
+
+    # Model registry
+    SPEAKER_MODEL_NAME = "nvidia/speakerverification_en_titanet_large"
+    FACE_MODEL_NAME = "VGG-Face"
+    MODEL_DEVICE = os.getenv("MODEL_DEVICE", "")  # empty -> cuda if available, else cpu
+    MODEL_DEVICES = os.getenv("MODEL_DEVICES", "")  # e.g. "cuda:0,cuda:1", server and ingest workers are spread over them
+    PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "true").lower() == "true"
+    # Inference precision: "fp32", "fp16" or "bf16" (mixed precision), or "int8" (dynamically quantized weights)
+    SPEAKER_MODEL_PRECISION = os.getenv("SPEAKER_MODEL_PRECISION", "fp32")
+    FACE_MODEL_PRECISION = os.getenv("FACE_MODEL_PRECISION", "fp32")
+    # Model calls run on dedicated threads per device, searches ahead of ingestion
+    DEVICE_EXECUTOR_ENABLED = os.getenv("DEVICE_EXECUTOR_ENABLED", "true").lower() == "true"
+    DEVICE_WORKERS = int(os.getenv("DEVICE_WORKERS", "1"))
+    # Concurrent single-item model calls are coalesced for up to MICRO_BATCH_MAX_WAIT_MS or MICRO_BATCH_MAX_SIZE items
+    MICRO_BATCHING_ENABLED = os.getenv("MICRO_BATCHING_ENABLED", "true").lower() == "true"
+    MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "32"))
+    MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+
+    # Adds a Server-Timing header with the time each request spent per stage
+    TIMING_HEADER_ENABLED = os.getenv("TIMING_HEADER_ENABLED", "false").lower() == "true"
+
+    # Maximum number of face crops embedded together in one forward pass
+    FACE_EMBED_BATCH_SIZE = int(os.getenv("FACE_EMBED_BATCH_SIZE", "64"))
+
+    # Number of sampled video frames sent to MTCNN in one detection call
+    DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "32"))
+
+    # Seconds between two video frames sampled for face detection
+    FRAME_SAMPLE_INTERVAL = float(os.getenv("FRAME_SAMPLE_INTERVAL", "0.5"))
+    # Adaptive sampling: dense after scene cuts, sparse in static shots, within the min/max interval
+    FRAME_SAMPLE_ADAPTIVE = os.getenv("FRAME_SAMPLE_ADAPTIVE", "true").lower() == "true"
+    FRAME_SAMPLE_MIN_INTERVAL = float(os.getenv("FRAME_SAMPLE_MIN_INTERVAL", "0.25"))
+    FRAME_SAMPLE_MAX_INTERVAL = float(os.getenv("FRAME_SAMPLE_MAX_INTERVAL", "2.0"))
+    SCENE_ANALYSIS_FPS = float(os.getenv("SCENE_ANALYSIS_FPS", "8"))
+    SCENE_CUT_THRESHOLD = float(os.getenv("SCENE_CUT_THRESHOLD", "0.3"))  # histogram distance, 0..1
+    MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "0.02"))  # mean pixel change since the last sample, 0..1
+
+    # Face tracks across sampled frames, each stored as up to FACE_TRACK_MAX_VECTORS vectors instead of one per frame
+    FACE_TRACKING_ENABLED = os.getenv("FACE_TRACKING_ENABLED", "true").lower() == "true"
+    FACE_TRACK_IOU_THRESHOLD = float(os.getenv("FACE_TRACK_IOU_THRESHOLD", "0.3"))
+    FACE_TRACK_MATCH_SIMILARITY = float(os.getenv("FACE_TRACK_MATCH_SIMILARITY", "0.5"))  # with overlapping boxes
+    FACE_TRACK_REID_SIMILARITY = float(os.getenv("FACE_TRACK_REID_SIMILARITY", "0.8"))  # without
+    FACE_TRACK_MAX_GAP_SEC = float(os.getenv("FACE_TRACK_MAX_GAP_SEC", "3.0"))  # above FRAME_SAMPLE_MAX_INTERVAL
+    FACE_TRACK_MAX_VECTORS = int(os.getenv("FACE_TRACK_MAX_VECTORS", "3"))
+    FACE_TRACK_NEW_VECTOR_SIMILARITY = float(os.getenv("FACE_TRACK_NEW_VECTOR_SIMILARITY", "0.85"))
+
+    # Buffered Pinecone upserts
+    UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+    UPSERT_FLUSH_INTERVAL = float(os.getenv("UPSERT_FLUSH_INTERVAL", "2.0"))  # seconds
+    UPSERT_PARALLELISM = int(os.getenv("UPSERT_PARALLELISM", "4"))  # requests in flight, twice as many batches may be queued
+
+    # Ingest job queue, persisted in SQLite so queued jobs survive a restart
+    JOB_DB_PATH = os.getenv("JOB_DB_PATH", "uploads/jobs.sqlite3")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    # create_app() starts the job workers; gunicorn.conf.py starts them after the fork instead
+    START_JOB_WORKERS = os.getenv("START_JOB_WORKERS", "true").lower() == "true"
+    # Processes the files of a multi-file ingest job are fanned out to, 0 -> two on CPU, one per device on GPU
+    INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", "0"))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # seconds
+    JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "1.0"))  # seconds between progress writes
+
+    # Pipelined video ingest: bounded queue size between stages and workers per stage
+    PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+    PIPELINE_DETECT_WORKERS = int(os.getenv("PIPELINE_DETECT_WORKERS", "1"))
+    PIPELINE_EMBED_WORKERS = int(os.getenv("PIPELINE_EMBED_WORKERS", "1"))
+
+    # Content-addressed embedding cache
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "temp/embedding_cache.sqlite3")
+    EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(1024 ** 3)))
+    EMBEDDING_CACHE_VERSION = os.getenv("EMBEDDING_CACHE_VERSION", "2")  # bump to invalidate every entry, 2: BGR face crops
+
+    # Search result cache in front of the vector index queries
+    QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "10000"))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))  # seconds
+    QUERY_CACHE_QUANTIZATION = float(os.getenv("QUERY_CACHE_QUANTIZATION", "0.001"))
+
+    # Batched search: parallel ffmpeg conversions and speaker embedding batch size
+    TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "4"))
+    SPEAKER_EMBED_BATCH_SIZE = int(os.getenv("SPEAKER_EMBED_BATCH_SIZE", "16"))
+    # Signals of a TitaNet batch are padded to the longest one, a forward pass holds at most this many samples
+    SPEAKER_BATCH_MAX_SAMPLES = int(os.getenv("SPEAKER_BATCH_MAX_SAMPLES", str(8 * 60 * 16000)))
+
+    # Windowed speaker embeddings for long recordings, one vector per segment
+    AUDIO_WINDOWED = os.getenv("AUDIO_WINDOWED", "false").lower() == "true"
+    AUDIO_WINDOW_SEC = float(os.getenv("AUDIO_WINDOW_SEC", "3.0"))
+    AUDIO_HOP_SEC = float(os.getenv("AUDIO_HOP_SEC", "1.5"))
+    AUDIO_MIN_SEGMENT_SEC = float(os.getenv("AUDIO_MIN_SEGMENT_SEC", "1.0"))
+    AUDIO_VAD_ENABLED = os.getenv("AUDIO_VAD_ENABLED", "true").lower() == "true"
+    AUDIO_VAD_THRESHOLD_DB = float(os.getenv("AUDIO_VAD_THRESHOLD_DB", "-40"))
+    AUDIO_VAD_MIN_VOICED_RATIO = float(os.getenv("AUDIO_VAD_MIN_VOICED_RATIO", "0.3"))
+
+    # Storage of uploaded originals: "s3", or "local" to keep them on the filesystem
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3")
+    S3_BUCKET = os.getenv("S3_BUCKET", "trainingdata-public")
+    S3_REGION = os.getenv("S3_REGION", "ap-south-1")
+    S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(16 * 1024 * 1024)))
+    S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(16 * 1024 * 1024)))
+    S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "8"))
+    UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+    LOCAL_STORAGE_PATH = os.getenv("LOCAL_STORAGE_PATH", "storage")
+    LOCAL_STORAGE_BASE_URL = os.getenv("LOCAL_STORAGE_BASE_URL", "")
+
+    # Multipart uploads stay in memory up to this size, larger files are spilled once under UPLOAD_SPOOL_PATH
+    UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+    UPLOAD_SPOOL_PATH = os.getenv("UPLOAD_SPOOL_PATH", "uploads/incoming")
+    # Keep the files of finished ingest jobs under uploads/ instead of deleting them
+    KEEP_UPLOADS = os.getenv("KEEP_UPLOADS", "false").lower() == "true"
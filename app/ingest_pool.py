@@ -0,0 +1,239 @@
+import os
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from app.config import Config
+
+
+# Multi-file ingest jobs fan their files out to a pool of worker processes.
+# Workers only compute: they stream their vectors back to the job in chunks,
+# which keeps upserting them through its single UpsertBuffer, so the vector
+# store keeps a single writer and the query cache of the serving process is
+# invalidated.
+
+# Queue the workers stream their chunks to, set in every worker by _init_worker
+_results = None
+
+
+class ChunkStream:
+    """Stands in for the UpsertBuffer and the job's progress inside a worker process.
+
+    Vectors, counter increments and errors are sent to the job every
+    `chunk_size` vectors, so a long file is never held in the worker as a
+    whole and the job upserts and reports progress while it is computed.
+    """
+
+    def __init__(self, results, task_id, chunk_size):
+        self.results = results
+        self.task_id = task_id
+        self.chunk_size = chunk_size
+        self.upserted = 0
+
+        self._vectors = []
+        self._counters = {}
+        self._errors = []
+
+    def add(self, vector, namespace):
+        self._vectors.append((vector, namespace))
+        self.upserted += 1
+        if len(self._vectors) >= self.chunk_size:
+            self.flush()
+
+    def increment(self, key, amount=1):
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, **counters):
+        # Absolute counters (vectors_upserted) are maintained by the job itself
+        pass
+
+    def add_error(self, message):
+        self._errors.append(message)
+
+    def flush(self, done=False):
+        if self._vectors or self._counters or self._errors or done:
+            self.results.put((self.task_id, self._vectors, self._counters, self._errors, done))
+        self._vectors, self._counters, self._errors = [], {}, []
+
+
+def _init_worker(device_counter, threads, results):
+    """Loads the models once per worker process"""
+    global _results
+    from app.models import get_device, load_models
+    import torch
+
+    _results = results
+
+    devices = [device.strip() for device in Config.MODEL_DEVICES.split(",") if device.strip()]
+    if devices:
+        with device_counter.get_lock():
+            Config.MODEL_DEVICE = devices[device_counter.value % len(devices)]
+            device_counter.value += 1
+
+    # Workers share the cores, one intra-op pool per process would oversubscribe them
+    if get_device().type == "cpu":
+        torch.set_num_threads(threads)
+
+    if Config.PRELOAD_MODELS:
+        load_models()
+    logging.info(f"Ingest worker {os.getpid()} ready on {get_device()}")
+
+
+def _run_task(task_id, fn, args):
+    stream = ChunkStream(_results, task_id, Config.UPSERT_BATCH_SIZE)
+    try:
+        return fn(*args, stream, stream)
+    finally:
+        # The job waits for the last chunk before it reports the file
+        stream.flush(done=True)
+
+
+def pool_size():
+    """INGEST_PROCESSES, or two processes on CPU and one per device otherwise"""
+    if Config.INGEST_PROCESSES > 0:
+        return Config.INGEST_PROCESSES
+
+    devices = [device for device in Config.MODEL_DEVICES.split(",") if device.strip()]
+    if devices:
+        return len(devices)
+
+    from app.models import get_device
+    if get_device().type == "cpu":
+        # Every process holds its own copy of the models, and inference already uses several cores
+        return min(2, os.cpu_count() or 1)
+    return 1
+
+
+class _TaskChunks:
+    """Applies the chunks streamed back for one task in the serving process"""
+
+    def __init__(self, upsert_buffer, progress):
+        self.upsert_buffer = upsert_buffer
+        self.progress = progress
+        self.error = None
+        self.done = threading.Event()
+
+    def apply(self, vectors, counters, errors):
+        if self.error is not None:
+            # The file has failed already, e.g. its upload, the rest of its vectors are dropped
+            return
+        try:
+            for vector, namespace in vectors:
+                self.upsert_buffer.add(vector, namespace=namespace)
+        except Exception as e:
+            self.error = e
+            return
+
+        for key, amount in counters.items():
+            self.progress.increment(key, amount)
+        for message in errors:
+            self.progress.add_error(message)
+        self.progress.set(vectors_upserted=self.upsert_buffer.upserted)
+
+
+class IngestPool:
+    """The worker processes and the thread that hands their streamed chunks to the running tasks"""
+
+    def __init__(self, processes):
+        threads = max(1, (os.cpu_count() or 1) // processes)
+        # Spawned, not forked: CUDA and the server's threads don't survive a fork
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(context.Value("i", 0), threads, self.results)
+        )
+
+        self._tasks = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._dispatch, name="ingest-pool-results", daemon=True).start()
+
+    def submit(self, fn, args, upsert_buffer, progress):
+        """Returns (future, chunks) of a task"""
+        task_id = uuid.uuid4().hex
+        chunks = _TaskChunks(upsert_buffer, progress)
+        with self._lock:
+            self._tasks[task_id] = chunks
+        return self.executor.submit(_run_task, task_id, fn, args), chunks
+
+    def _dispatch(self):
+        while True:
+            message = self.results.get()
+            if message is None:
+                return
+            task_id, vectors, counters, errors, done = message
+            with self._lock:
+                chunks = self._tasks.pop(task_id) if done else self._tasks.get(task_id)
+            if chunks is None:
+                continue
+            chunks.apply(vectors, counters, errors)
+            if done:
+                chunks.done.set()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.results.put(None)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ingest_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = IngestPool(pool_size())
+        return _pool
+
+
+def _discard_pool(pool):
+    # A worker that died (e.g. out of memory) breaks the whole pool, the next job starts a new one
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown()
+
+
+def run_ingest_tasks(tasks, upsert_buffers, progress):
+    """Runs `fn(*args, upsert_buffer, progress)` for every (fn, args) task.
+
+    `upsert_buffers` holds the buffer of every task (e.g. its UploadGate).
+    Yields (position, result) as tasks finish, with the exception as the
+    result of a task that failed, so one bad file doesn't stop the others.
+    Several tasks go to the ingest process pool, a single one runs in-process.
+    """
+    if len(tasks) <= 1 or pool_size() <= 1:
+        for position, (fn, args) in enumerate(tasks):
+            try:
+                yield position, fn(*args, upsert_buffers[position], progress)
+            except Exception as e:
+                yield position, e
+        return
+
+    pool = get_ingest_pool()
+    futures = {}
+    for position, (fn, args) in enumerate(tasks):
+        future, chunks = pool.submit(fn, args, upsert_buffers[position], progress)
+        futures[future] = (position, chunks)
+
+    for future in as_completed(futures):
+        position, chunks = futures[future]
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            _discard_pool(pool)
+            yield position, e
+            continue
+        except Exception as e:
+            result = e
+
+        # The chunks travel separately from the result, the file is done once the last one is applied
+        chunks.done.wait()
+        yield position, chunks.error or result
@@ -0,0 +1,213 @@
+import os
+import json
+import fcntl
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+
+from app.config import Config
+
+
+class JobProgress:
+    """Progress counters and errors of a running job, written back to the store periodically"""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+        self.counters = {}
+        self.errors = []
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    def increment(self, key, amount=1):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+        self._save_throttled()
+
+    def set(self, **counters):
+        with self._lock:
+            self.counters.update(counters)
+        self._save_throttled()
+
+    def add_error(self, message):
+        with self._lock:
+            self.errors.append(message)
+        self.save()
+
+    def to_dict(self):
+        with self._lock:
+            return {**self.counters, "errors": list(self.errors)}
+
+    def save(self):
+        self._last_save = time.time()
+        self.queue.update(self.job_id, progress=self.to_dict())
+
+    def _save_throttled(self):
+        if time.time() - self._last_save >= Config.JOB_PROGRESS_INTERVAL:
+            self.save()
+
+
+class JobQueue:
+    """Job queue persisted in SQLite and processed by a pool of worker threads.
+
+    Handlers are registered per job kind and called as
+    `handler(job_id, payload, progress)`; whatever they return is stored as the
+    job result. Jobs that were queued or running when the process stopped are
+    picked up again on the next `start()`.
+
+    Several server processes may share the store; only the one holding the
+    lock file next to it runs jobs, and another takes over when it exits.
+    """
+
+    def __init__(self, db_path, workers):
+        self.db_path = db_path
+        self.workers = workers
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._started_pid = None
+        self._lock_file = None
+
+        db_directory = os.path.dirname(db_path)
+        if db_directory:
+            os.makedirs(db_directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload):
+        """Stores a new job and returns its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, progress, created_at, updated_at) VALUES (?, ?, 'queued', ?, '{}', ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now)
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Returns the job as a dict, or None if it doesn't exist"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, progress, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "progress": json.loads(row[3] or "{}"),
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7]
+        }
+
+    def update(self, job_id, status=None, progress=None, result=None, error=None):
+        fields = {"updated_at": time.time()}
+        if status is not None:
+            fields["status"] = status
+        if progress is not None:
+            fields["progress"] = json.dumps(progress)
+        if result is not None:
+            fields["result"] = json.dumps(result)
+        if error is not None:
+            fields["error"] = error
+
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def start(self):
+        """Starts the worker threads as soon as this process holds the job store lock"""
+        # Checked per process, the threads of a parent don't survive a fork
+        if self._started_pid == os.getpid() or self.workers <= 0:
+            return
+        self._started_pid = os.getpid()
+        self._threads = []
+
+        threading.Thread(target=self._lead, name="job-leader", daemon=True).start()
+
+    def _lead(self):
+        # Blocks until no other process is working off the store
+        self._lock_file = open(f"{self.db_path}.lock", "w")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+        # Jobs left running belonged to a process that has exited
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _claim(self):
+        """Marks the oldest queued job as running and returns it"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            # Guard on the status so a job is never claimed twice by two processes sharing the store
+            claimed = conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), row[0])
+            ).rowcount
+            if not claimed:
+                return None
+        return row[0], row[1], json.loads(row[2])
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logging.error(f"Error claiming job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(Config.JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+
+            job_id, kind, payload = job
+            progress = JobProgress(self, job_id)
+            try:
+                handler = self._handlers[kind]
+                result = handler(job_id, payload, progress)
+                self.update(job_id, status="completed", progress=progress.to_dict(), result=result)
+            except Exception as e:
+                logging.error(f"Error processing job '{job_id}' ({kind}): {e}")
+                self.update(job_id, status="failed", progress=progress.to_dict(), error=str(e))
+
+
+job_queue = JobQueue(Config.JOB_DB_PATH, Config.JOB_WORKERS)
@@ -0,0 +1,250 @@
+import logging
+import tempfile
+
+import cv2
+import ffmpeg
+import numpy as np
+
+from app.config import Config
+from app.metrics import stage_timer
+
+
+# Decoding of the uploaded media, kept apart from the models so it can be
+# used and tested without them.
+
+def decode_audio(audio, target_sample_rate=16000):
+    """Decodes audio with ffmpeg into mono float32 samples at `target_sample_rate`.
+
+    `audio` is either the raw file bytes, piped to ffmpeg's stdin, or a file
+    path. The PCM samples are read from ffmpeg's stdout, nothing is written to disk.
+    """
+    with stage_timer("decode_audio"):
+        return _decode_audio(audio, target_sample_rate)
+
+
+def _decode_audio(audio, target_sample_rate):
+    output_args = dict(format='f32le', acodec='pcm_f32le', ac=1, ar=target_sample_rate)
+    try:
+        if isinstance(audio, bytes):
+            out, _ = ffmpeg.input('pipe:0').output('pipe:1', **output_args).run(
+                input=audio, capture_stdout=True, capture_stderr=True
+            )
+        else:
+            out, _ = ffmpeg.input(audio).output('pipe:1', **output_args).run(
+                capture_stdout=True, capture_stderr=True
+            )
+    except ffmpeg.Error as e:
+        if isinstance(audio, bytes):
+            # Containers with their index at the end of the file (e.g. some m4a)
+            # can't be demuxed from a pipe, those go through a seekable temp file
+            with tempfile.NamedTemporaryFile() as temp_file:
+                temp_file.write(audio)
+                temp_file.flush()
+                return _decode_audio(temp_file.name, target_sample_rate)
+
+        logging.error(f"Error during conversion: {e.stderr.decode()}")
+        raise Exception("Audio conversion failed. Please check the input format.")
+
+    return np.frombuffer(out, dtype=np.float32)
+
+
+def window_samples(chunks, window, hop, min_segment):
+    """Yields (start, samples) windows of `window` samples every `hop` samples.
+
+    `chunks` is a stream of float32 arrays of any size, `start` is a sample
+    offset. Trailing samples shorter than a window are yielded when they
+    aren't covered by the last window and hold at least `min_segment` samples.
+    """
+    buffer = np.empty(0, dtype=np.float32)
+    start = 0  # sample offset of buffer[0]
+    produced = False
+    for chunk in chunks:
+        buffer = np.concatenate([buffer, chunk])
+        while len(buffer) >= window:
+            produced = True
+            yield start, buffer[:window]
+            buffer = buffer[hop:]
+            start += hop
+
+    uncovered = len(buffer) > window - hop if produced else True
+    if uncovered and len(buffer) >= min_segment:
+        yield start, buffer
+
+
+def iter_audio_windows(audio_path, window_sec=None, hop_sec=None, target_sample_rate=16000):
+    """Streams an audio file through ffmpeg and yields (start_sec, end_sec, samples) windows.
+
+    Samples are read from ffmpeg's stdout one hop at a time, so only about one
+    window of audio is held in memory however long the recording is.
+    """
+    window_sec = window_sec or Config.AUDIO_WINDOW_SEC
+    hop_sec = hop_sec or Config.AUDIO_HOP_SEC
+    window = int(window_sec * target_sample_rate)
+    hop = int(hop_sec * target_sample_rate)
+
+    process = (
+        ffmpeg.input(audio_path)
+        .output('pipe:1', format='f32le', acodec='pcm_f32le', ac=1, ar=target_sample_rate)
+        .global_args('-loglevel', 'error', '-nostdin')
+        .run_async(pipe_stdout=True)
+    )
+
+    # One hop of float32 samples per read
+    chunks = (np.frombuffer(chunk, dtype=np.float32) for chunk in iter(lambda: process.stdout.read(hop * 4), b""))
+    produced = False
+    try:
+        for start, samples in window_samples(chunks, window, hop, Config.AUDIO_MIN_SEGMENT_SEC * target_sample_rate):
+            produced = True
+            yield start / target_sample_rate, (start + len(samples)) / target_sample_rate, samples
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+    if not produced and process.returncode != 0:
+        raise Exception("Audio conversion failed. Please check the input format.")
+
+
+def is_voiced(samples, target_sample_rate=16000):
+    """Energy-based voice activity check: enough 30 ms frames above AUDIO_VAD_THRESHOLD_DB"""
+    frame = int(0.03 * target_sample_rate)
+    frames = len(samples) // frame
+    if frames == 0:
+        return False
+
+    rms = np.sqrt(np.mean(samples[:frames * frame].reshape(frames, frame) ** 2, axis=1))
+    db = 20 * np.log10(rms + 1e-10)
+    return np.mean(db > Config.AUDIO_VAD_THRESHOLD_DB) >= Config.AUDIO_VAD_MIN_VOICED_RATIO
+
+
+def sample_frames(video_path, interval_sec=None):
+    """Decodes a video once and yields (frame_index, time_stamp_sec, rgb_frame) every `interval_sec` seconds.
+
+    Time stamps come from the decoder's presentation time, falling back to the
+    source frame rate when the container doesn't report one. Without an
+    explicit `interval_sec` and with FRAME_SAMPLE_ADAPTIVE set, the interval
+    follows the content, see `sample_frames_adaptive`.
+    """
+    if interval_sec is None:
+        if Config.FRAME_SAMPLE_ADAPTIVE:
+            yield from sample_frames_adaptive(video_path)
+            return
+        interval_sec = Config.FRAME_SAMPLE_INTERVAL
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise Exception(f"Cannot open video file: {video_path}")
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        frame_index = 0
+        next_sample_sec = 0.0
+
+        # grab() only demuxes and decodes, the colour conversion in retrieve()
+        # is paid for the sampled frames alone
+        while cap.grab():
+            time_stamp_sec = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if time_stamp_sec <= 0 and frame_index > 0:
+                time_stamp_sec = frame_index / fps
+
+            if time_stamp_sec >= next_sample_sec:
+                ret, frame = cap.retrieve()
+                if ret:
+                    yield frame_index, time_stamp_sec, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                # On a fixed grid, stepping from the sampled frame would add up to a frame of drift per sample
+                next_sample_sec += interval_sec
+                while next_sample_sec <= time_stamp_sec:
+                    # The decoder skipped past one or more sample times
+                    next_sample_sec += interval_sec
+
+            frame_index += 1
+    finally:
+        cap.release()
+
+
+def _frame_signature(frame):
+    """Downscaled grayscale copy and normalised 32-bin histogram of a BGR frame"""
+    small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 36), interpolation=cv2.INTER_AREA)
+    histogram = cv2.calcHist([small], [0], None, [32], [0, 256]).ravel()
+    return small, histogram / max(histogram.sum(), 1)
+
+
+def sample_frames_adaptive(video_path):
+    """Yields (frame_index, time_stamp_sec, rgb_frame) at a rate that follows the content.
+
+    A cheap pre-pass looks at SCENE_ANALYSIS_FPS downscaled frames per second:
+    - a histogram jump above SCENE_CUT_THRESHOLD is a cut, the first frame of
+      the new shot is sampled right away and the interval drops to
+      FRAME_SAMPLE_MIN_INTERVAL;
+    - at every sample, the mean pixel change since the previous sample decides the
+      next interval: FRAME_SAMPLE_INTERVAL when it moved more than
+      MOTION_THRESHOLD, otherwise the interval doubles up to
+      FRAME_SAMPLE_MAX_INTERVAL.
+    Static shots thus cost a few detector calls while short shots still get sampled.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise Exception(f"Cannot open video file: {video_path}")
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        stride = max(1, round(fps / Config.SCENE_ANALYSIS_FPS))
+        interval_sec = Config.FRAME_SAMPLE_MIN_INTERVAL
+        next_sample_sec = 0.0
+        last_sample_sec = float("-inf")
+        previous_histogram = None
+        sampled_small = None
+
+        frame_index = 0
+        sampled = 0
+        cuts = 0
+        while cap.grab():
+            # Only every stride-th frame is converted and analysed
+            if frame_index % stride != 0:
+                frame_index += 1
+                continue
+
+            time_stamp_sec = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if time_stamp_sec <= 0 and frame_index > 0:
+                time_stamp_sec = frame_index / fps
+
+            ret, frame = cap.retrieve()
+            if not ret:
+                frame_index += 1
+                continue
+
+            small, histogram = _frame_signature(frame)
+            shot_start = previous_histogram is None or 0.5 * np.abs(histogram - previous_histogram).sum() > Config.SCENE_CUT_THRESHOLD
+            if shot_start and previous_histogram is not None:
+                cuts += 1
+            previous_histogram = histogram
+
+            if shot_start:
+                # A new shot is sampled right away, but never closer than the minimum interval (e.g. flashes)
+                interval_sec = Config.FRAME_SAMPLE_MIN_INTERVAL
+                next_sample_sec = min(next_sample_sec, last_sample_sec + interval_sec)
+
+            if time_stamp_sec < next_sample_sec:
+                frame_index += 1
+                continue
+
+            small = small.astype(np.float32)
+            if not shot_start:
+                motion = np.abs(small - sampled_small).mean() / 255
+                if motion >= Config.MOTION_THRESHOLD:
+                    interval_sec = Config.FRAME_SAMPLE_INTERVAL
+                else:
+                    interval_sec = min(interval_sec * 2, Config.FRAME_SAMPLE_MAX_INTERVAL)
+
+            sampled_small = small
+            last_sample_sec = time_stamp_sec
+            next_sample_sec = time_stamp_sec + interval_sec
+            sampled += 1
+            yield frame_index, time_stamp_sec, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+            frame_index += 1
+
+        logging.info(f"Sampled {sampled} of {frame_index} frames of {video_path}, {cuts} scene cuts")
+    finally:
+        cap.release()
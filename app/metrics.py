@@ -0,0 +1,249 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+from app.config import Config
+
+
+# Metrics are kept per process and rendered in the Prometheus text format.
+# Under gunicorn every worker exposes its own series on /metrics.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def _render_series(self, key, series):
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', bound)])} {count}"
+            for bound, count in zip(self.buckets, series["buckets"])
+        ]
+        lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', '+Inf')])} {series['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {series['sum']}")
+        lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {series['count']}")
+        return lines
+
+
+registry = []
+
+STAGE_SECONDS = Histogram(
+    "search_api_stage_duration_seconds",
+    "Time spent in each processing stage",
+    ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "search_api_request_duration_seconds",
+    "Time to build the response of an HTTP request",
+    ["endpoint", "method", "status"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "search_api_requests_in_flight",
+    "HTTP requests currently being served",
+    ["endpoint"]
+)
+FACES_DETECTED = Counter(
+    "search_api_faces_detected_total",
+    "Faces found by MTCNN in searched and ingested images and frames"
+)
+VECTORS_UPSERTED = Counter(
+    "search_api_vectors_upserted_total",
+    "Vectors written to the vector index",
+    ["index", "namespace"]
+)
+CACHE_LOOKUPS = Counter(
+    "search_api_cache_lookups_total",
+    "Embedding and query cache lookups by result",
+    ["cache", "result"]
+)
+MICRO_BATCH_SIZE = Histogram(
+    "search_api_micro_batch_size",
+    "Items per micro-batched model call",
+    ["batcher"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+# -------------------------------------------------- Per-request timings --------------------------------------------------
+
+class RequestTimings:
+    """Total time a request spent in each stage, rendered as a Server-Timing header"""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def header(self, total_seconds):
+        with self._lock:
+            stages = list(self.stages.items())
+        entries = [f"{stage.replace('.', '_')};dur={seconds * 1000:.1f}" for stage, seconds in stages]
+        entries.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(entries)
+
+
+class _SharedTimings:
+    # Stage times of a batch count towards every request that had an item in it
+    def __init__(self, timings):
+        self.timings = timings
+
+    def add(self, stage, seconds):
+        for timings in self.timings:
+            timings.add(stage, seconds)
+
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def current_timings():
+    """Timings of the request being served in this context, None outside of a request"""
+    return _request_timings.get()
+
+
+@contextmanager
+def attribute_timings(timings):
+    """Attributes the stages timed in this block to each of several requests' timings"""
+    timings = [t for t in timings if t is not None]
+    token = _request_timings.set(_SharedTimings(timings) if timings else None)
+    try:
+        yield
+    finally:
+        _request_timings.reset(token)
+
+
+@contextmanager
+def stage_timer(stage):
+    """Times a block into the stage histogram and the current request's timings"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(stage, seconds)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """Submits to a thread pool, carrying the caller's request timings over to the pool thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# -------------------------------------------------- Flask integration --------------------------------------------------
+
+def render():
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+def init_app(app):
+    """Registers /metrics and the per-request instrumentation"""
+
+    @app.before_request
+    def _start_request():
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or "unmatched"
+        g.metrics_timings = RequestTimings()
+        _request_timings.set(g.metrics_timings)
+        REQUESTS_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+
+    @app.after_request
+    def _finish_request(response):
+        started = g.get("metrics_started")
+        if started is None:
+            return response
+
+        seconds = time.perf_counter() - started
+        REQUEST_SECONDS.observe(seconds, endpoint=g.metrics_endpoint, method=request.method, status=response.status_code)
+        # Streamed responses only report the stages that ran before the first chunk
+        if Config.TIMING_HEADER_ENABLED:
+            response.headers["Server-Timing"] = g.metrics_timings.header(seconds)
+        return response
+
+    @app.teardown_request
+    def _end_request(exc):
+        if g.get("metrics_started") is None:
+            return
+        REQUESTS_IN_FLIGHT.dec(endpoint=g.metrics_endpoint)
+        # Server threads are reused, the next request sets its own
+        _request_timings.set(None)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render(), status=200, mimetype='text/plain; version=0.0.4')
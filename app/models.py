@@ -0,0 +1,209 @@
+import copy
+import logging
+import threading
+import contextlib
+
+import numpy as np
+import torch
+from deepface import DeepFace
+from facenet_pytorch import MTCNN
+import nemo.collections.asr as nemo_asr
+
+from app.config import Config
+from app.batching import DeviceExecutor, caller_priority
+
+
+# Process-wide model registry. Every model is loaded at most once per process
+# and shared by all request threads; loading is guarded by a lock so that two
+# concurrent first requests don't both restore the same checkpoint.
+
+_lock = threading.Lock()
+_models = {}
+
+
+def get_device():
+    """Returns the torch device models are pinned to"""
+    if Config.MODEL_DEVICE:
+        return torch.device(Config.MODEL_DEVICE)
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def _load(name, loader):
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(name)
+        if model is None:
+            logging.info(f"Loading model '{name}'")
+            model = loader()
+            _models[name] = model
+        return model
+
+
+PRECISIONS = ("fp32", "fp16", "bf16", "int8")
+_AUTOCAST_DTYPES = {"fp16": torch.float16, "bf16": torch.bfloat16}
+
+
+def _precision(name):
+    precision = getattr(Config, name)
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown {name} '{precision}', expected one of {', '.join(PRECISIONS)}")
+    return precision
+
+
+def _load_speaker_model():
+    model = nemo_asr.models.EncDecSpeakerLabelModel.from_pretrained(Config.SPEAKER_MODEL_NAME)
+    model = model.to(get_device())
+    model.eval()
+
+    if _precision("SPEAKER_MODEL_PRECISION") == "int8":
+        if get_device().type == "cpu":
+            # Weights of the linear layers in int8, activations are quantized on the fly
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        else:
+            logging.warning("Dynamic int8 quantization only runs on CPU, the speaker model stays in fp32")
+    return model
+
+
+def speaker_autocast():
+    """Autocast context for forward passes of the speaker model at SPEAKER_MODEL_PRECISION"""
+    dtype = _AUTOCAST_DTYPES.get(_precision("SPEAKER_MODEL_PRECISION"))
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=get_device().type, dtype=dtype)
+
+
+def _keras():
+    # DeepFace builds its models with tf-keras on TensorFlow >= 2.16
+    try:
+        import tf_keras
+        return tf_keras
+    except ImportError:
+        from tensorflow import keras
+        return keras
+
+
+class _TFLiteNetwork:
+    """A Keras network converted to TFLite with int8 weights, called like the Keras model.
+
+    Activations stay in float and are quantized on the fly (dynamic range
+    quantization). The interpreter is resized to the batch it is called with.
+    """
+
+    def __init__(self, network):
+        import tensorflow as tf
+
+        forward = tf.function(lambda images: network(images, training=False))
+        concrete = forward.get_concrete_function(tf.TensorSpec([None, *network.input_shape[1:]], tf.float32))
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], network)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        self._interpreter = tf.lite.Interpreter(model_content=converter.convert())
+        self._input = self._interpreter.get_input_details()[0]["index"]
+        self._output = self._interpreter.get_output_details()[0]["index"]
+        self._batch_shape = None
+        self._lock = threading.Lock()
+
+    def __call__(self, batch, training=False):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape != self._batch_shape:
+                self._interpreter.resize_tensor_input(self._input, batch.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_shape = batch.shape
+            self._interpreter.set_tensor(self._input, batch)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output)
+
+
+def _mixed_precision_network(network, precision):
+    """A copy of a Keras network whose layers compute in fp16/bf16, weights stay in fp32"""
+    policy = "mixed_float16" if precision == "fp16" else "mixed_bfloat16"
+    mixed = _keras().models.clone_model(
+        network,
+        clone_function=lambda layer: layer.__class__.from_config({**layer.get_config(), "dtype": policy})
+    )
+    mixed.set_weights(network.get_weights())
+    return mixed
+
+
+def _load_face_model():
+    # DeepFace keeps its own cache of built models, building it here just
+    # makes sure the weights are restored once, up front
+    model = DeepFace.build_model(Config.FACE_MODEL_NAME)
+
+    precision = _precision("FACE_MODEL_PRECISION")
+    if precision == "fp32":
+        return model
+
+    # A copy, so DeepFace's cached model keeps its fp32 network
+    model = copy.copy(model)
+    if precision == "int8":
+        model.model = _TFLiteNetwork(model.model)
+    else:
+        model.model = _mixed_precision_network(model.model, precision)
+    return model
+
+
+def _load_mtcnn():
+    return MTCNN(keep_all=True, device=get_device())
+
+
+def get_speaker_model():
+    """Returns the shared TitaNet speaker model (eval mode)"""
+    return _load("speaker", _load_speaker_model)
+
+
+def get_face_model():
+    """Returns the shared VGG-Face model"""
+    return _load("face", _load_face_model)
+
+
+def get_mtcnn():
+    """Returns the shared MTCNN face detector"""
+    return _load("mtcnn", _load_mtcnn)
+
+
+def load_models():
+    """Eagerly loads every model into the registry"""
+    get_mtcnn()
+    get_face_model()
+    get_speaker_model()
+
+
+def unload_models():
+    """Drops every model from the registry, e.g. to reload them at another precision"""
+    with _lock:
+        _models.clear()
+
+
+_executors = {}
+
+
+def get_device_executor():
+    """Returns the executor of the device models are pinned to"""
+    device = str(get_device())
+    with _lock:
+        executor = _executors.get(device)
+        if executor is None:
+            executor = DeviceExecutor(device, Config.DEVICE_WORKERS)
+            _executors[device] = executor
+        return executor
+
+
+def run_on_device(fn, *args, **kwargs):
+    """Runs a model call on the device executor and waits for its result.
+
+    Calls made while serving a request are searches and jump ahead of queued
+    ingestion batches.
+    """
+    if not Config.DEVICE_EXECUTOR_ENABLED:
+        return fn(*args, **kwargs)
+
+    executor = get_device_executor()
+    if executor.owns_current_thread():
+        return fn(*args, **kwargs)
+
+    return executor.submit(fn, *args, priority=caller_priority(), **kwargs).result()
@@ -0,0 +1,161 @@
+import time
+import queue
+import logging
+import threading
+
+
+# Marks the end of the stream on a stage queue
+_DONE = object()
+
+
+class Stage:
+    """A pipeline stage: `fn(item)` returns an iterable of items for the next stage (or None)"""
+
+    def __init__(self, name, fn, workers=1, queue_size=8):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.items += 1
+            self.busy_seconds += seconds
+
+    def stats(self, wall_seconds):
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / wall_seconds, 2) if wall_seconds > 0 else 0.0
+        }
+
+
+class Pipeline:
+    """Runs a source iterator and a chain of stages concurrently.
+
+    Every stage reads from its own bounded queue, so a slow stage applies
+    backpressure all the way up to the source. The first exception raised by
+    the source or any stage stops the pipeline and is re-raised from `run()`.
+    """
+
+    def __init__(self, name, stages):
+        self.name = name
+        self.stages = stages
+        self.source_items = 0
+        self._error = None
+        self._stopped = threading.Event()
+
+    def _put(self, target, item):
+        # Blocks on a full queue, but gives up once the pipeline is stopping
+        while not self._stopped.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, e):
+        if self._error is None:
+            self._error = e
+        self._stopped.set()
+
+    def _run_source(self, source):
+        first = self.stages[0].queue
+        try:
+            for item in source:
+                if not self._put(first, item):
+                    return
+                self.source_items += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(self.stages[0].workers):
+                self._put(first, _DONE)
+
+    def _run_worker(self, position, remaining):
+        stage = self.stages[position]
+        downstream = self.stages[position + 1] if position + 1 < len(self.stages) else None
+
+        while True:
+            try:
+                item = stage.queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    break
+                continue
+
+            if item is _DONE:
+                break
+
+            if self._stopped.is_set():
+                continue
+
+            try:
+                started = time.perf_counter()
+                outputs = stage.fn(item)
+                stage.record(time.perf_counter() - started)
+
+                if downstream is not None and outputs is not None:
+                    for output in outputs:
+                        if not self._put(downstream.queue, output):
+                            break
+            except Exception as e:
+                logging.error(f"Error in pipeline '{self.name}' stage '{stage.name}': {e}")
+                self._fail(e)
+
+        # The last worker of a stage to finish forwards the end of the stream
+        with remaining["lock"]:
+            remaining["count"] -= 1
+            last = remaining["count"] == 0
+        if last and downstream is not None:
+            for _ in range(downstream.workers):
+                self._put(downstream.queue, _DONE)
+
+    def run(self, source):
+        """Feeds `source` through the stages and blocks until everything is processed"""
+        started = time.perf_counter()
+
+        threads = [threading.Thread(target=self._run_source, args=(source,), name=f"{self.name}-source", daemon=True)]
+        for position, stage in enumerate(self.stages):
+            remaining = {"count": stage.workers, "lock": threading.Lock()}
+            for i in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._run_worker,
+                    args=(position, remaining),
+                    name=f"{self.name}-{stage.name}-{i}",
+                    daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        wall_seconds = time.perf_counter() - started
+        stats = {stage.name: stage.stats(wall_seconds) for stage in self.stages}
+        logging.info(
+            f"Pipeline '{self.name}' finished in {wall_seconds:.2f}s, source items: {self.source_items}, "
+            + ", ".join(f"{name}: {s['items']} items, {s['items_per_second']}/s, {s['busy_seconds']}s busy" for name, s in stats.items())
+        )
+
+        if self._error is not None:
+            raise self._error
+
+        return stats
+
+
+def batched(iterable, size):
+    """Groups an iterable into lists of at most `size` items"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
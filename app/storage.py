@@ -0,0 +1,93 @@
+import os
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import Config
+from app.metrics import stage_timer
+
+
+# Bounded pool so uploads run alongside frame sampling and embedding without
+# starting an unbounded number of transfers
+upload_executor = ThreadPoolExecutor(max_workers=Config.UPLOAD_WORKERS, thread_name_prefix="upload")
+
+
+class S3Storage:
+    """Uploads originals to the S3 bucket through boto3's multipart transfer manager"""
+
+    def __init__(self, bucket_name, region):
+        self.bucket_name = bucket_name
+        self.region = region
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use, so forked server workers don't share a client
+        with self._lock:
+            if self._client is None:
+                import boto3
+                self._client = boto3.client('s3')
+            return self._client
+
+    def link_for(self, object_name):
+        return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{object_name}"
+
+    def upload_file(self, file_path, object_name, content_type):
+        from boto3.s3.transfer import TransferConfig
+
+        transfer_config = TransferConfig(
+            multipart_threshold=Config.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=Config.S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=Config.S3_MAX_CONCURRENCY
+        )
+        self.client.upload_file(
+            file_path,
+            self.bucket_name,
+            object_name,
+            ExtraArgs={'ContentType': content_type},
+            Config=transfer_config
+        )
+        logging.info(f"File {file_path} uploaded successfully to {self.bucket_name}/{object_name}")
+        return self.link_for(object_name)
+
+
+class LocalStorage:
+    """Filesystem stand-in for S3, for tests and air-gapped deployments"""
+
+    def __init__(self, root, base_url):
+        self.root = root
+        self.base_url = base_url
+
+    def link_for(self, object_name):
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{object_name}"
+        return f"file://{os.path.abspath(os.path.join(self.root, object_name))}"
+
+    def upload_file(self, file_path, object_name, content_type):
+        destination = os.path.join(self.root, object_name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(file_path, destination)
+        logging.info(f"File {file_path} stored at {destination}")
+        return self.link_for(object_name)
+
+
+def get_storage():
+    """Returns the configured storage backend for uploaded originals"""
+    if Config.STORAGE_BACKEND == "local":
+        return LocalStorage(Config.LOCAL_STORAGE_PATH, Config.LOCAL_STORAGE_BASE_URL)
+    return S3Storage(Config.S3_BUCKET, Config.S3_REGION)
+
+
+storage = get_storage()
+
+
+def _upload(file_path, object_name, content_type):
+    with stage_timer("storage.upload"):
+        return storage.upload_file(file_path, object_name, content_type)
+
+
+def upload_async(file_path, object_name, content_type):
+    """Starts uploading a file in the background, the returned future resolves to its link"""
+    return upload_executor.submit(_upload, file_path, object_name, content_type)
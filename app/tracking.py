@@ -0,0 +1,128 @@
+import heapq
+
+import numpy as np
+
+
+def box_iou(a, b):
+    """Intersection over union of two [x1, y1, x2, y2] boxes"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    """Detections of one face across consecutive sampled frames"""
+
+    def __init__(self, track_no, time_stamp, face):
+        self.track_no = track_no
+        self.first_seen = time_stamp
+        self.last_seen = time_stamp
+        self.box = face["box"]
+        self.embedding = np.asarray(face["embedding"], dtype=np.float32)
+        self.detections = 1
+        self.representatives = [{"time_stamp": time_stamp, "box": face["box"], "embedding": face["embedding"]}]
+        self._representative_matrix = self.embedding[None, :]
+
+    def similarity(self, embedding):
+        """Best cosine similarity of an (L2-normalised) embedding to the track's representatives"""
+        return float(np.max(self._representative_matrix @ embedding))
+
+    def add(self, time_stamp, face, embedding, max_representatives, representative_similarity):
+        self.last_seen = time_stamp
+        self.box = face["box"]
+        self.embedding = embedding
+        self.detections += 1
+
+        # A pose or lighting the track has not seen yet gets its own vector, up to the cap
+        if len(self.representatives) < max_representatives and self.similarity(embedding) < representative_similarity:
+            self.representatives.append({"time_stamp": time_stamp, "box": face["box"], "embedding": face["embedding"]})
+            self._representative_matrix = np.vstack([self._representative_matrix, embedding])
+
+
+class FaceTracker:
+    """Groups the faces of sampled video frames into tracks, online.
+
+    A detection joins the active track whose last box overlaps it by at least
+    `iou_threshold` and whose representatives are at least
+    `match_similarity` similar. A detection that doesn't overlap joins a
+    track if it is at least `reid_similarity` similar, e.g. after a camera
+    cut. Tracks that go unseen for longer than `max_gap_sec` are finished.
+
+    Frames may arrive out of order (e.g. from a multi-worker pipeline stage);
+    they are buffered and processed in sequence order.
+    """
+
+    def __init__(self, iou_threshold, match_similarity, reid_similarity, max_gap_sec,
+                 max_representatives, representative_similarity):
+        self.iou_threshold = iou_threshold
+        self.match_similarity = match_similarity
+        self.reid_similarity = reid_similarity
+        self.max_gap_sec = max_gap_sec
+        self.max_representatives = max_representatives
+        self.representative_similarity = representative_similarity
+
+        self.detections = 0
+        self.tracks = 0
+
+        self._active = []
+        self._pending = []
+        self._next_sequence = 0
+
+    def add_frame(self, sequence, time_stamp, faces):
+        """Adds the faces of the `sequence`-th sampled frame, returns the tracks that finished"""
+        heapq.heappush(self._pending, (sequence, time_stamp, faces))
+
+        finished = []
+        while self._pending and self._pending[0][0] == self._next_sequence:
+            _, frame_time, frame_faces = heapq.heappop(self._pending)
+            finished.extend(self._update(frame_time, frame_faces))
+            self._next_sequence += 1
+        return finished
+
+    def finish(self):
+        """Processes any buffered frames and finishes every remaining track"""
+        finished = []
+        while self._pending:
+            _, frame_time, frame_faces = heapq.heappop(self._pending)
+            finished.extend(self._update(frame_time, frame_faces))
+        finished.extend(self._active)
+        self._active = []
+        return finished
+
+    def _update(self, time_stamp, faces):
+        finished = [track for track in self._active if time_stamp - track.last_seen > self.max_gap_sec]
+        self._active = [track for track in self._active if time_stamp - track.last_seen <= self.max_gap_sec]
+
+        embeddings = [np.asarray(face["embedding"], dtype=np.float32) for face in faces]
+
+        # Score every (detection, track) pair, then assign greedily from the best pair down
+        candidates = []
+        for face_no, (face, embedding) in enumerate(zip(faces, embeddings)):
+            for track_no, track in enumerate(self._active):
+                similarity = track.similarity(embedding)
+                overlaps = box_iou(face["box"], track.box) >= self.iou_threshold
+                if (overlaps and similarity >= self.match_similarity) or similarity >= self.reid_similarity:
+                    candidates.append((similarity, face_no, track_no))
+        candidates.sort(reverse=True)
+
+        assigned_faces = set()
+        assigned_tracks = set()
+        for _, face_no, track_no in candidates:
+            if face_no in assigned_faces or track_no in assigned_tracks:
+                continue
+            self._active[track_no].add(
+                time_stamp, faces[face_no], embeddings[face_no],
+                self.max_representatives, self.representative_similarity
+            )
+            assigned_faces.add(face_no)
+            assigned_tracks.add(track_no)
+
+        for face_no, face in enumerate(faces):
+            if face_no not in assigned_faces:
+                self.tracks += 1
+                self._active.append(FaceTrack(self.tracks, time_stamp, face))
+
+        self.detections += len(faces)
+        return finished
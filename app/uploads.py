@@ -0,0 +1,84 @@
+import os
+import shutil
+import logging
+import tempfile
+from concurrent.futures import wait
+
+from flask import Request
+
+from app.config import Config
+
+
+class SpooledUpload(tempfile.SpooledTemporaryFile):
+    """Receives one multipart file part: in memory up to `max_size`, then spilled to a named file.
+
+    The spill file is created in the upload directory, so moving the upload
+    into a job directory is a rename rather than a second copy of the data.
+    A spill file that was never claimed is removed when the upload is closed.
+    """
+
+    def __init__(self, max_size, directory):
+        super().__init__(max_size=max_size, mode="w+b")
+        self.directory = directory
+        self.path = None
+
+    def rollover(self):
+        if self._rolled:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        spooled = self._file
+        spill = tempfile.NamedTemporaryFile(dir=self.directory, prefix="incoming-", delete=False)
+        spill.write(spooled.getvalue())
+        spill.seek(spooled.tell(), 0)
+
+        self._file = spill
+        self.path = spill.name
+        self._rolled = True
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self.path is not None:
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+                self.path = None
+
+
+class StreamingRequest(Request):
+    """Request whose file parts are written once while the body is parsed, instead of parsed then copied"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledUpload(Config.UPLOAD_SPOOL_MAX_BYTES, Config.UPLOAD_SPOOL_PATH)
+
+
+def save_upload(file, destination):
+    """Moves an uploaded file to `destination`, renaming its spill file when it has one"""
+    stream = file.stream
+    if isinstance(stream, SpooledUpload) and stream.path is not None:
+        stream.flush()
+        try:
+            os.replace(stream.path, destination)
+        except OSError:
+            # Different filesystems, fall back to a copy
+            shutil.move(stream.path, destination)
+        stream.path = None
+    else:
+        file.save(destination)
+
+
+def remove_uploads(directory, pending=()):
+    """Deletes a job's upload directory once the transfers still reading from it are done"""
+    wait(pending)
+    if Config.KEEP_UPLOADS or not directory:
+        return
+
+    try:
+        shutil.rmtree(directory)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.error(f"Error removing upload directory '{directory}': {e}")
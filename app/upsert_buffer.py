@@ -0,0 +1,152 @@
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import Config
+
+
+class UpsertBuffer:
+    """Accumulates vectors per namespace and upserts them to the index in batches.
+
+    A batch is sent once it reaches `batch_size` vectors, or by the background
+    flusher once it has waited `flush_interval` seconds. Batches are sent from a
+    thread pool so up to `parallelism` requests are in flight at once. At most
+    twice that many batches are sent or queued; `add` blocks beyond that, so a
+    slow index holds back the producer instead of piling up batches. Failed
+    batches are collected in `failures` instead of raising, so the caller can
+    report them once the buffer is closed.
+    """
+
+    def __init__(self, index, batch_size=None, flush_interval=None, parallelism=None):
+        self.index = index
+        self.batch_size = batch_size or Config.UPSERT_BATCH_SIZE
+        self.flush_interval = flush_interval or Config.UPSERT_FLUSH_INTERVAL
+
+        self.upserted = 0
+        self.failures = []
+
+        self._pending = defaultdict(list)
+        self._lock = threading.Lock()
+        # Counters have their own lock, `_lock` is held while waiting for a free batch slot
+        self._results_lock = threading.Lock()
+
+        parallelism = parallelism or Config.UPSERT_PARALLELISM
+        self._executor = ThreadPoolExecutor(max_workers=parallelism)
+        self._in_flight = threading.BoundedSemaphore(parallelism * 2)
+
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, vector, namespace):
+        """Queues a single vector for upsert into `namespace`"""
+        with self._lock:
+            pending = self._pending[namespace]
+            pending.append(vector)
+            if len(pending) >= self.batch_size:
+                self._send(namespace)
+
+    def flush(self):
+        """Sends every pending vector without waiting for the requests to complete"""
+        with self._lock:
+            for namespace in list(self._pending):
+                self._send(namespace)
+
+    def close(self):
+        """Flushes the remaining vectors and waits for all in-flight batches"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def _send(self, namespace):
+        # Called with the lock held
+        vectors = self._pending.pop(namespace, [])
+        if vectors:
+            self._in_flight.acquire()
+            try:
+                self._executor.submit(self._upsert, vectors, namespace)
+            except Exception:
+                self._in_flight.release()
+                raise
+
+    def _upsert(self, vectors, namespace):
+        try:
+            self.index.upsert(vectors=vectors, namespace=namespace)
+            with self._results_lock:
+                self.upserted += len(vectors)
+        except Exception as e:
+            logging.error(f"Error upserting {len(vectors)} vectors into '{namespace}': {e}")
+            with self._results_lock:
+                self.failures.append({
+                    "namespace": namespace,
+                    "ids": [vector["id"] for vector in vectors],
+                    "error": str(e)
+                })
+        finally:
+            self._in_flight.release()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+
+class UploadGate:
+    """Holds the vectors of one file until the upload of its original has succeeded.
+
+    Vectors pass straight through to the upsert buffer once the upload is
+    done, so they are only held while it is still in flight. If the upload
+    fails the held vectors are dropped and further adds raise its error, so
+    the index never points at an original that was not stored.
+    """
+
+    def __init__(self, upsert_buffer, upload):
+        self.upsert_buffer = upsert_buffer
+        self.upload = upload
+
+        self._held = []
+        self._released = False
+        self._lock = threading.Lock()
+
+    @property
+    def upserted(self):
+        return self.upsert_buffer.upserted
+
+    def add(self, vector, namespace):
+        with self._lock:
+            if not self._released and self.upload.done():
+                self._release()
+            if self._released:
+                self.upsert_buffer.add(vector, namespace=namespace)
+            else:
+                self._held.append((vector, namespace))
+
+    def release(self):
+        """Waits for the upload, forwards the held vectors and returns its result, or raises its error"""
+        self.upload.exception()
+        with self._lock:
+            if not self._released:
+                self._release()
+        return self.upload.result()
+
+    def _release(self):
+        # Called with the lock held once the upload is done
+        error = self.upload.exception()
+        if error is not None:
+            self._held = []
+            raise error
+
+        for vector, namespace in self._held:
+            self.upsert_buffer.add(vector, namespace=namespace)
+        self._held = []
+        self._released = True
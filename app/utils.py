@@ -1,46 +1,98 @@
-import os
-import cv2
-import uuid
-
-import json
 import torch
+import numpy as np
 
-import ffmpeg
 import logging
-import mimetypes
 
-import tempfile
 from PIL import Image
 
-from deepface import DeepFace
-
-from datetime import timedelta
-
-
-from facenet_pytorch import MTCNN
-import nemo.collections.asr as nemo_asr
+from deepface.modules import preprocessing
 
-from pinecone.grpc import PineconeGRPC as Pinecone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 from app.config import Config
-
-
-
-# Initialize MTCNN for face detection
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-mtcnn = MTCNN(keep_all=True, device=device)
-
-
-# -------------------------------------------------- Pinecone Utility--------------------------------------------------
-
-def get_pinecone_index(api_key, index_name):
-    try:
-        pc = Pinecone(api_key=api_key)
-        return pc.Index(index_name)
-    except Exception as e:
-        logging.error(f"Error initializing Pinecone index '{index_name}': {e}")
-        return None
+from app.models import get_speaker_model, get_face_model, get_mtcnn, run_on_device, speaker_autocast
+from app.batching import MicroBatcher, group_by_length
+from app.cache import embedding_cache, bytes_digest, file_digest
+from app.pipeline import batched
+from app.media import decode_audio, iter_audio_windows, is_voiced
+from app.metrics import stage_timer, submit_in_context, FACES_DETECTED
+
+
+# -------------------------------------------------- Vector Index Utility--------------------------------------------------
+
+# Shared pool for fanning out index queries, so search latency follows the slowest query
+query_executor = ThreadPoolExecutor(max_workers=Config.QUERY_WORKERS, thread_name_prefix="index-query")
+
+
+def query_vectors(index, vectors, namespaces, top_k):
+    """Queries several namespaces for several vectors, all concurrently.
+
+    Returns one {namespace: result} dict per vector.
+    """
+    futures = [
+        {
+            namespace: submit_in_context(
+                query_executor,
+                index.query,
+                namespace=namespace,
+                vector=vector,
+                top_k=top_k,
+                include_metadata=True
+            )
+            for namespace in namespaces
+        }
+        for vector in vectors
+    ]
+    return [{namespace: future.result() for namespace, future in vector_futures.items()} for vector_futures in futures]
+
+
+def iter_query_results(index, vectors_per_input, namespaces, top_k):
+    """Queries several namespaces for the vectors of several inputs, all concurrently.
+
+    Yields (input_position, results) as soon as every query of an input has
+    finished, where results holds one {namespace: result} dict per vector, or
+    (input_position, exception) if one of its queries failed.
+    """
+    futures = {}
+    results = []
+    remaining = []
+    for position, vectors in enumerate(vectors_per_input):
+        results.append([{} for _ in vectors])
+        remaining.append(len(vectors) * len(namespaces))
+        for vector_no, vector in enumerate(vectors):
+            for namespace in namespaces:
+                future = submit_in_context(
+                    query_executor,
+                    index.query,
+                    namespace=namespace,
+                    vector=vector,
+                    top_k=top_k,
+                    include_metadata=True
+                )
+                futures[future] = (position, vector_no, namespace)
+
+    # Inputs without vectors have nothing to wait for
+    for position, count in enumerate(remaining):
+        if count == 0:
+            yield position, results[position]
+
+    failed = set()
+    for future in as_completed(futures):
+        position, vector_no, namespace = futures[future]
+        if position in failed:
+            continue
+
+        try:
+            results[position][vector_no][namespace] = future.result()
+        except Exception as e:
+            failed.add(position)
+            yield position, e
+            continue
+
+        remaining[position] -= 1
+        if remaining[position] == 0:
+            yield position, results[position]
 
 
 # -------------------------------------------------- Audio Utility --------------------------------------------------
@@ -55,116 +107,327 @@ def convert_audio_to_wav(file_path, target_sample_rate=16000):
     return temp_wav_path
 """
 
-def get_embedding(wav):
-    speaker_model = nemo_asr.models.EncDecSpeakerLabelModel.from_pretrained("nvidia/speakerverification_en_titanet_large")
-    emb = speaker_model.get_embedding(wav)
-    return emb.cpu().squeeze().tolist()
+def _audio_digest(audio):
+    return bytes_digest(audio) if isinstance(audio, bytes) else file_digest(audio)
 
 
-def convert_audio_to_wav(file_path, target_sample_rate=16000):
-    temp_wav_path = tempfile.NamedTemporaryFile(suffix=".wav", delete=False).name
+def get_audio_embedding(audio):
+    """Decodes audio (bytes or a file path) and returns its speaker embedding.
 
-    try:
-        # Attempt to convert the file using ffmpeg
-        ffmpeg.input(file_path).output(
-            temp_wav_path, ar=target_sample_rate, ac=1, format='wav'
-        ).run(quiet=True, overwrite_output=True)
-        return temp_wav_path
-    except ffmpeg.Error as e:
-        print(f"Error during conversion: {e.stderr.decode()}")
-        if os.path.exists(temp_wav_path):
-            os.remove(temp_wav_path)
-        raise Exception("Audio conversion failed. Please check the input format.")
+    Results are cached on the content, so a repeated upload skips decoding
+    and the model entirely.
+    """
+    key = embedding_cache.key(_audio_digest(audio), Config.SPEAKER_MODEL_NAME, "speaker")
+    embedding = embedding_cache.get(key)
+    if embedding is not None:
+        return embedding
+
+    embedding = get_embedding(decode_audio(audio))
+
+    embedding_cache.put(key, embedding)
+    return embedding
+
+
+# Shared pool for running several ffmpeg decodes at once
+transcode_executor = ThreadPoolExecutor(max_workers=Config.TRANSCODE_WORKERS, thread_name_prefix="transcode")
+
+
+def get_audio_embeddings(audios):
+    """Speaker embeddings for several audio inputs (bytes or file paths).
+
+    Cached inputs are served from the embedding cache, the others are
+    decoded in parallel and embedded in batches of SPEAKER_EMBED_BATCH_SIZE.
+    Inputs that fail to decode or embed get None.
+    """
+    keys = [embedding_cache.key(_audio_digest(audio), Config.SPEAKER_MODEL_NAME, "speaker") for audio in audios]
+    embeddings = [embedding_cache.get(key) for key in keys]
+
+    futures = {
+        position: submit_in_context(transcode_executor, decode_audio, audios[position])
+        for position, embedding in enumerate(embeddings) if embedding is None
+    }
+
+    signals = {}
+    for position, future in futures.items():
+        try:
+            signals[position] = future.result()
+        except Exception as e:
+            logging.error(f"Error decoding audio input {position}: {e}")
+
+    for positions in batched(list(signals), Config.SPEAKER_EMBED_BATCH_SIZE):
+        try:
+            batch_embeddings = embed_signals([signals[position] for position in positions])
+        except Exception as e:
+            logging.error(f"Error embedding a batch of {len(positions)} audio inputs: {e}")
+            continue
+
+        for position, embedding in zip(positions, batch_embeddings):
+            embeddings[position] = embedding
+            embedding_cache.put(keys[position], embedding)
+
+    return embeddings
+
+
+def embed_signals(signals):
+    """Runs a batch of 16 kHz mono float32 signals through TitaNet.
+
+    Signals of similar length share a forward pass, each pass holds at most
+    SPEAKER_BATCH_MAX_SAMPLES padded samples, so one long recording in a
+    batch doesn't pad every short clip to its length.
+    """
+    speaker_model = get_speaker_model()
+    lengths = [len(signal) for signal in signals]
+
+    def forward(positions):
+        # Zero-pad to the longest signal, the lengths tell the model where each one ends
+        batch = np.zeros((len(positions), max(lengths[position] for position in positions)), dtype=np.float32)
+        for i, position in enumerate(positions):
+            batch[i, :lengths[position]] = signals[position]
+
+        with torch.no_grad(), speaker_autocast():
+            _, embs = speaker_model.forward(
+                input_signal=torch.tensor(batch, device=speaker_model.device),
+                input_signal_length=torch.tensor([lengths[position] for position in positions], device=speaker_model.device)
+            )
+        return embs.float().cpu().numpy()
+
+    embeddings = [None] * len(signals)
+    with stage_timer("get_embedding"):
+        for positions in group_by_length(lengths, Config.SPEAKER_BATCH_MAX_SAMPLES):
+            for position, embedding in zip(positions, run_on_device(forward, positions).tolist()):
+                embeddings[position] = embedding
+    return embeddings
+
+
+# Single signals from concurrent requests share TitaNet forward passes
+speaker_batcher = MicroBatcher(
+    "speaker",
+    embed_signals,
+    Config.MICRO_BATCH_MAX_SIZE,
+    Config.MICRO_BATCH_MAX_WAIT_MS / 1000,
+    enabled=Config.MICRO_BATCHING_ENABLED
+)
+
+
+def get_embedding(signal):
+    """Speaker embedding of a single 16 kHz mono float32 signal"""
+    return speaker_batcher.submit(signal).result()
+
+
+def iter_segment_embeddings(audio_path):
+    """Yields {"start", "end", "embedding"} for the windows of a recording.
+
+    Silent windows are skipped when AUDIO_VAD_ENABLED is set, the others go
+    through TitaNet in batches of SPEAKER_EMBED_BATCH_SIZE. The segments of a
+    file are cached on its content and the window settings.
+    """
+    settings = f"{Config.AUDIO_WINDOW_SEC}:{Config.AUDIO_HOP_SEC}:{Config.AUDIO_VAD_ENABLED}:{Config.AUDIO_VAD_THRESHOLD_DB}"
+    key = embedding_cache.key(f"{file_digest(audio_path)}:{settings}", Config.SPEAKER_MODEL_NAME, "speaker-segments")
+    segments = embedding_cache.get(key)
+    if segments is not None:
+        yield from segments
+        return
+
+    windows = (
+        window for window in iter_audio_windows(audio_path)
+        if not Config.AUDIO_VAD_ENABLED or is_voiced(window[2])
+    )
+
+    segments = []
+    for batch in batched(windows, Config.SPEAKER_EMBED_BATCH_SIZE):
+        for (start, end, _), embedding in zip(batch, embed_signals([samples for _, _, samples in batch])):
+            segment = {"start": round(start, 2), "end": round(end, 2), "embedding": embedding}
+            segments.append(segment)
+            yield segment
+
+    embedding_cache.put(key, segments)
 
 
 # ---------------------------------- Video Utility -----------------------------------------------------------------
 
-def generate_embeddings(image_path):
-    """Generates Embeddings from deepface library"""
-    try:
-        embedding_objs = DeepFace.represent(
-            img_path=image_path,
-            model_name="VGG-Face",
-            detector_backend="skip",
-            enforce_detection=False,
-            align=False,
-            expand_percentage=0,
-            normalization="raw"
-        )
-        return embedding_objs[0]["embedding"]
-    except Exception as e:
-        logging.error(f"Error generating embedding for image '{image_path}': {e}")
-        return None
-    
-    
-    
-def crop_faces(image_path):
-    """Detects and crops all faces from the image using MTCNN."""
-    try:
-        image = Image.open(image_path)
-        
-        # Convert the image to RGB format to ensure compatibility
-        image = image.convert('RGB')
-        
-        # Detect faces in the image
-        boxes, probs = mtcnn.detect(image)
-
-        cropped_images_paths = []
-
-        if boxes is not None and len(boxes) > 0:
-            # Iterate over all detected faces and crop them
-            for i, box in enumerate(boxes):
-                cropped_image = image.crop((box[0], box[1], box[2], box[3]))
-
-                # Generate a unique name for each cropped image
-                unique_id = uuid.uuid4()
-                cropped_image_path = os.path.join("temp", f"cropped_face_{unique_id}.jpg")
-                
-                # Save each cropped image
-                cropped_image.save(cropped_image_path)
-                cropped_images_paths.append(cropped_image_path)
-
-            return cropped_images_paths
-        else:
-            logging.warning("No faces detected in the image.")
-            return []
-    except Exception as e:
-        logging.error(f"Error during face cropping: {e}")
+def generate_embeddings_batch(faces):
+    """Generates embeddings for a list of RGB face crops in a single forward pass"""
+    if len(faces) == 0:
+        return []
+
+    model = get_face_model()
+    target_size = model.input_shape
+
+    # Same preprocessing DeepFace.represent applies to a single image: VGG-Face
+    # takes BGR input, the crops are RGB
+    batch = np.concatenate([
+        preprocessing.resize_image(img=face[:, :, ::-1], target_size=(target_size[1], target_size[0]))
+        for face in faces
+    ])
+    batch = preprocessing.normalize_input(img=batch, normalization="raw")
+
+    with stage_timer("generate_embeddings"):
+        # fp32 out of reduced precision networks too, the norm of a 4096-dim fp16 row can overflow
+        embeddings = run_on_device(lambda: np.asarray(model.model(batch, training=False), dtype=np.float32))
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings.tolist()
+
+
+# Face crops from concurrent requests share VGG-Face forward passes
+face_embedding_batcher = MicroBatcher(
+    "face",
+    generate_embeddings_batch,
+    Config.MICRO_BATCH_MAX_SIZE,
+    Config.MICRO_BATCH_MAX_WAIT_MS / 1000,
+    enabled=Config.MICRO_BATCHING_ENABLED
+)
+
+
+def _crop_boxes(image, boxes):
+    """Crops the given MTCNN boxes out of an RGB array, returns the crops and their clipped boxes"""
+    if boxes is None:
+        return [], []
+
+    height, width = image.shape[:2]
+    crops = []
+    crop_boxes = []
+    for box in boxes:
+        x1, y1 = max(int(box[0]), 0), max(int(box[1]), 0)
+        x2, y2 = min(int(box[2]), width), min(int(box[3]), height)
+        if x2 > x1 and y2 > y1:
+            crops.append(image[y1:y2, x1:x2])
+            crop_boxes.append([x1, y1, x2, y2])
+    FACES_DETECTED.inc(len(crops))
+    return crops, crop_boxes
+
+
+def _detect_images(images):
+    """MTCNN boxes of several RGB arrays, one call per group of same-sized images"""
+    groups = {}
+    for position, image in enumerate(images):
+        groups.setdefault(image.shape, []).append(position)
+
+    boxes = [None] * len(images)
+    for positions in groups.values():
+        batch_boxes, _ = run_on_device(get_mtcnn().detect, np.stack([images[position] for position in positions]))
+        for position, image_boxes in zip(positions, batch_boxes):
+            boxes[position] = image_boxes
+    return boxes
+
+
+# Images from concurrent requests share MTCNN calls when their sizes match
+face_detection_batcher = MicroBatcher(
+    "detection",
+    _detect_images,
+    Config.MICRO_BATCH_MAX_SIZE,
+    Config.MICRO_BATCH_MAX_WAIT_MS / 1000,
+    enabled=Config.MICRO_BATCHING_ENABLED
+)
+
+
+def _rgb_array(image):
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    # Convert the image to RGB format to ensure compatibility
+    return np.asarray(image.convert('RGB'))
+
+
+def detect_faces(image):
+    """Detects all faces in the image using MTCNN.
+
+    Accepts an image path or a PIL image and returns the face crops as RGB
+    arrays together with their [x1, y1, x2, y2] boxes.
+    """
+    cropped_faces, boxes = detect_faces_many([image])[0]
+    if len(cropped_faces) == 0:
+        logging.warning("No faces detected in the image.")
+    return cropped_faces, boxes
+
+
+def detect_faces_many(images):
+    """Detects the faces of several images (paths or PIL images).
+
+    Every image is handed to the detection micro-batcher before any result is
+    awaited, so same-sized images share MTCNN calls. Returns one (crops, boxes)
+    pair per image, empty for an image that could not be read or processed.
+    """
+    arrays = []
+    futures = []
+    for image in images:
+        try:
+            array = _rgb_array(image)
+            futures.append(face_detection_batcher.submit(array))
+        except Exception as e:
+            logging.error(f"Error reading image for face detection: {e}")
+            array = None
+            futures.append(None)
+        arrays.append(array)
+
+    detections = []
+    with stage_timer("detect_faces"):
+        for array, future in zip(arrays, futures):
+            try:
+                detections.append(_crop_boxes(array, future.result()) if future is not None else ([], []))
+            except Exception as e:
+                logging.error(f"Error during face cropping: {e}")
+                detections.append(([], []))
+    return detections
+
+
+def detect_faces_batch(frames):
+    """Detects faces in a batch of same-sized RGB frames in one MTCNN call.
+
+    Returns one (crops, boxes) pair per frame.
+    """
+    if len(frames) == 0:
         return []
-    
-    
-    
-def convert_video_to_30fps(input_path, output_path):
-    """Converts video files into 30fps"""
+
     try:
-        # Open the video file
-        cap = cv2.VideoCapture(input_path)
-        if not cap.isOpened():
-            raise Exception(f"Cannot open video file: {input_path}")
-
-        # Get video properties
-        original_fps = int(cap.get(cv2.CAP_PROP_FPS))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Codec for MP4
-
-        # Create VideoWriter object for output video at 30 FPS
-        out = cv2.VideoWriter(output_path, fourcc, 30, (width, height))
-
-        # Read and write frames to the output file
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            out.write(frame)
-
-        # Release resources
-        cap.release()
-        out.release()
-
-        logging.info(f"Video converted to 30 FPS and saved at: {output_path}")
-        return output_path
+        with stage_timer("detect_faces"):
+            batch_boxes, batch_probs = run_on_device(get_mtcnn().detect, np.stack(frames))
+        return [_crop_boxes(frame, boxes) for frame, boxes in zip(frames, batch_boxes)]
     except Exception as e:
-        logging.error(f"Error converting video to 30 FPS: {e}")
-        return None
+        logging.error(f"Error during batched face cropping: {e}")
+        return [([], []) for _ in frames]
+
+
+def get_face_embeddings_batch(image_paths):
+    """Detects and embeds the faces of several image files.
+
+    Cached images are served from the embedding cache. For the others,
+    detection is submitted for all images at once and the crops of all images are
+    embedded together in batches of FACE_EMBED_BATCH_SIZE. Returns one list
+    of {"box", "embedding"} dicts per image.
+    """
+    keys = [embedding_cache.key(file_digest(path), Config.FACE_MODEL_NAME, "faces") for path in image_paths]
+    results = [embedding_cache.get(key) for key in keys]
+
+    # Detection of all uncached images is submitted at once, same-sized images share MTCNN calls
+    uncached = [position for position, faces in enumerate(results) if faces is None]
+    detections = dict(zip(uncached, detect_faces_many([image_paths[position] for position in uncached])))
+
+    crops = [(position, crop) for position, (cropped_faces, _) in detections.items() for crop in cropped_faces]
+    face_embeddings = []
+    for chunk in batched(crops, Config.FACE_EMBED_BATCH_SIZE):
+        face_embeddings.extend(generate_embeddings_batch([crop for _, crop in chunk]))
+
+    face_embeddings = iter(face_embeddings)
+    for position, (_, boxes) in detections.items():
+        results[position] = [{"box": box, "embedding": next(face_embeddings)} for box in boxes]
+        embedding_cache.put(keys[position], results[position])
+
+    return results
+
+
+def get_face_embeddings(image_path):
+    """Detects and embeds every face of an image file.
+
+    Returns a list of {"box", "embedding"} dicts. Results are cached on the
+    image content, so a repeated upload skips decoding and inference.
+    """
+    key = embedding_cache.key(file_digest(image_path), Config.FACE_MODEL_NAME, "faces")
+    faces = embedding_cache.get(key)
+    if faces is not None:
+        return faces
+
+    cropped_faces, boxes = detect_faces(image_path)
+    face_embeddings = face_embedding_batcher.map(cropped_faces)
+    faces = [{"box": box, "embedding": embedding} for box, embedding in zip(boxes, face_embeddings)]
 
+    embedding_cache.put(key, faces)
+    return faces
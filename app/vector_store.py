@@ -0,0 +1,466 @@
+import os
+import json
+import time
+import fcntl
+import atexit
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.config import Config
+from app.compression import PCAProjection, ProjectedIndex, VECTOR_DTYPES, encode_rows, decode_rows, row_scores
+
+
+class VectorStore(ABC):
+    """Interface of a vector index: namespaced upserts and top-k queries.
+
+    Query results follow the Pinecone shape, `{"matches": [{"id", "score", "metadata"}]}`,
+    so the blueprints don't care which backend is configured.
+    """
+
+    @abstractmethod
+    def upsert(self, vectors, namespace):
+        """Inserts or overwrites `vectors` ({"id", "values", "metadata"} dicts) in `namespace`"""
+
+    @abstractmethod
+    def query(self, namespace, vector, top_k, include_metadata=True):
+        """Returns the `top_k` closest vectors of `namespace` by cosine similarity"""
+
+
+# -------------------------------------------------- Pinecone backend --------------------------------------------------
+
+def get_pinecone_index(api_key, index_name):
+    try:
+        from pinecone.grpc import PineconeGRPC as Pinecone
+
+        pc = Pinecone(api_key=api_key)
+        return pc.Index(index_name)
+    except Exception as e:
+        logging.error(f"Error initializing Pinecone index '{index_name}': {e}")
+        return None
+
+
+class PineconeVectorStore(VectorStore):
+    """Remote Pinecone index over gRPC"""
+
+    def __init__(self, index_name):
+        self.index_name = index_name
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        # Connected on first use: gRPC channels don't survive the fork of preloaded server workers
+        with self._lock:
+            if self._index is None:
+                self._index = get_pinecone_index(Config.PINECONE_API_KEY, self.index_name)
+            return self._index
+
+    def upsert(self, vectors, namespace):
+        return self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def query(self, namespace, vector, top_k, include_metadata=True):
+        return self.index.query(
+            namespace=namespace,
+            vector=vector,
+            top_k=top_k,
+            include_metadata=include_metadata
+        )
+
+
+# -------------------------------------------------- Local backend --------------------------------------------------
+
+_EMBEDDING_FILES = {"float32": "embeddings.f32", "float16": "embeddings.f16", "int8": "embeddings.i8"}
+
+
+class _LocalNamespace:
+    """One namespace of the local store.
+
+    Embeddings are L2-normalised rows in a memory-mapped file, so the scores
+    are cosine similarities (the metric of our Pinecone indexes) and a restart
+    maps the file instead of reading it into RAM. Rows are float32, or float16
+    or int8 (with a float32 scale per row) to halve or quarter the file; a
+    namespace keeps the dtype it was created with. Ids and metadata live in
+    SQLite next to it; metadata is only read back for the returned matches.
+
+    Several processes (server workers, the job leader) may open the same
+    namespace. Upserts hold an exclusive file lock and bump a generation
+    counter in SQLite with every write; queries and upserts hold the lock and
+    first catch up with the rows other processes wrote since the generation
+    they last saw, so rows are never allocated twice.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._scales_path = os.path.join(directory, "scales.f32")
+        self._info_path = os.path.join(directory, "info.json")
+        self._hnsw_path = os.path.join(directory, "hnsw.bin")
+        self._lock_path = os.path.join(directory, "lock")
+
+        self._ids = []
+        self._rows = {}
+        self._generation = -1
+
+        self.dimension = None
+        self.dtype = Config.LOCAL_VECTOR_DTYPE
+        self._capacity = 0
+        self._embeddings = None
+        self._scales = None
+
+        self._hnsw = None
+        self._hnsw_dirty = False
+        self._hnsw_saved_at = time.time()
+
+        with self._lock, self._file_lock(exclusive=True):
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS vectors (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, metadata TEXT)"
+                )
+                # Rows written before the generation counter existed count as generation 0
+                if "seq" not in [column[1] for column in conn.execute("PRAGMA table_info(vectors)")]:
+                    conn.execute("ALTER TABLE vectors ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+                conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._refresh()
+
+        if self.dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype '{self.dtype}', expected one of {', '.join(VECTOR_DTYPES)}")
+
+    def _connect(self):
+        return sqlite3.connect(os.path.join(self.directory, "metadata.sqlite3"), timeout=30)
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        # Callers hold self._lock, so one thread per process uses the lock file at a time
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _state(conn, key):
+        row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    @property
+    def count(self):
+        return len(self._rows)
+
+    def _map(self):
+        self._embeddings = np.memmap(
+            os.path.join(self.directory, _EMBEDDING_FILES[self.dtype]),
+            dtype=self.dtype,
+            mode="r+",
+            shape=(self._capacity, self.dimension)
+        )
+        if self.dtype == "int8":
+            self._scales = np.memmap(self._scales_path, dtype=np.float32, mode="r+", shape=(self._capacity,))
+
+    def _unmap(self):
+        if self._embeddings is not None:
+            self._embeddings.flush()
+            self._embeddings = None
+        if self._scales is not None:
+            self._scales.flush()
+            self._scales = None
+
+    def _decoded(self, rows):
+        """Stored rows (a list or a slice) as float32"""
+        scales = None if self._scales is None else self._scales[rows]
+        return decode_rows(self._embeddings[rows], scales)
+
+    def _load_info(self):
+        """Maps the embeddings at the dimension, dtype and capacity recorded on disk"""
+        if not os.path.exists(self._info_path):
+            return
+        with open(self._info_path) as f:
+            info = json.load(f)
+        if info["capacity"] == self._capacity and self._embeddings is not None:
+            return
+
+        self._unmap()
+        self.dimension = info["dimension"]
+        self.dtype = info.get("dtype", "float32")
+        self._capacity = info["capacity"]
+        self._map()
+        if self._hnsw is not None:
+            self._hnsw.resize_index(self._capacity)
+
+    def _refresh(self):
+        """Catches up with the rows written by other processes, called with both locks held"""
+        with self._connect() as conn:
+            generation = self._state(conn, "generation")
+            if generation == self._generation:
+                return
+            changed = conn.execute(
+                "SELECT row, id FROM vectors WHERE seq > ? ORDER BY row", (self._generation,)
+            ).fetchall()
+
+        # Rows are allocated contiguously and never move, an overwritten id keeps its row
+        for row, vector_id in changed:
+            if row >= len(self._ids):
+                self._ids.append(vector_id)
+            self._rows[vector_id] = row
+
+        self._load_info()
+        if Config.LOCAL_INDEX_TYPE == "hnsw" and self.dimension is not None:
+            if self._hnsw is None:
+                self._load_hnsw()
+            elif changed and self._generation >= 0:
+                rows = [row for row, _ in changed]
+                self._hnsw.add_items(self._decoded(rows), rows)
+                self._hnsw_dirty = True
+        self._generation = generation
+
+    def _ensure_capacity(self, dimension, rows):
+        if self.dimension is None:
+            self.dimension = dimension
+
+        if rows <= self._capacity:
+            return
+
+        capacity = max(rows, self._capacity * 2, 1024)
+        self._unmap()
+
+        # Growing the files keeps the existing rows in place
+        with open(os.path.join(self.directory, _EMBEDDING_FILES[self.dtype]), "ab") as f:
+            f.truncate(capacity * self.dimension * np.dtype(self.dtype).itemsize)
+        if self.dtype == "int8":
+            with open(self._scales_path, "ab") as f:
+                f.truncate(capacity * 4)
+        self._capacity = capacity
+        self._map()
+
+        with open(self._info_path, "w") as f:
+            json.dump({"dimension": self.dimension, "capacity": self._capacity, "dtype": self.dtype}, f)
+
+        if self._hnsw is not None:
+            self._hnsw.resize_index(capacity)
+
+    def upsert(self, vectors):
+        if not vectors:
+            return
+
+        values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values = values / np.where(norms == 0, 1, norms)
+
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh()
+            if self.dimension is not None and values.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match the namespace dimension {self.dimension}")
+
+            # Existing ids are overwritten in place, new ids are appended
+            rows = []
+            new_ids = []
+            next_row = self.count
+            for vector in vectors:
+                row = self._rows.get(vector["id"])
+                if row is None:
+                    row = next_row
+                    next_row += 1
+                    self._rows[vector["id"]] = row
+                    new_ids.append(vector["id"])
+                rows.append(row)
+            self._ids.extend(new_ids)
+
+            try:
+                self._ensure_capacity(values.shape[1], next_row)
+                encoded, scales = encode_rows(values, self.dtype)
+                self._embeddings[rows] = encoded
+                self._embeddings.flush()
+                if scales is not None:
+                    self._scales[rows] = scales
+                    self._scales.flush()
+
+                # The embeddings are on disk before the new generation makes them visible
+                generation = self._generation + 1
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO vectors (row, id, metadata, seq) VALUES (?, ?, ?, ?)",
+                        [(row, vector["id"], json.dumps(vector.get("metadata", {})), generation) for row, vector in zip(rows, vectors)]
+                    )
+                    conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('generation', ?)", (generation,))
+            except Exception:
+                # Forget the rows that were never committed, the next refresh starts from what is on disk
+                for vector_id in new_ids:
+                    del self._rows[vector_id]
+                del self._ids[len(self._ids) - len(new_ids):]
+                raise
+            self._generation = generation
+
+            if Config.LOCAL_INDEX_TYPE == "hnsw":
+                if self._hnsw is None:
+                    self._load_hnsw()
+                if self._hnsw is not None:
+                    self._hnsw.add_items(values, rows)
+                    self._hnsw_dirty = True
+                    if time.time() - self._hnsw_saved_at >= Config.LOCAL_INDEX_SAVE_INTERVAL:
+                        self._save_hnsw()
+
+    def query(self, vector, top_k, include_metadata=True):
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh()
+            count = self.count
+            if count == 0:
+                return {"matches": []}
+
+            query = np.asarray(vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1)
+            top_k = min(top_k, count)
+
+            if self._hnsw is not None:
+                self._hnsw.set_ef(max(Config.HNSW_EF_SEARCH, top_k))
+                labels, distances = self._hnsw.knn_query(query, k=top_k)
+                rows = labels[0].tolist()
+                scores = (1 - distances[0]).tolist()
+            else:
+                rows, scores = self._exact_search(query, count, top_k)
+
+            ids = [self._ids[row] for row in rows]
+
+        metadata = self._fetch_metadata(rows) if include_metadata else {}
+        return {
+            "matches": [
+                {"id": vector_id, "score": float(score), "metadata": metadata.get(row, {})}
+                for vector_id, row, score in zip(ids, rows, scores)
+            ]
+        }
+
+    def _exact_search(self, query, count, top_k):
+        # Scan the memory-mapped rows in chunks so memory stays flat however large the namespace is
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, count, Config.LOCAL_SEARCH_CHUNK_ROWS):
+            end = min(start + Config.LOCAL_SEARCH_CHUNK_ROWS, count)
+            chunk_scores = row_scores(
+                self._embeddings[start:end],
+                query,
+                None if self._scales is None else self._scales[start:end]
+            )
+            best_rows = np.concatenate([best_rows, np.arange(start, start + len(chunk_scores))])
+            best_scores = np.concatenate([best_scores, chunk_scores])
+            if len(best_scores) > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1)[:top_k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.argsort(-best_scores)
+        return best_rows[order].tolist(), best_scores[order].tolist()
+
+    def _fetch_metadata(self, rows):
+        if not rows:
+            return {}
+        placeholders = ", ".join("?" for _ in rows)
+        with self._connect() as conn:
+            return {
+                row: json.loads(metadata or "{}")
+                for row, metadata in conn.execute(f"SELECT row, metadata FROM vectors WHERE row IN ({placeholders})", rows)
+            }
+
+    def _load_hnsw(self):
+        try:
+            import hnswlib
+        except ImportError:
+            logging.warning("hnswlib is not installed, falling back to exact search")
+            return
+
+        self._hnsw = hnswlib.Index(space="cosine", dim=self.dimension)
+        if os.path.exists(self._hnsw_path):
+            self._hnsw.load_index(self._hnsw_path, max_elements=max(self._capacity, 1))
+            # Add the rows written since the graph was saved
+            with self._connect() as conn:
+                stale = [row for (row,) in conn.execute(
+                    "SELECT row FROM vectors WHERE seq > ?", (self._state(conn, "hnsw_generation"),)
+                )]
+            if stale:
+                self._hnsw.add_items(self._decoded(stale), stale)
+                self._hnsw_dirty = True
+            return
+
+        self._hnsw.init_index(
+            max_elements=max(self._capacity, 1024),
+            ef_construction=Config.HNSW_EF_CONSTRUCTION,
+            M=Config.HNSW_M
+        )
+        # Build from the embeddings already on disk
+        if self.count:
+            self._hnsw.add_items(self._decoded(slice(0, self.count)), np.arange(self.count))
+            self._hnsw_dirty = True
+
+    def _save_hnsw(self):
+        # Called with both locks held and the graph caught up with self._generation
+        if self._hnsw is not None and self._hnsw_dirty:
+            self._hnsw.save_index(self._hnsw_path)
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('hnsw_generation', ?)", (self._generation,))
+            self._hnsw_dirty = False
+        self._hnsw_saved_at = time.time()
+
+    def save(self):
+        with self._lock, self._file_lock(exclusive=True):
+            if self._embeddings is not None:
+                self._embeddings.flush()
+            if self._scales is not None:
+                self._scales.flush()
+            if self._hnsw is not None:
+                self._refresh()
+                self._save_hnsw()
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector index persisted under `root/index_name/namespace/`.
+
+    Exact search by default; with LOCAL_INDEX_TYPE=hnsw an HNSW graph
+    (hnswlib) is kept next to the embeddings for approximate search.
+    """
+
+    def __init__(self, root, index_name):
+        self.directory = os.path.join(root, index_name)
+        self._namespaces = {}
+        self._lock = threading.Lock()
+        atexit.register(self.save)
+
+    def _namespace(self, namespace):
+        with self._lock:
+            store = self._namespaces.get(namespace)
+            if store is None:
+                store = _LocalNamespace(os.path.join(self.directory, namespace))
+                self._namespaces[namespace] = store
+            return store
+
+    def upsert(self, vectors, namespace):
+        self._namespace(namespace).upsert(vectors)
+        return {"upserted_count": len(vectors)}
+
+    def query(self, namespace, vector, top_k, include_metadata=True):
+        return self._namespace(namespace).query(vector, top_k, include_metadata=include_metadata)
+
+    def save(self):
+        for store in list(self._namespaces.values()):
+            store.save()
+
+
+def get_vector_index(index_name):
+    """Returns the configured vector store backend for an index, behind its PCA projection if one is set"""
+    if Config.VECTOR_STORE == "local":
+        store = LocalVectorStore(Config.LOCAL_VECTOR_STORE_PATH, index_name)
+    else:
+        store = PineconeVectorStore(index_name)
+
+    projection_path = {
+        Config.PINECONE_VIDEO_INDEX: Config.FACE_PCA_PATH,
+        Config.PINECONE_AUDIO_INDEX: Config.SPEAKER_PCA_PATH
+    }.get(index_name)
+    if projection_path:
+        projection = PCAProjection.load(projection_path)
+        logging.info(f"Projecting vectors of '{index_name}' from {projection.input_dimension} to {projection.dimension} dimensions")
+        return ProjectedIndex(store, projection)
+    return store
@@ -1,17 +1,56 @@
 import os
-import cv2
 import json
-import boto3
 import logging
 import mimetypes
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 
-from app.utils import get_pinecone_index, generate_embeddings, crop_faces, convert_video_to_30fps
+from app.utils import generate_embeddings_batch, detect_faces_batch, get_face_embeddings, get_face_embeddings_batch, query_vectors, iter_query_results
+from app.media import sample_frames
+from app.vector_store import get_vector_index
 from app.config import Config
+from app.upsert_buffer import UpsertBuffer, UploadGate
+from app.jobs import job_queue
+from app.storage import storage, upload_async
+from app.uploads import save_upload, remove_uploads
+from app.cache import CachedIndex, query_cache, embedding_cache, file_digest
+from app.tracking import FaceTracker
+from app.ingest_pool import run_ingest_tasks
+from app.pipeline import Pipeline, Stage, batched
 
 
 video_bp = Blueprint('video', __name__)
-index = get_pinecone_index(Config.PINECONE_API_KEY, Config.PINECONE_VIDEO_INDEX)
+# Queries go through the search result cache, upserts invalidate the namespace they write to
+index = CachedIndex(
+    get_vector_index(Config.PINECONE_VIDEO_INDEX),
+    Config.PINECONE_VIDEO_INDEX,
+    query_cache
+)
+
+
+def format_face_matches(faces, query_results):
+    """Extract and filter matches by score, grouped per face"""
+    formatted_faces = []
+    for i, (face, face_results) in enumerate(zip(faces, query_results)):
+        formatted_face = {
+            "face_no": i + 1,
+            "box": face["box"]
+        }
+        for namespace, response_key in Config.VIDEO_SEARCH_NAMESPACES.items():
+            logging.debug(f"Query result for face {i + 1} in '{namespace}': {face_results[namespace]}")
+            formatted_face[response_key] = [
+                {
+                    "id": match["id"],
+                    "score": match["score"],
+                    "metadata": match["metadata"]
+                }
+                for match in face_results[namespace]["matches"] if match["score"] >= 0.5  # Only include matches with score >= 0.5
+            ]
+        formatted_faces.append(formatted_face)
+    return formatted_faces
+
+
+def has_face_matches(formatted_faces):
+    return any(face[response_key] for face in formatted_faces for response_key in Config.VIDEO_SEARCH_NAMESPACES.values())
 
 
 @video_bp.route('/search', methods=['POST'])
@@ -30,62 +69,30 @@ def verify():
         
         input_image_path = os.path.join("temp", f"{hex_id}_input_image.jpg")
         os.makedirs("temp", exist_ok=True)
-        image_file.save(input_image_path)
+        save_upload(image_file, input_image_path)
         
-        # Crop the face from the image
-        cropped_face_path = crop_faces(input_image_path)
-        logging.info(f"Found {len(cropped_face_path)} faces in the input image")
-        if len(cropped_face_path) == 0:
+        # Detect and embed the faces, served from the embedding cache for repeated images
+        try:
+            faces = get_face_embeddings(input_image_path)
+        finally:
+            os.remove(input_image_path)
+        logging.info(f"Found {len(faces)} faces in the input image")
+        if len(faces) == 0:
             return jsonify({"status": "failed", "error": "No face detected in the image"}), 400
 
         top_k = int(request.form['top_k'])
         
-        # Query Pinecone for video matches
-        query_result_video = index.query(
-            namespace="preprocessed-videos",
-            vector=generate_embeddings(cropped_face_path[0]),
-            top_k=top_k,
-            include_metadata=True
-        )
-
-        # Query Pinecone for image matches
-        query_result_image = index.query(
-            namespace="preprocessed-images",
-            vector=generate_embeddings(cropped_face_path[0]),
-            top_k=top_k,
-            include_metadata=True
-        )
-        
-        print(query_result_video)
-        print(query_result_image)
-        
-        
-        # Extract and filter matches by score
-        video_matches = [
-            {
-                "id": match["id"],
-                "score": match["score"],
-                "metadata": match["metadata"]
-            }
-            for match in query_result_video["matches"] if match["score"] >= 0.5  # Only include matches with score >= 0.7
-        ]
+        # Query every namespace for every face, all concurrently
+        query_results = query_vectors(index, [face["embedding"] for face in faces], Config.VIDEO_SEARCH_NAMESPACES, top_k)
         
-        image_matches = [
-            {
-                "id": match["id"],
-                "score": match["score"],
-                "metadata": match["metadata"]
-            }
-            for match in query_result_image["matches"] if match["score"] >= 0.5  # Only include matches with score >= 0.7
-        ]
+        formatted_faces = format_face_matches(faces, query_results)
         
         # If no matches found above the threshold, respond with "no result found"
-        if not video_matches and not image_matches:
+        if not has_face_matches(formatted_faces):
             return jsonify({"status": "success", "message": "No result found"}), 200
 
         formatted_results = {
-            "video_matches": video_matches,
-            "image_matches": image_matches
+            "faces": formatted_faces
         }
 
         # Format response with indentation using json.dumps
@@ -106,9 +113,409 @@ def verify():
         return jsonify({"status": "failed", "error": str(e)}), 500
 
 
-                    
- # Create an S3 client
-s3 = boto3.client('s3')
+@video_bp.route('/search/batch', methods=['POST'])
+def verify_batch():
+    """Searches many images in one request, streaming one NDJSON line per image as its results are ready"""
+    try:
+        if 'images' not in request.files or 'top_k' not in request.form:
+            return jsonify({"status": "failed", "error": "Images and top_k are required"}), 400
+
+        image_files = request.files.getlist('images')
+
+        # Check if the files are images based on their MIME type
+        for image_file in image_files:
+            mime_type, _ = mimetypes.guess_type(image_file.filename)
+            if not mime_type or not mime_type.startswith('image'):
+                return jsonify({"status": "failed", "error": f"Invalid file type for '{image_file.filename}'. Only image files are allowed"}), 400
+
+        top_k = int(request.form['top_k'])
+
+        # Save the images before the response starts streaming
+        os.makedirs("temp", exist_ok=True)
+        inputs = []
+        for image_file in image_files:
+            input_image_path = os.path.join("temp", f"{os.urandom(4).hex()}_input_image.jpg")
+            save_upload(image_file, input_image_path)
+            inputs.append((image_file.filename, input_image_path))
+    except Exception as e:
+        logging.error(f"Error during batch verification: {e}")
+        return jsonify({"status": "failed", "error": str(e)}), 500
+
+    def remove_inputs():
+        # Runs when the response is closed, also if the client disconnected before the stream started
+        for _, path in inputs:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def embed_chunk(paths):
+        """The faces of every image of a chunk, or the exception of an image that could not be processed"""
+        try:
+            return get_face_embeddings_batch(paths)
+        except Exception as e:
+            # Retry one image at a time so only the image that failed gets a failed line
+            logging.error(f"Error embedding a batch of {len(paths)} images, retrying them one by one: {e}")
+
+        chunk_faces = []
+        for path in paths:
+            try:
+                chunk_faces.append(get_face_embeddings(path))
+            except Exception as e:
+                chunk_faces.append(e)
+        return chunk_faces
+
+    def generate():
+        try:
+            # Detect per image, embed the faces of a chunk of images together, then fan out all of its queries at once
+            for chunk in batched(inputs, Config.FACE_EMBED_BATCH_SIZE):
+                chunk_faces = embed_chunk([path for _, path in chunk])
+                query_results = iter_query_results(
+                    index,
+                    [[] if isinstance(faces, Exception) else [face["embedding"] for face in faces] for faces in chunk_faces],
+                    Config.VIDEO_SEARCH_NAMESPACES,
+                    top_k
+                )
+
+                for position, results in query_results:
+                    file_name, faces = chunk[position][0], chunk_faces[position]
+                    if isinstance(faces, Exception):
+                        line = {"file_name": file_name, "status": "failed", "error": str(faces)}
+                    elif isinstance(results, Exception):
+                        line = {"file_name": file_name, "status": "failed", "error": str(results)}
+                    elif not faces:
+                        line = {"file_name": file_name, "status": "failed", "error": "No face detected in the image"}
+                    else:
+                        formatted_faces = format_face_matches(faces, results)
+                        line = {"file_name": file_name, "status": "success"}
+                        if has_face_matches(formatted_faces):
+                            line["data"] = {"faces": formatted_faces}
+                        else:
+                            line["message"] = "No result found"
+                    yield json.dumps(line) + "\n"
+        except Exception as e:
+            logging.error(f"Error during batch verification: {e}")
+            yield json.dumps({"status": "failed", "error": str(e)}) + "\n"
+
+    response = Response(stream_with_context(generate()), status=200, mimetype='application/x-ndjson')
+    response.call_on_close(remove_inputs)
+    return response
+
+
+def start_upload(file_name, upload_path, mime_type):
+    """Starts uploading an original to S3 in the background"""
+    ext = os.path.splitext(file_name)[1][1:]  # Extract extension without the dot
+
+    if mime_type.startswith('image'):
+        return upload_async(upload_path, f'search/original_image/{file_name}', f'image/{ext}')
+    return upload_async(upload_path, f'search/original_videos/{file_name}', 'video/mp4')
+
+
+def ingest_image(file_name, upload_path, upsert_buffer, progress):
+    """Queues one vector per face detected in an image"""
+    ext = os.path.splitext(file_name)[1][1:]  # Extract extension without the dot
+
+    # The object is still uploading, its link is known up front
+    image_link = storage.link_for(f'search/original_image/{file_name}')
+    
+    # Detect and embed every face of the image in one batch, skipped for content that was processed before
+    faces = get_face_embeddings(upload_path)
+    progress.increment("faces_detected", len(faces))
+    
+    file_type = ext
+    file_name_with_extension = os.path.basename(file_name)  # Get original file name with extension
+
+    for i, face in enumerate(faces):
+        embeddings = face["embedding"]
+        face_count = i + 1  # Use 1-based numbering for face count
+
+        metadata = {
+            'file_type': file_type,
+            'file_name': file_name_with_extension,
+            'face_no': face_count,
+            'link': image_link
+        }
+
+        unique_id = f"{file_name_with_extension}#{face_count}"
+
+        # Create vector for Pinecone
+        vector = {
+            "id": unique_id,
+            "values": embeddings,
+            "metadata": metadata
+        }
+
+        # Queue the vector for Pinecone
+        upsert_buffer.add(vector, namespace="preprocessed-images")
+
+    return image_link
+
+
+# Everything a video's cache entry depends on besides its content and the face model
+VIDEO_CACHE_SETTINGS = (
+    "FRAME_SAMPLE_INTERVAL", "FRAME_SAMPLE_ADAPTIVE", "FRAME_SAMPLE_MIN_INTERVAL", "FRAME_SAMPLE_MAX_INTERVAL",
+    "SCENE_ANALYSIS_FPS", "SCENE_CUT_THRESHOLD", "MOTION_THRESHOLD",
+    "FACE_TRACKING_ENABLED", "FACE_TRACK_IOU_THRESHOLD", "FACE_TRACK_MATCH_SIMILARITY", "FACE_TRACK_REID_SIMILARITY",
+    "FACE_TRACK_MAX_GAP_SEC", "FACE_TRACK_MAX_VECTORS", "FACE_TRACK_NEW_VECTOR_SIMILARITY"
+)
+
+
+def ingest_video(file_name, upload_path, upsert_buffer, progress):
+    """Queues the face vectors of a video's sampled frames, returns the face and vector counts.
+
+    With FACE_TRACKING_ENABLED the faces are grouped into tracks and each
+    track is stored as up to FACE_TRACK_MAX_VECTORS representative vectors;
+    otherwise every detected face gets its own vector.
+    """
+    ext = os.path.splitext(file_name)[1][1:]  # Extract extension without the dot
+
+    # The object is still uploading, its link is known up front
+    video_link = storage.link_for(f'search/original_videos/{file_name}')
+
+    file_name_with_extension = os.path.basename(file_name)
+    file_type = ext
+
+    # decode -> detect -> embed -> upsert, each stage running concurrently on bounded queues
+    # A video is cached as a single entry holding its tracks (or the faces of
+    # every frame without tracking), so a retry or a re-upload skips the
+    # decoding, detection and embedding. One entry per sampled frame would
+    # flush the embedding cache's other entries on every long video
+
+    def detect(frames_batch):
+        """Detects faces in a batch of sampled frames, emits chunks of frames to embed"""
+        records = []
+        detections = detect_faces_batch([frame for _, (_, _, frame) in frames_batch])
+        for (sequence, (frame_index, time_stamp_sec, _)), (crops, boxes) in zip(frames_batch, detections):
+            records.append({
+                "sequence": sequence,
+                "frame_index": frame_index,
+                "time_stamp": time_stamp_sec,
+                "crops": crops,
+                "boxes": boxes
+            })
+
+        progress.increment("frames_processed", len(records))
+        progress.increment("faces_detected", sum(len(record["crops"]) for record in records))
+
+        # Keep the faces of a frame together, at most FACE_EMBED_BATCH_SIZE crops per chunk
+        chunks = [[]]
+        chunk_faces = 0
+        for record in records:
+            record_faces = len(record["crops"])
+            if chunks[-1] and chunk_faces + record_faces > Config.FACE_EMBED_BATCH_SIZE:
+                chunks.append([])
+                chunk_faces = 0
+            chunks[-1].append(record)
+            chunk_faces += record_faces
+        return chunks
+
+    def embed(records):
+        """Embeds the crops of a chunk of frames in one forward pass, emits the embedded frames"""
+        face_embeddings = iter(generate_embeddings_batch([crop for record in records for crop in record["crops"]]))
+
+        for record in records:
+            record["faces"] = [{"box": box, "embedding": next(face_embeddings)} for box in record["boxes"]]
+
+        return [records]
+
+    def frame_vectors(records):
+        """One vector per detected face"""
+        vectors = []
+        for record in records:
+            for i, face in enumerate(record["faces"]):
+                face_count = i + 1
+
+                metadata = {
+                    'file_type': file_type,
+                    'file_name': file_name_with_extension,
+                    'time_stamp': record["time_stamp"],
+                    'face_no': face_count,
+                    'link': video_link
+                }
+
+                unique_id = f"{file_name_with_extension}#{record['frame_index']}_{face_count}"
+
+                vectors.append({
+                    "id": unique_id,
+                    "values": face["embedding"],
+                    "metadata": metadata
+                })
+        return vectors
+
+    def track_vectors(tracks):
+        """The representative vectors of finished face tracks"""
+        vectors = []
+        for track in tracks:
+            for i, representative in enumerate(track["representatives"]):
+                metadata = {
+                    'file_type': file_type,
+                    'file_name': file_name_with_extension,
+                    'time_stamp': representative["time_stamp"],
+                    'first_seen': track["first_seen"],
+                    'last_seen': track["last_seen"],
+                    'track_no': track["track_no"],
+                    'link': video_link
+                }
+
+                vectors.append({
+                    "id": f"{file_name_with_extension}#track{track['track_no']}_{i + 1}",
+                    "values": representative["embedding"],
+                    "metadata": metadata
+                })
+        progress.increment("face_tracks", len(tracks))
+        return vectors
+
+    def finished_tracks(tracks):
+        return [
+            {
+                "track_no": track.track_no,
+                "first_seen": track.first_seen,
+                "last_seen": track.last_seen,
+                "representatives": track.representatives
+            } for track in tracks
+        ]
+
+    counts = {"faces": 0, "vectors": 0}
+
+    def add_vectors(vectors):
+        for vector in vectors:
+            upsert_buffer.add(vector, namespace="preprocessed-videos")
+        counts["vectors"] += len(vectors)
+        progress.set(vectors_upserted=upsert_buffer.upserted)
+
+    cache_key = None
+    if embedding_cache.enabled:
+        settings = ":".join(str(getattr(Config, name)) for name in VIDEO_CACHE_SETTINGS)
+        cache_key = embedding_cache.key(f"{file_digest(upload_path)}:{settings}", Config.FACE_MODEL_NAME, "video-faces")
+        cached = embedding_cache.get(cache_key)
+        if cached is not None:
+            progress.increment("frames_processed", cached["frames"])
+            progress.increment("faces_detected", cached["faces"])
+            counts["faces"] = cached["faces"]
+            if Config.FACE_TRACKING_ENABLED:
+                add_vectors(track_vectors(cached["tracks"]))
+            else:
+                add_vectors(frame_vectors(cached["frames_faces"]))
+            return counts
+    entry = {"frames": 0, "faces": 0, "tracks": [], "frames_faces": []}
+
+    tracker = None
+    if Config.FACE_TRACKING_ENABLED:
+        tracker = FaceTracker(
+            iou_threshold=Config.FACE_TRACK_IOU_THRESHOLD,
+            match_similarity=Config.FACE_TRACK_MATCH_SIMILARITY,
+            reid_similarity=Config.FACE_TRACK_REID_SIMILARITY,
+            max_gap_sec=Config.FACE_TRACK_MAX_GAP_SEC,
+            max_representatives=Config.FACE_TRACK_MAX_VECTORS,
+            representative_similarity=Config.FACE_TRACK_NEW_VECTOR_SIMILARITY
+        )
+    def upsert(records):
+        # Single worker: the tracker sees every frame, and restores their order itself
+        counts["faces"] += sum(len(record["faces"]) for record in records)
+        entry["frames"] += len(records)
+        if tracker is None:
+            if cache_key is not None:
+                entry["frames_faces"].extend(
+                    {"frame_index": record["frame_index"], "time_stamp": record["time_stamp"], "faces": record["faces"]}
+                    for record in records
+                )
+            add_vectors(frame_vectors(records))
+            return
+
+        finished = []
+        for record in records:
+            finished.extend(tracker.add_frame(record["sequence"], record["time_stamp"], record["faces"]))
+        add_tracks(finished_tracks(finished))
+
+    def add_tracks(tracks):
+        if cache_key is not None:
+            entry["tracks"].extend(tracks)
+        add_vectors(track_vectors(tracks))
+
+    pipeline = Pipeline(f"video-ingest:{file_name_with_extension}", [
+        Stage("detect", detect, workers=Config.PIPELINE_DETECT_WORKERS, queue_size=Config.PIPELINE_QUEUE_SIZE),
+        Stage("embed", embed, workers=Config.PIPELINE_EMBED_WORKERS, queue_size=Config.PIPELINE_QUEUE_SIZE),
+        Stage("upsert", upsert, workers=1, queue_size=Config.PIPELINE_QUEUE_SIZE)
+    ])
+    pipeline.run(batched(enumerate(sample_frames(upload_path)), Config.DETECTION_BATCH_SIZE))
+
+    if tracker is not None:
+        add_tracks(finished_tracks(tracker.finish()))
+
+    if cache_key is not None:
+        entry["faces"] = counts["faces"]
+        embedding_cache.put(cache_key, entry)
+    return counts
+
+
+def process_ingest_job(job_id, payload, progress):
+    """Processes the files of a queued /video/ingest request"""
+    files = payload["files"]
+    ingested_files = []
+    failed_files = []
+    s3_links = []
+    video_counts = {"faces": 0, "vectors": 0}
+
+    # Uploads to S3 run in the background while the files are processed
+    uploads = [start_upload(file["file_name"], file["path"], file["mime_type"]) for file in files]
+
+    # Files are processed in parallel across the ingest process pool
+    tasks = [
+        (ingest_image if file["mime_type"].startswith('image') else ingest_video, (file["file_name"], file["path"]))
+        for file in files
+    ]
+
+    try:
+        # Vectors are upserted in batches, the buffer is drained before the job completes
+        with UpsertBuffer(index) as upsert_buffer:
+            # A file's vectors only reach the index once its original is stored
+            gates = [UploadGate(upsert_buffer, upload) for upload in uploads]
+            for position, result in run_ingest_tasks(tasks, gates, progress):
+                file = files[position]
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    link = gates[position].release()
+
+                    if not file["mime_type"].startswith('image'):
+                        video_counts["faces"] += result["faces"]
+                        video_counts["vectors"] += result["vectors"]
+                except Exception as e:
+                    # The other files carry on, the failure is reported per file
+                    logging.error(f"Error processing file '{file['file_name']}': {e}")
+                    progress.add_error(f"{file['file_name']}: {e}")
+                    failed_files.append({"file_name": file["file_name"], "error": str(e)})
+                    continue
+
+                s3_links.append(link)
+                # Add to ingested_files list after successful processing
+                ingested_files.append(file["file_name"])
+                progress.increment("files_processed")
+
+        if failed_files and not ingested_files:
+            raise Exception(f"None of the {len(failed_files)} files could be ingested")
+
+        for failure in upsert_buffer.failures:
+            progress.add_error(f"Upsert of {len(failure['ids'])} vectors into '{failure['namespace']}' failed: {failure['error']}")
+        progress.set(vectors_upserted=upsert_buffer.upserted)
+
+        return {
+            "message": f"{len(ingested_files)} files ingested successfully",
+            "ingested_files": ingested_files,
+            "failed_files": failed_files,
+            "s3_links": s3_links,
+            "video_faces": video_counts["faces"],
+            "video_vectors": video_counts["vectors"],
+            # Detected faces per stored vector, how much face tracking shrank the videos' vectors
+            "reduction_ratio": round(video_counts["faces"] / video_counts["vectors"], 2) if video_counts["vectors"] else None,
+            "total_upserts": upsert_buffer.upserted,
+            "failed_upserts": upsert_buffer.failures
+        }
+    finally:
+        # The uploaded files are only needed until the job is done
+        remove_uploads(payload.get("upload_directory"), uploads)
+
+
+job_queue.register("video_ingest", process_ingest_job)
+
     
 @video_bp.route('/ingest', methods=['POST'])
 def ingest_video_image():
@@ -117,169 +524,49 @@ def ingest_video_image():
             return jsonify({"status": "error", "message": "No files provided"}), 400
 
         files = request.files.getlist('files')
-        
-        hex_id = str(os.urandom(4).hex())
-        upload_directory = f"uploads/{hex_id}/"
-        
-        ingested_files = []
-        s3_links = []
-        total_upserts = 0  # Count of all vectors upserted
-
 
+        # Check MIME types before accepting anything
         for file in files:
-            # Check MIME type
             mime_type, _ = mimetypes.guess_type(file.filename)
             if not mime_type or not (mime_type.startswith('image') or mime_type.startswith('video')):
                 return jsonify({"status": "error", "message": "Invalid file type. Only image and video files are allowed."}), 400
+        
+        hex_id = str(os.urandom(4).hex())
+        upload_directory = f"uploads/{hex_id}/"
+        os.makedirs(upload_directory, exist_ok=True)
 
-            # Save the file locally
+        # Save the files locally, the job worker picks them up from there
+        job_files = []
+        for file in files:
             upload_path = os.path.join(upload_directory, file.filename)
-            os.makedirs(upload_directory, exist_ok=True)
-            file.save(upload_path)
+            save_upload(file, upload_path)
+            job_files.append({
+                "file_name": file.filename,
+                "path": upload_path,
+                "mime_type": mimetypes.guess_type(file.filename)[0]
+            })
 
-            # Find the extension of the file
-            ext = os.path.splitext(file.filename)[1][1:]  # Extract extension without the dot
+        job_id = job_queue.submit("video_ingest", {"files": job_files, "upload_directory": upload_directory})
 
-            if mime_type.startswith('image'):
-                # Upload the file to S3
-                bucket_name = 'trainingdata-public'
-                object_name = f'search/original_image/{file.filename}'
-
-                try:
-                    s3.upload_file(
-                        upload_path,
-                        bucket_name,
-                        object_name,
-                        ExtraArgs={'ContentType': f'image/{ext}'}
-                    )
-                    logging.info(f"File {file.filename} uploaded successfully to {bucket_name}/{object_name}")
-                    image_link = f"https://trainingdata-public.s3.ap-south-1.amazonaws.com/{object_name}"
-                    s3_links.append(image_link)
-                    
-                    # Crop faces from the image
-                    cropped_faces = crop_faces(upload_path)
-                    
-                    file_type = ext
-                    file_name_with_extension = os.path.basename(file.filename)  # Get original file name with extension
-
-                    for i, face_path in enumerate(cropped_faces):
-                        embeddings = generate_embeddings(face_path)
-                        face_count = i + 1  # Use 1-based numbering for face count
-
-                        metadata = {
-                            'file_type': file_type,
-                            'file_name': file_name_with_extension,
-                            'face_no': face_count,
-                            'link': image_link
-                        }
-
-                        unique_id = f"{file_name_with_extension}#{face_count}"
-
-                        # Create vector for Pinecone
-                        vector = {
-                            "id": unique_id,
-                            "values": embeddings,
-                            "metadata": metadata
-                        }
-
-                        # Upsert vector to Pinecone
-                        index.upsert([vector], namespace="preprocessed-images")
-                        total_upserts += 1  # Increment the count of upserts
-                        
-                    # Add to ingested_files list after successful processing
-                    ingested_files.append(file.filename)
-
-                        
-                except Exception as e:
-                    logging.error(f"Error processing file '{file.filename}': {e}")
-                    return jsonify({"status": "error", "message": str(e)}), 500
-                
-                
-            elif mime_type.startswith('video'):
-                # Convert the video to 30 FPS and save it
-                converted_video_path = os.path.join(upload_directory, f"converted_{file.filename}")
-                convert_video_to_30fps(upload_path, converted_video_path)
-                
-                # Upload the original video to S3
-                bucket_name = 'trainingdata-public'
-                object_name = f'search/original_videos/{file.filename}'
-                
-                try:
-                    s3.upload_file(
-                        upload_path,
-                        bucket_name,
-                        object_name,
-                        ExtraArgs={'ContentType': f'video/mp4'}
-                    )
-                    logging.info(f"File {file.filename} uploaded successfully to {bucket_name}/{object_name}")
-                    video_link = f"https://trainingdata-public.s3.ap-south-1.amazonaws.com/{object_name}"
-                    s3_links.append(video_link)
-
-                    
-                    cap = cv2.VideoCapture(converted_video_path)
-                    frame_count = 0
-                    
-                    while cap.isOpened():
-                        ret, frame = cap.read()
-                        if not ret:
-                            break
-
-                        if frame_count % 15 == 0:  # Process every 15th frame
-                            frame_path = os.path.join(upload_directory, f"frame_{frame_count}.jpg")
-                            cv2.imwrite(frame_path, frame)
-
-                            cropped_faces = crop_faces(frame_path)
-                            file_name_with_extension = os.path.basename(file.filename)
-                            file_type = ext
-
-                            for i, face_path in enumerate(cropped_faces):
-                                embeddings = generate_embeddings(face_path)
-                                face_count = i + 1
-                                time_stamp_sec = frame_count / 30  # Convert frame count to seconds
-
-                                metadata = {
-                                    'file_type': file_type,
-                                    'file_name': file_name_with_extension,
-                                    'time_stamp': time_stamp_sec,
-                                    'face_no': face_count,
-                                    'link': video_link
-                                }
-
-                                unique_id = f"{file_name_with_extension}#{frame_count}_{face_count}"
-
-                                vector = {
-                                    "id": unique_id,
-                                    "values": embeddings,
-                                    "metadata": metadata
-                                }
-
-                                index.upsert([vector], namespace="preprocessed-videos")
-                                total_upserts += 1  # Increment the count of upserts
-
-                        frame_count += 1
-
-                    cap.release()
-                    
-                    # Add to ingested_files list after successful processing
-                    ingested_files.append(file.filename)
-
-                except Exception as e:
-                    logging.error(f"Error processing video file '{file.filename}': {e}")
-                    return jsonify({"status": "error", "message": str(e)}), 500
-                
-                
         response = {
             "status": "success",
-            "message": f"{len(ingested_files)} files ingested successfully",
+            "message": f"{len(job_files)} files queued for ingestion",
             "data": {
-                "ingested_files": ingested_files,
-                "s3_links": s3_links,
-                "total_upserts": total_upserts
+                "job_id": job_id
             }
         }
 
-        return jsonify(response), 200
+        return jsonify(response), 202
 
     except Exception as e:
         logging.error(f"Error during ingestion: {e}")
         return jsonify({"status": "failed", "error": str(e)}), 500
+
+
+@video_bp.route('/jobs/<job_id>', methods=['GET'])
+def ingest_job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job["kind"] != "video_ingest":
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+
+    return jsonify({"status": "success", "data": job}), 200
@@ -0,0 +1,223 @@
+"""Accuracy vs speed of reduced-precision models and compressed vectors.
+
+    python -m benchmarks.accuracy --kind face --eval-dir faces/ --output accuracy.json
+    python -m benchmarks.accuracy --kind speaker --eval-dir speakers/ --dimensions 0,128 --save-pca-dir pca/
+
+The evaluation set is a directory of `<identity>/<file>` images (faces) or
+audio files (speakers). Every model precision embeds the whole set. The
+embeddings are then optionally PCA-projected and stored as float32, float16
+or int8, the same way the indexes do it. Each setting is compared against
+the fp32, uncompressed reference:
+- top1_accuracy: the nearest other sample (leave-one-out) has the same identity.
+- recall_at_k: share of the reference's k nearest neighbours that are still found.
+- mean_cosine_to_reference: cosine of each embedding to its fp32 counterpart,
+  for uncompressed settings only.
+- embeddings_per_second, search_ms_per_query, bytes_per_vector.
+
+The PCA projections are fitted on the fp32 embeddings of the evaluation set
+itself, which flatters them on small sets. Projections saved with
+--save-pca-dir can be used as FACE_PCA_PATH / SPEAKER_PCA_PATH.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.harness import percentiles  # noqa: E402
+
+
+def list_evaluation_set(directory):
+    """Returns [(identity, path)] for every file under `directory/<identity>/`"""
+    samples = []
+    for identity in sorted(os.listdir(directory)):
+        identity_directory = os.path.join(directory, identity)
+        if not os.path.isdir(identity_directory):
+            continue
+        for file_name in sorted(os.listdir(identity_directory)):
+            samples.append((identity, os.path.join(identity_directory, file_name)))
+    return samples
+
+
+def load_inputs(kind, samples):
+    """Model inputs of every sample: the largest face crop, or the decoded audio. Returns (identities, inputs, skipped)"""
+    from app import utils
+
+    identities, inputs, skipped = [], [], []
+    for identity, path in samples:
+        try:
+            if kind == "face":
+                crops, boxes = utils.detect_faces(path)
+                if not crops:
+                    skipped.append(path)
+                    continue
+                areas = [(box[2] - box[0]) * (box[3] - box[1]) for box in boxes]
+                inputs.append(crops[int(np.argmax(areas))])
+            else:
+                inputs.append(utils.decode_audio(path))
+        except Exception as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            skipped.append(path)
+            continue
+        identities.append(identity)
+    return identities, inputs, skipped
+
+
+def embed(kind, inputs, precision):
+    """Embeds every input at `precision`, returns (normalised embeddings, batch latencies)"""
+    from app import models, utils
+    from app.config import Config
+    from app.pipeline import batched
+    from app.compression import normalize_rows
+
+    if kind == "face":
+        Config.FACE_MODEL_PRECISION = precision
+        batch_size, embed_batch = Config.FACE_EMBED_BATCH_SIZE, utils.generate_embeddings_batch
+    else:
+        Config.SPEAKER_MODEL_PRECISION = precision
+        batch_size, embed_batch = Config.SPEAKER_EMBED_BATCH_SIZE, utils.embed_signals
+    models.unload_models()
+
+    # Warm up: loads (and converts) the model and lets the runtime pick its kernels
+    embed_batch(inputs[:batch_size])
+
+    embeddings, latencies = [], []
+    for batch in batched(inputs, batch_size):
+        started = time.perf_counter()
+        embeddings.extend(embed_batch(batch))
+        latencies.append(time.perf_counter() - started)
+    return normalize_rows(embeddings), latencies
+
+
+def nearest_neighbours(stored, queries, scales, k):
+    """Leave-one-out top-k rows of every query, scored like the local store. Returns (neighbours, seconds per query)"""
+    from app.compression import row_scores
+
+    neighbours = []
+    started = time.perf_counter()
+    for position, query in enumerate(queries):
+        scores = row_scores(stored, query, scales)
+        scores[position] = -np.inf
+        top = np.argpartition(-scores, k)[:k]
+        neighbours.append(top[np.argsort(-scores[top])])
+    return np.asarray(neighbours), (time.perf_counter() - started) / len(queries)
+
+
+def evaluate(vectors, dtype, identities, reference_neighbours, k):
+    from app.compression import encode_rows
+
+    stored, scales = encode_rows(vectors, dtype)
+    neighbours, seconds_per_query = nearest_neighbours(stored, vectors, scales, k)
+    identities = np.asarray(identities)
+    recall = np.mean([
+        len(set(found) & set(expected)) / k
+        for found, expected in zip(neighbours, reference_neighbours)
+    ])
+    return {
+        "top1_accuracy": round(float(np.mean(identities[neighbours[:, 0]] == identities)), 4),
+        f"recall_at_{k}": round(float(recall), 4),
+        "search_ms_per_query": round(seconds_per_query * 1000, 3),
+        "bytes_per_vector": vectors.shape[1] * stored.itemsize + (4 if scales is not None else 0)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kind", choices=["face", "speaker"], required=True)
+    parser.add_argument("--eval-dir", required=True, help="directory of <identity>/<file> samples")
+    parser.add_argument("--precisions", default="fp32,fp16,bf16,int8")
+    parser.add_argument("--dimensions", default="0,512,256,128", help="PCA dimensions, 0 for no projection")
+    parser.add_argument("--dtypes", default="float32,float16,int8", help="vector storage types")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--save-pca-dir", default=None, help="directory to save the fitted projections to")
+    parser.add_argument("--output", default="accuracy_results.json")
+    args = parser.parse_args()
+
+    # Embeddings must come from the models, not from earlier runs
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["PRELOAD_MODELS"] = "false"
+
+    from app.compression import PCAProjection, normalize_rows, encode_rows, decode_rows
+
+    samples = list_evaluation_set(args.eval_dir)
+    identities, inputs, skipped = load_inputs(args.kind, samples)
+    if len(inputs) <= args.top_k:
+        parser.error(f"{len(inputs)} usable samples, need more than --top-k ({args.top_k})")
+    print(f"{len(inputs)} samples of {len(set(identities))} identities, {len(skipped)} skipped", flush=True)
+
+    precisions = ["fp32"] + [precision for precision in args.precisions.split(",") if precision != "fp32"]
+    dimensions = [int(dimension) for dimension in args.dimensions.split(",")]
+    dtypes = args.dtypes.split(",")
+
+    embeddings, speed = {}, {}
+    for precision in precisions:
+        print(f"Embedding at {precision}", flush=True)
+        try:
+            embeddings[precision], latencies = embed(args.kind, inputs, precision)
+        except Exception as e:
+            print(f"  {precision} failed: {e}", file=sys.stderr)
+            speed[precision] = {"error": str(e)}
+            continue
+        speed[precision] = {
+            "embeddings_per_second": round(len(inputs) / sum(latencies), 3),
+            "batch_latency": percentiles(latencies)
+        }
+
+    if "fp32" not in embeddings:
+        sys.exit("The fp32 reference could not be computed")
+    reference = embeddings["fp32"]
+    reference_neighbours, _ = nearest_neighbours(reference, reference, None, args.top_k)
+
+    projections = {}
+    for dimension in dimensions:
+        if dimension and dimension < reference.shape[1]:
+            projections[dimension] = PCAProjection.fit(reference, dimension)
+            if args.save_pca_dir:
+                os.makedirs(args.save_pca_dir, exist_ok=True)
+                projections[dimension].save(os.path.join(args.save_pca_dir, f"{args.kind}_pca_{dimension}.npz"))
+
+    results = []
+    for precision, precision_embeddings in embeddings.items():
+        for dimension in dimensions:
+            if dimension and dimension not in projections:
+                continue
+            projected = projections[dimension].project(precision_embeddings) if dimension else normalize_rows(precision_embeddings)
+            for dtype in dtypes:
+                result = {
+                    "precision": precision,
+                    "dimension": projected.shape[1],
+                    "dtype": dtype,
+                    **evaluate(projected, dtype, identities, reference_neighbours, args.top_k),
+                    "embeddings_per_second": speed[precision]["embeddings_per_second"],
+                    "mean_cosine_to_reference": None
+                }
+                if not dimension:
+                    decoded = normalize_rows(decode_rows(*encode_rows(projected, dtype)))
+                    result["mean_cosine_to_reference"] = round(float(np.mean(np.sum(decoded * reference, axis=1))), 5)
+                results.append(result)
+
+    columns = ["precision", "dimension", "dtype", "top1_accuracy", f"recall_at_{args.top_k}",
+               "mean_cosine_to_reference", "embeddings_per_second", "search_ms_per_query", "bytes_per_vector"]
+    print(" ".join(f"{column:>24}" for column in columns))
+    for result in results:
+        print(" ".join(f"{str(result[column]):>24}" for column in columns))
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "kind": args.kind,
+            "samples": len(inputs),
+            "identities": len(set(identities)),
+            "skipped": skipped,
+            "speed": speed,
+            "results": results
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compares two benchmark result files.
+
+    python -m benchmarks.compare baseline.json results.json [--threshold 0.1]
+
+Exits with status 1 when a benchmark's p50 or p95 latency grew, or its
+throughput dropped, by more than the threshold (a fraction of the baseline).
+"""
+import sys
+import json
+import argparse
+
+
+# (metric, True when higher is better)
+METRICS = [
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("throughput_per_second", True),
+    ("peak_rss_mb", False)
+]
+
+# Memory is reported but too noisy to fail a run on
+GATED = {"p50_ms", "p95_ms", "throughput_per_second"}
+
+
+def compare(baseline, current, threshold):
+    """Returns ([(benchmark, metric, before, after, change, regressed)], regressions)"""
+    rows = []
+    regressions = 0
+    for name in baseline["results"]:
+        before, after = baseline["results"][name], current["results"].get(name)
+        if after is None or "error" in before or "error" in after:
+            continue
+        for metric, higher_is_better in METRICS:
+            old, new = before.get(metric), after.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            regressed = metric in GATED and worse > threshold
+            regressions += regressed
+            rows.append((name, metric, old, new, change, regressed))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed regression, e.g. 0.1 for 10%%")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows, regressions = compare(baseline, current, args.threshold)
+    print(f"{'benchmark':<22} {'metric':<22} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, metric, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<22} {metric:<22} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{flag}")
+
+    for name in sorted(set(baseline["results"]) ^ set(current["results"])):
+        print(f"{name}: only in {'baseline' if name in baseline['results'] else 'current'}")
+
+    if regressions:
+        print(f"{regressions} regressions above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
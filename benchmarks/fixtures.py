@@ -0,0 +1,112 @@
+import os
+import wave
+
+import numpy as np
+
+
+# Synthetic inputs, generated offline from a fixed seed so two runs measure the same data
+
+
+def write_speech_like_wav(path, duration_sec, seed, sample_rate=16000):
+    """Writes a mono 16-bit WAV of voiced-sounding audio: a harmonic tone with syllable-rate modulation"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration_sec * sample_rate)) / sample_rate
+
+    pitch = rng.uniform(90, 220)
+    vibrato = 1 + 0.03 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)
+    signal = sum(np.sin(2 * np.pi * pitch * harmonic * vibrato * t) / harmonic for harmonic in range(1, 8))
+    syllables = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(3, 5) * t)) ** 2
+    signal = signal * syllables + 0.02 * rng.standard_normal(len(t))
+
+    samples = (signal / np.max(np.abs(signal)) * 0.8 * 32767).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return path
+
+
+def _load_face(face_image):
+    import cv2
+
+    if face_image is None:
+        return None
+    face = cv2.imread(face_image)
+    if face is None:
+        raise ValueError(f"Cannot read face image: {face_image}")
+    return face
+
+
+def write_video(path, duration_sec, seed, fps=30, size=(640, 360), shot_sec=4.0, face_image=None):
+    """Writes an MP4 of moving shapes with a hard cut every `shot_sec` seconds.
+
+    With `face_image`, the face is pasted into every frame and moves across
+    it, so the detection and tracking stages have something to find.
+    """
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    face = _load_face(face_image)
+    if face is not None:
+        face = cv2.resize(face, (height // 3, height // 3))
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    try:
+        background = None
+        shapes = []
+        for frame_no in range(int(duration_sec * fps)):
+            if frame_no % int(shot_sec * fps) == 0:
+                # New shot: new background colour and shapes
+                background = rng.integers(0, 255, size=3).tolist()
+                shapes = [
+                    (rng.integers(0, width), rng.integers(0, height), rng.integers(20, 80), rng.integers(0, 255, size=3).tolist(), rng.uniform(-4, 4))
+                    for _ in range(5)
+                ]
+
+            frame = np.full((height, width, 3), background, dtype=np.uint8)
+            for x, y, radius, colour, speed in shapes:
+                cv2.circle(frame, (int(x + speed * frame_no) % width, int(y)), int(radius), colour, -1)
+
+            if face is not None:
+                x = int((frame_no * 2) % (width - face.shape[1]))
+                y = (height - face.shape[0]) // 2
+                frame[y:y + face.shape[0], x:x + face.shape[1]] = face
+
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+def write_image(path, seed, size=(640, 480), face_image=None):
+    """Writes a JPEG search probe, the face image on a noisy background when given"""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    image = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    face = _load_face(face_image)
+    if face is not None:
+        face = cv2.resize(face, (height // 2, height // 2))
+        y, x = (height - face.shape[0]) // 2, (width - face.shape[1]) // 2
+        image[y:y + face.shape[0], x:x + face.shape[1]] = face
+    cv2.imwrite(path, image)
+    return path
+
+
+def build_fixtures(directory, audio_files, audio_sec, video_sec, images, face_image=None, seed=0):
+    """Generates every fixture into `directory`, returns their paths by kind"""
+    os.makedirs(directory, exist_ok=True)
+    return {
+        "audio": [
+            write_speech_like_wav(os.path.join(directory, f"speaker_{i}.wav"), audio_sec, seed + i)
+            for i in range(audio_files)
+        ],
+        "video": write_video(os.path.join(directory, "video.mp4"), video_sec, seed, face_image=face_image),
+        "images": [
+            write_image(os.path.join(directory, f"probe_{i}.jpg"), seed + i, face_image=face_image)
+            for i in range(images)
+        ]
+    }
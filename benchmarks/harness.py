@@ -0,0 +1,102 @@
+import os
+import time
+import resource
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def current_rss_bytes():
+    """Resident set size of this process, from /proc when available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is the peak, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    """Samples the RSS on a background thread and keeps the peak seen while running"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_bytes())
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    values = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3)
+    }
+
+
+def measure(fn, inputs, concurrency=1, warmup=1, unit="items"):
+    """Calls `fn(input)` for every input from `concurrency` threads.
+
+    `fn` returns how many units (frames, faces, files, ...) the call
+    processed, or None for one. The first `warmup` inputs run beforehand and
+    are not measured, so model loading and lazy connections don't count.
+    """
+    for item in inputs[:warmup]:
+        fn(item)
+
+    latencies = []
+    units = []
+    errors = []
+    lock = threading.Lock()
+
+    def call(item):
+        started = time.perf_counter()
+        try:
+            processed = fn(item)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            units.append(1 if processed is None else processed)
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(call, inputs))
+        wall_seconds = time.perf_counter() - started
+
+    total_units = sum(units)
+    return {
+        "calls": len(inputs),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_seconds, 3),
+        "unit": unit,
+        "units": total_units,
+        "throughput_per_second": round(total_units / wall_seconds, 3) if wall_seconds > 0 else None,
+        **percentiles(latencies),
+        "peak_rss_mb": round(rss.peak / 1024 / 1024, 1)
+    }
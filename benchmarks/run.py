@@ -0,0 +1,275 @@
+"""Benchmarks of the search and ingest hot paths.
+
+    python -m benchmarks.run --output results.json [--concurrency 4] [--face-image face.jpg]
+    python -m benchmarks.compare baseline.json results.json
+
+Fixtures are generated offline from a fixed seed. Pinecone and S3 are
+replaced by the local vector store and local storage backends, everything
+is written under --workdir. Every benchmark imports only the parts of the
+app it needs, when it first runs. Stages and endpoints that can't run (e.g.
+a model that isn't installed) are reported with their error and skipped.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fixtures import build_fixtures  # noqa: E402
+from benchmarks.harness import measure  # noqa: E402
+
+
+BENCHMARKS = [
+    "decode_audio",
+    "get_embedding",
+    "sample_frames",
+    "sample_frames_fixed",
+    "detect_faces",
+    "generate_embeddings",
+    "audio_ingest",
+    "video_ingest",
+    "audio_search",
+    "video_search"
+]
+
+
+def configure_environment(workdir, with_caches):
+    """Points every backend at local stand-ins under `workdir`; must run before `app` is imported"""
+    os.environ.update({
+        "VECTOR_STORE": "local",
+        "LOCAL_VECTOR_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_PATH": os.path.join(workdir, "storage"),
+        "JOB_DB_PATH": os.path.join(workdir, "uploads", "jobs.sqlite3"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "temp", "embedding_cache.sqlite3"),
+        "UPLOAD_SPOOL_PATH": os.path.join(workdir, "uploads", "incoming"),
+        "PRELOAD_MODELS": "false"
+    })
+    if not with_caches:
+        # Repeated inputs would otherwise be served from the caches
+        os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+        os.environ["QUERY_CACHE_ENABLED"] = "false"
+
+    # The handlers write uploads and temp files relative to the working directory
+    os.chdir(workdir)
+
+
+def wait_for_job(client, kind, job_id, timeout=3600):
+    started = time.time()
+    while time.time() - started < timeout:
+        job = client.get(f"/{kind}/jobs/{job_id}").get_json()["data"]
+        if job["status"] in ("completed", "failed"):
+            if job["status"] == "failed":
+                raise Exception(f"Job {job_id} failed: {job['error']}")
+            return job
+        time.sleep(0.05)
+    raise Exception(f"Job {job_id} did not finish within {timeout}s")
+
+
+def post_files(client, path, field, paths, form=None):
+    data = dict(form or {})
+    data[field] = [(open(file_path, "rb"), os.path.basename(file_path)) for file_path in paths]
+    try:
+        return client.post(path, data=data, content_type="multipart/form-data")
+    finally:
+        for handle, _ in data[field]:
+            handle.close()
+
+
+def build_benchmarks(args, fixtures):
+    """Returns {name: (fn, inputs, unit)}.
+
+    The model stack and the app are imported by the first call of a benchmark
+    that uses them, so e.g. the media benchmarks run without torch installed.
+    """
+    import numpy as np
+    from app.config import Config
+    from app import media
+
+    repeat = args.iterations
+    clients = []
+    client_lock = threading.Lock()
+
+    def app_client():
+        with client_lock:
+            if not clients:
+                from app import create_app
+                clients.append(create_app().test_client())
+            return clients[0]
+
+    def decode_audio(path):
+        media.decode_audio(path)
+
+    signals = {}
+
+    def get_embedding(path):
+        from app import utils
+        if path not in signals:
+            signals[path] = media.decode_audio(path)
+        utils.get_embedding(signals[path])
+
+    def sample_frames(path):
+        return sum(1 for _ in media.sample_frames(path))
+
+    def sample_frames_fixed(path):
+        return sum(1 for _ in media.sample_frames(path, interval_sec=Config.FRAME_SAMPLE_INTERVAL))
+
+    def detect_faces(path):
+        from app import utils
+        utils.detect_faces(path)
+
+    rng = np.random.default_rng(args.seed)
+    crop_batches = [
+        [rng.integers(0, 255, size=(160, 160, 3), dtype=np.uint8) for _ in range(Config.FACE_EMBED_BATCH_SIZE)]
+        for _ in range(max(1, args.images))
+    ]
+
+    def generate_embeddings(crops):
+        from app import utils
+        utils.generate_embeddings_batch(crops)
+        return len(crops)
+
+    def audio_ingest(paths):
+        client = app_client()
+        response = post_files(client, "/audio/ingest", "files", paths, {"speaker": "benchmark"})
+        if response.status_code != 202:
+            raise Exception(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        wait_for_job(client, "audio", response.get_json()["data"]["job_id"])
+        return len(paths)
+
+    def video_ingest(path):
+        client = app_client()
+        response = post_files(client, "/video/ingest", "files", [path])
+        if response.status_code != 202:
+            raise Exception(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        wait_for_job(client, "video", response.get_json()["data"]["job_id"])
+
+    def audio_search(path):
+        client = app_client()
+        response = post_files(client, "/audio/search", "file", [path], {"top_k": "3"})
+        if response.status_code >= 500:
+            raise Exception(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    def video_search(path):
+        client = app_client()
+        # Without --face-image the probes have no face and get a 400, which still times detection
+        response = post_files(client, "/video/search", "image", [path], {"top_k": "3"})
+        if response.status_code >= 500:
+            raise Exception(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    return {
+        "decode_audio": (decode_audio, fixtures["audio"] * repeat, "files"),
+        "get_embedding": (get_embedding, fixtures["audio"] * repeat, "files"),
+        "sample_frames": (sample_frames, [fixtures["video"]] * repeat, "frames"),
+        "sample_frames_fixed": (sample_frames_fixed, [fixtures["video"]] * repeat, "frames"),
+        "detect_faces": (detect_faces, fixtures["images"] * repeat, "images"),
+        "generate_embeddings": (generate_embeddings, crop_batches * repeat, "faces"),
+        "audio_ingest": (audio_ingest, [fixtures["audio"]] * repeat, "files"),
+        "video_ingest": (video_ingest, [fixtures["video"]] * repeat, "files"),
+        "audio_search": (audio_search, fixtures["audio"] * repeat, "requests"),
+        "video_search": (video_search, fixtures["images"] * repeat, "requests")
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to")
+    parser.add_argument("--workdir", default=None, help="directory for fixtures and local backends (default: a temp dir)")
+    parser.add_argument("--only", default=None, help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent callers per benchmark")
+    parser.add_argument("--iterations", type=int, default=3, help="times every fixture is processed")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured calls before each benchmark")
+    parser.add_argument("--audio-files", type=int, default=8)
+    parser.add_argument("--audio-sec", type=float, default=5.0)
+    parser.add_argument("--video-sec", type=float, default=30.0)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--face-image", default=None, help="face photo pasted into the video and search probes")
+    parser.add_argument("--with-caches", action="store_true", help="keep the embedding and query caches enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    selected = args.only.split(",") if args.only else BENCHMARKS
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    output = os.path.abspath(args.output)
+    face_image = os.path.abspath(args.face_image) if args.face_image else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="search-api-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        run(args, selected, workdir, output, face_image)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args, selected, workdir, output, face_image):
+    fixtures = build_fixtures(
+        os.path.join(workdir, "fixtures"),
+        audio_files=args.audio_files,
+        audio_sec=args.audio_sec,
+        video_sec=args.video_sec,
+        images=args.images,
+        face_image=face_image,
+        seed=args.seed
+    )
+    configure_environment(workdir, args.with_caches)
+
+    benchmarks = build_benchmarks(args, fixtures)
+    from app.config import Config
+
+    results = {}
+    for name in selected:
+        fn, inputs, unit = benchmarks[name]
+        print(f"Running {name} ({len(inputs)} calls, concurrency {args.concurrency})", flush=True)
+        try:
+            results[name] = measure(fn, inputs, concurrency=args.concurrency, warmup=args.warmup, unit=unit)
+        except Exception as e:
+            results[name] = {"error": str(e)}
+        print(f"  {json.dumps(results[name])}", flush=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "config": {
+                "MODEL_DEVICE": Config.MODEL_DEVICE,
+                "MICRO_BATCHING_ENABLED": Config.MICRO_BATCHING_ENABLED,
+                "DEVICE_EXECUTOR_ENABLED": Config.DEVICE_EXECUTOR_ENABLED,
+                "FRAME_SAMPLE_ADAPTIVE": Config.FRAME_SAMPLE_ADAPTIVE,
+                "FACE_TRACKING_ENABLED": Config.FACE_TRACKING_ENABLED,
+                "FACE_EMBED_BATCH_SIZE": Config.FACE_EMBED_BATCH_SIZE,
+                "SPEAKER_EMBED_BATCH_SIZE": Config.SPEAKER_EMBED_BATCH_SIZE
+            }
+        },
+        "results": results
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
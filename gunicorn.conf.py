@@ -0,0 +1,57 @@
+import os
+
+# Production server: `gunicorn -c gunicorn.conf.py wsgi:app`
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5110')}"
+workers = int(os.getenv("WEB_WORKERS", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+timeout = int(os.getenv("WEB_TIMEOUT", "300"))
+graceful_timeout = 30
+
+# The app is imported once in the master and forked into the workers
+preload_app = True
+
+_preload_models = os.getenv("PRELOAD_MODELS", "true").lower() == "true"
+_devices = [device.strip() for device in os.getenv("MODEL_DEVICES", "").split(",") if device.strip()]
+
+
+def _cpu_only():
+    """True when the models will run on CPU, checked without initialising CUDA in the master"""
+    device = os.getenv("MODEL_DEVICE", "")
+    if device:
+        return device == "cpu"
+
+    # Asks NVML instead of the CUDA driver, which would break CUDA in the forked workers
+    os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+    try:
+        import torch
+    except ImportError:
+        return True
+    return not torch.cuda.is_available()
+
+
+# CUDA can't be initialised before a fork, so only CPU models are loaded in the
+# master (the workers then share the weights copy-on-write); on GPU every
+# worker loads its own copy once it has forked
+_load_in_master = _preload_models and not _devices and _cpu_only()
+
+os.environ["PRELOAD_MODELS"] = "true" if _load_in_master else "false"
+# Job worker threads would not survive the fork, they are started in the workers
+os.environ["START_JOB_WORKERS"] = "false"
+
+
+def post_worker_init(worker):
+    from app.config import Config
+    from app.models import load_models
+    from app.jobs import job_queue
+
+    if _devices:
+        Config.MODEL_DEVICE = _devices[(worker.age - 1) % len(_devices)]
+        worker.log.info(f"Worker {worker.pid} pinned to {Config.MODEL_DEVICE}")
+
+    if _preload_models and not _load_in_master:
+        load_models()
+
+    # Every worker competes for the job store lock, one of them runs the jobs
+    job_queue.start()
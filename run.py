@@ -1,6 +1,5 @@
 from app import create_app
 
-app = create_app()
-
+# Development server only, production runs `gunicorn -c gunicorn.conf.py wsgi:app`
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8050)
+    create_app().run(host='0.0.0.0', port=8050)
@@ -0,0 +1,199 @@
+import os
+import threading
+
+import pytest
+from flask import Flask
+
+from app.batching import MicroBatcher, DeviceExecutor, caller_priority, group_by_length, SEARCH_PRIORITY, INGEST_PRIORITY
+
+
+class RecordingBatchFn:
+    """Doubles every item, records the batches and the priority they ran with"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.batches = []
+        self.priorities = []
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        self.priorities.append(caller_priority())
+        if self.fail_on in items:
+            raise ValueError(f"bad item {self.fail_on}")
+        return [item * 2 for item in items]
+
+
+def submit_concurrently(batcher, items):
+    """Submits every item from its own thread at the same time, returns the futures"""
+    futures = [None] * len(items)
+    barrier = threading.Barrier(len(items))
+
+    def submit(position, item):
+        barrier.wait()
+        futures[position] = batcher.submit(item)
+
+    threads = [threading.Thread(target=submit, args=(i, item)) for i, item in enumerate(items)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return futures
+
+
+def test_concurrent_items_share_a_batch():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher("test", batch_fn, max_batch_size=32, max_wait=0.2)
+
+    futures = submit_concurrently(batcher, list(range(8)))
+    assert [future.result(timeout=5) for future in futures] == [item * 2 for item in range(8)]
+    assert len(batch_fn.batches) == 1
+    assert sorted(batch_fn.batches[0]) == list(range(8))
+
+
+def test_batches_are_bounded_by_max_batch_size():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher("test", batch_fn, max_batch_size=3, max_wait=0.2)
+
+    assert batcher.map(list(range(7))) == [item * 2 for item in range(7)]
+    assert [len(batch) for batch in batch_fn.batches] == [3, 3, 1]
+
+
+def test_a_failed_batch_is_retried_item_by_item():
+    batch_fn = RecordingBatchFn(fail_on=3)
+    batcher = MicroBatcher("test", batch_fn, max_batch_size=8, max_wait=0.2)
+
+    futures = submit_concurrently(batcher, [1, 2, 3, 4])
+    results = {}
+    for item, future in zip([1, 2, 3, 4], futures):
+        try:
+            results[item] = future.result(timeout=5)
+        except ValueError as e:
+            results[item] = str(e)
+
+    assert results == {1: 2, 2: 4, 3: "bad item 3", 4: 8}
+    # The failed batch, then one call per item
+    assert len(batch_fn.batches[0]) == 4
+    assert sorted(batch_fn.batches[1:]) == [[1], [2], [3], [4]]
+
+
+def test_a_batch_runs_with_its_most_urgent_priority():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher("test", batch_fn, max_batch_size=8, max_wait=0.3)
+    app = Flask(__name__)
+
+    assert batcher.map([1]) == [2]
+    assert batch_fn.priorities == [INGEST_PRIORITY]
+
+    futures = []
+    barrier = threading.Barrier(2)
+
+    def ingest():
+        barrier.wait()
+        futures.append(batcher.submit(1))
+
+    def search():
+        with app.test_request_context():
+            barrier.wait()
+            futures.append(batcher.submit(2))
+
+    threads = [threading.Thread(target=ingest), threading.Thread(target=search)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(future.result(timeout=5) for future in futures) == [2, 4]
+
+    assert len(batch_fn.batches) == 2
+    assert batch_fn.priorities[-1] == SEARCH_PRIORITY
+
+
+def test_disabled_batcher_calls_the_batch_fn_directly():
+    batch_fn = RecordingBatchFn(fail_on=3)
+    batcher = MicroBatcher("test", batch_fn, max_batch_size=8, max_wait=0.2, enabled=False)
+
+    assert batcher.map([1, 2]) == [2, 4]
+    assert batch_fn.batches == [[1], [2]]
+    with pytest.raises(ValueError):
+        batcher.submit(3).result()
+
+
+def test_device_executor_runs_searches_before_queued_ingestion():
+    executor = DeviceExecutor("cpu", workers=1)
+    started, release = threading.Event(), threading.Event()
+    order = []
+
+    def blocker():
+        started.set()
+        release.wait()
+
+    executor.submit(blocker)
+    assert started.wait(5)
+
+    futures = [executor.submit(order.append, f"ingest-{i}", priority=INGEST_PRIORITY) for i in range(3)]
+    futures.append(executor.submit(order.append, "search", priority=SEARCH_PRIORITY))
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    assert order == ["search", "ingest-0", "ingest-1", "ingest-2"]
+    assert executor.submit(executor.owns_current_thread).result(timeout=5)
+    assert not executor.owns_current_thread()
+
+
+def test_device_executor_propagates_errors():
+    executor = DeviceExecutor("cpu", workers=1)
+
+    def fail():
+        raise RuntimeError("out of memory")
+
+    with pytest.raises(RuntimeError, match="out of memory"):
+        executor.submit(fail).result(timeout=5)
+    assert executor.submit(lambda: 42).result(timeout=5) == 42
+
+
+def run_in_fork(fn):
+    """Runs `fn` in a forked child, returns True when it returned without raising"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            fn()
+            os._exit(0)
+        except BaseException:
+            os._exit(1)
+    _, status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(status) == 0
+
+
+def test_batcher_and_executor_restart_their_threads_after_a_fork():
+    batcher = MicroBatcher("test", RecordingBatchFn(), max_batch_size=8, max_wait=0.01)
+    executor = DeviceExecutor("cpu", workers=1)
+    # Started in the parent, their threads don't exist in the child
+    assert batcher.map([1]) == [2]
+    assert executor.submit(lambda: 1).result(timeout=5) == 1
+
+    def use_both():
+        assert batcher.submit(2).result(timeout=5) == 4
+        assert executor.submit(lambda: 2).result(timeout=5) == 2
+
+    assert run_in_fork(use_both)
+
+
+def test_long_inputs_are_not_batched_with_short_ones():
+    # 15 clips of 5 s and one recording of 30 min, at 16 kHz
+    lengths = [5 * 16000] * 7 + [30 * 60 * 16000] + [5 * 16000] * 8
+    groups = group_by_length(lengths, max_padded=8 * 60 * 16000)
+
+    assert sorted(position for group in groups for position in group) == list(range(16))
+    assert [7] in groups
+    assert all(len(group) == 15 for group in groups if group != [7])
+
+
+def test_length_groups_respect_the_padded_bound():
+    lengths = [10, 50, 20, 40, 30, 10]
+    groups = group_by_length(lengths, max_padded=100)
+
+    for group in groups:
+        assert len(group) * max(lengths[position] for position in group) <= 100
+    # Grouped in order of length
+    assert [[lengths[position] for position in group] for group in groups] == [[10, 10, 20], [30, 40], [50]]
+    assert group_by_length([], max_padded=100) == []
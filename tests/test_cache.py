@@ -0,0 +1,197 @@
+import time
+import threading
+
+import numpy as np
+
+from app.cache import EmbeddingCache, QueryCache, CachedIndex, NamespaceGenerations
+
+
+def test_embedding_cache_round_trip(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=1024 ** 2)
+    key = cache.key("digest", "model", "faces")
+
+    assert cache.get(key) is None
+    cache.put(key, [{"box": [1, 2, 3, 4], "embedding": [0.5, 0.25]}])
+    assert cache.get(key) == [{"box": [1, 2, 3, 4], "embedding": [0.5, 0.25]}]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=3000)
+    value = np.zeros(100, dtype=np.float32).tolist()
+
+    for i in range(10):
+        cache.put(f"key-{i}", value)
+        time.sleep(0.001)
+        # Keep the first entry recently used
+        assert cache.get("key-0") is not None
+
+    stats = cache.stats()
+    assert stats["evictions"] > 0
+    assert stats["size_bytes"] <= 3000
+    assert cache.get("key-0") is not None
+    assert cache.get("key-9") is not None
+    assert cache.get("key-1") is None
+
+
+def test_embedding_cache_bound_holds_across_instances(tmp_path):
+    # Separate processes each have their own instance on the same file
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = EmbeddingCache(path, max_bytes=3000), EmbeddingCache(path, max_bytes=3000)
+    value = np.zeros(100, dtype=np.float32).tolist()
+
+    for i in range(10):
+        (first if i % 2 else second).put(f"key-{i}", value)
+        time.sleep(0.001)
+
+    with first._connect() as conn:
+        stored = conn.execute("SELECT SUM(size) FROM embeddings").fetchone()[0]
+    assert stored <= 3000
+    assert first.stats()["size_bytes"] == stored
+    assert first.get("key-9") is not None
+
+
+def test_embedding_cache_disabled(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=1024, enabled=False)
+    cache.put("key", [1.0])
+    assert cache.get("key") is None
+
+
+def test_query_cache_quantizes_keys_and_expires():
+    cache = QueryCache(max_entries=10, ttl=0.05, quantization=0.01)
+    key = cache.key("index", "ns", [0.1, 0.2], 3)
+    assert cache.key("index", "ns", [0.1001, 0.2001], 3) == key
+    assert cache.key("index", "ns", [0.1, 0.2], 5) != key
+
+    cache.put(key, {"matches": []})
+    assert cache.get(key) == {"matches": []}
+    time.sleep(0.1)
+    assert cache.get(key) is None
+
+
+def test_query_cache_bounds_entries_and_invalidates_namespaces():
+    cache = QueryCache(max_entries=2, ttl=60, quantization=0.01)
+    keys = [cache.key("index", "ns", [float(i)], 3) for i in range(3)]
+    for key in keys:
+        cache.put(key, key)
+
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == keys[2]
+
+    other = cache.key("index", "other", [1.0], 3)
+    cache.put(other, "other")
+    cache.invalidate("index", "ns")
+    assert cache.get(keys[2]) is None
+    assert cache.get(other) == "other"
+
+
+class FakeIndex:
+    def __init__(self):
+        self.queries = 0
+
+    def query(self, namespace, vector, top_k, include_metadata=True):
+        self.queries += 1
+        return {"matches": [{"id": "a", "score": 1.0}]}
+
+    def upsert(self, vectors, namespace):
+        return {"upserted_count": len(vectors)}
+
+
+def test_cached_index_serves_repeats_and_invalidates_on_upsert():
+    fake = FakeIndex()
+    index = CachedIndex(fake, "index", QueryCache(max_entries=10, ttl=60, quantization=0.001))
+
+    index.query(namespace="ns", vector=[0.1, 0.2], top_k=3)
+    index.query(namespace="ns", vector=[0.1, 0.2], top_k=3)
+    assert fake.queries == 1
+
+    index.upsert(vectors=[{"id": "b", "values": [0.1, 0.2]}], namespace="ns")
+    index.query(namespace="ns", vector=[0.1, 0.2], top_k=3)
+    assert fake.queries == 2
+
+
+class SlowIndex(FakeIndex):
+    """Lets the test run an upsert while a query is in flight"""
+
+    def __init__(self, during_query):
+        super().__init__()
+        self.during_query = during_query
+
+    def query(self, namespace, vector, top_k, include_metadata=True):
+        result = super().query(namespace, vector, top_k, include_metadata)
+        if self.queries == 1:
+            self.during_query()
+        return result
+
+
+def test_query_finishing_after_an_upsert_is_not_served():
+    cache = QueryCache(max_entries=10, ttl=60, quantization=0.001)
+    writer = CachedIndex(FakeIndex(), "index", cache)
+    fake = SlowIndex(lambda: writer.upsert(vectors=[{"id": "b", "values": [0.1, 0.2]}], namespace="ns"))
+    index = CachedIndex(fake, "index", cache)
+
+    index.query(namespace="ns", vector=[0.1, 0.2], top_k=3)
+    index.query(namespace="ns", vector=[0.1, 0.2], top_k=3)
+    assert fake.queries == 2
+
+
+def test_upserts_invalidate_caches_sharing_the_generations(tmp_path):
+    # One cache per server process, all sharing the job store
+    path = str(tmp_path / "jobs.sqlite3")
+    reader_fake = FakeIndex()
+    reader = CachedIndex(reader_fake, "index", QueryCache(10, 60, 0.001, generations=NamespaceGenerations(path)))
+    writer = CachedIndex(FakeIndex(), "index", QueryCache(10, 60, 0.001, generations=NamespaceGenerations(path)))
+
+    reader.query(namespace="ns", vector=[0.1, 0.2], top_k=3)
+    reader.query(namespace="ns", vector=[0.1, 0.2], top_k=3)
+    assert reader_fake.queries == 1
+
+    writer.upsert(vectors=[{"id": "b", "values": [0.1, 0.2]}], namespace="ns")
+    reader.query(namespace="ns", vector=[0.1, 0.2], top_k=3)
+    assert reader_fake.queries == 2
+
+    writer.upsert(vectors=[{"id": "c", "values": [0.1, 0.2]}], namespace="other")
+    reader.query(namespace="ns", vector=[0.1, 0.2], top_k=3)
+    assert reader_fake.queries == 2
+
+
+def test_embedding_cache_lookups_from_many_threads(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=1024 ** 2)
+    cache.TOUCH_BATCH_SIZE = 16
+    for i in range(8):
+        cache.put(f"key-{i}", [float(i)])
+
+    failures = []
+
+    def lookups(offset):
+        for i in range(200):
+            key = f"key-{(i + offset) % 8}"
+            if cache.get(key) != [float((i + offset) % 8)]:
+                failures.append(key)
+
+    threads = [threading.Thread(target=lookups, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert cache.stats()["hits"] == 8 * 200
+
+
+def test_embedding_cache_writes_access_times_in_batches(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=1024 ** 2)
+    cache.TOUCH_BATCH_SIZE = 2
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+
+    def last_access(key):
+        with cache._connect() as conn:
+            return conn.execute("SELECT last_access FROM embeddings WHERE key = ?", (key,)).fetchone()[0]
+
+    stored = last_access("a")
+    time.sleep(0.01)
+    cache.get("a")
+    assert last_access("a") == stored
+    cache.get("b")
+    assert last_access("a") > stored
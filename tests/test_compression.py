@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from app.compression import (
+    PCAProjection, ProjectedIndex, encode_rows, decode_rows, normalize_rows, row_scores
+)
+
+
+def test_normalize_rows_leaves_zero_rows_alone():
+    rows = normalize_rows([[3.0, 4.0], [0.0, 0.0]])
+    assert np.allclose(rows, [[0.6, 0.8], [0.0, 0.0]])
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-7), ("float16", 1e-3), ("int8", 1e-2)])
+def test_encode_decode_round_trip(rng, dtype, tolerance):
+    values = normalize_rows(rng.standard_normal((20, 128)))
+    rows, scales = encode_rows(values, dtype)
+
+    assert rows.dtype == np.dtype(dtype)
+    assert (scales is not None) == (dtype == "int8")
+    assert np.max(np.abs(decode_rows(rows, scales) - values)) < tolerance
+
+    query = values[3]
+    assert np.argmax(row_scores(rows, query, scales)) == 3
+
+
+def test_encode_rows_rejects_unknown_dtype():
+    with pytest.raises(ValueError):
+        encode_rows(np.zeros((1, 4)), "float64")
+
+
+def test_pca_projection_save_load_round_trip(rng, tmp_path):
+    embeddings = rng.standard_normal((100, 32))
+    projection = PCAProjection.fit(embeddings, 8)
+    path = str(tmp_path / "pca.npz")
+    projection.save(path)
+    loaded = PCAProjection.load(path)
+
+    assert (loaded.input_dimension, loaded.dimension) == (32, 8)
+    projected = loaded.project(embeddings)
+    assert projected.shape == (100, 8)
+    assert np.allclose(np.linalg.norm(projected, axis=1), 1.0, atol=1e-5)
+    assert np.allclose(projected, projection.project(embeddings))
+
+
+def test_pca_projection_rejects_bad_shapes(rng):
+    with pytest.raises(ValueError):
+        PCAProjection.fit(rng.standard_normal((4, 32)), 8)
+    with pytest.raises(ValueError):
+        PCAProjection.fit(rng.standard_normal((100, 32)), 8).project(np.ones(16))
+
+
+class FakeIndex:
+    def __init__(self):
+        self.upserts = []
+        self.queries = []
+
+    def upsert(self, vectors, namespace):
+        self.upserts.append((vectors, namespace))
+
+    def query(self, namespace, vector, top_k, include_metadata=True):
+        self.queries.append((namespace, vector, top_k))
+        return {"matches": []}
+
+
+def test_projected_index_projects_upserts_and_queries(rng):
+    projection = PCAProjection.fit(rng.standard_normal((100, 32)), 8)
+    fake = FakeIndex()
+    index = ProjectedIndex(fake, projection)
+
+    vector = rng.standard_normal(32).tolist()
+    index.upsert(vectors=[{"id": "a", "values": vector, "metadata": {"k": 1}}], namespace="ns")
+    index.query(namespace="ns", vector=vector, top_k=3)
+
+    (upserted, namespace), = fake.upserts
+    assert namespace == "ns"
+    assert upserted[0]["id"] == "a" and upserted[0]["metadata"] == {"k": 1}
+    assert len(upserted[0]["values"]) == 8
+    assert len(fake.queries[0][1]) == 8
+    assert np.allclose(upserted[0]["values"], fake.queries[0][1])
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+# Needs the models, skipped where they are not installed
+pytest.importorskip("torch")
+pytest.importorskip("nemo")
+DeepFace = pytest.importorskip("deepface").DeepFace
+
+
+def test_batched_embeddings_match_deepface_represent(rng):
+    from app.utils import generate_embeddings_batch
+
+    crops = [rng.integers(0, 256, size=(120 + 10 * i, 100, 3), dtype=np.uint8) for i in range(3)]
+    batched = np.asarray(generate_embeddings_batch(crops))
+
+    for crop, embedding in zip(crops, batched):
+        # Like the crops, a numpy array passed to represent is flipped before the model sees it
+        expected = DeepFace.represent(
+            img_path=crop,
+            model_name="VGG-Face",
+            detector_backend="skip",
+            enforce_detection=False,
+            align=False,
+            normalization="raw"
+        )[0]["embedding"]
+        expected = np.asarray(expected) / np.linalg.norm(expected)
+        assert float(np.dot(embedding, expected)) > 0.999
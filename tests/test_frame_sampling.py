@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.config import Config
+from app.media import sample_frames, sample_frames_adaptive
+
+FPS = 25
+
+
+def write_video(path, frames):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), FPS, (64, 48))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+def flat(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+def moving_square(i):
+    frame = flat(40)
+    x = (i * 3) % 48
+    frame[10:30, x:x + 16] = 220
+    return frame
+
+
+@pytest.fixture(autouse=True)
+def adaptive_settings(monkeypatch):
+    for name, value in {
+        "FRAME_SAMPLE_INTERVAL": 0.5,
+        "FRAME_SAMPLE_MIN_INTERVAL": 0.25,
+        "FRAME_SAMPLE_MAX_INTERVAL": 2.0,
+        "SCENE_ANALYSIS_FPS": 8.0,
+        "SCENE_CUT_THRESHOLD": 0.3,
+        "MOTION_THRESHOLD": 0.02
+    }.items():
+        monkeypatch.setattr(Config, name, value)
+
+
+def time_stamps(samples):
+    return [time_stamp for _, time_stamp, _ in samples]
+
+
+def test_static_shots_back_off_to_the_max_interval(tmp_path):
+    path = write_video(tmp_path / "static.avi", [flat(128)] * (20 * FPS))
+    stamps = time_stamps(sample_frames_adaptive(path))
+
+    assert stamps[0] == 0
+    # 40 samples at the fixed interval, a handful once the interval has doubled up to the max
+    assert len(stamps) <= 15
+    gaps = np.diff(stamps)
+    assert np.all(np.diff(gaps[:3]) > 0)
+    assert gaps.max() <= Config.FRAME_SAMPLE_MAX_INTERVAL + 0.2
+
+
+def test_a_scene_cut_is_sampled_right_away(tmp_path):
+    path = write_video(tmp_path / "cut.avi", [flat(30)] * (6 * FPS) + [flat(220)] * (6 * FPS))
+    samples = list(sample_frames_adaptive(path))
+
+    after_cut = [time_stamp for time_stamp in time_stamps(samples) if time_stamp >= 6.0]
+    assert after_cut and after_cut[0] < 6.0 + 0.2
+    first = next(frame for _, time_stamp, frame in samples if time_stamp >= 6.0)
+    assert first.mean() > 150
+
+
+def test_moving_shots_keep_the_regular_interval(tmp_path):
+    path = write_video(tmp_path / "motion.avi", [moving_square(i) for i in range(10 * FPS)])
+    stamps = time_stamps(sample_frames_adaptive(path))
+
+    assert np.diff(stamps).max() <= Config.FRAME_SAMPLE_INTERVAL + 0.2
+    assert len(stamps) >= 10 / (Config.FRAME_SAMPLE_INTERVAL + 0.2)
+
+
+def test_fixed_interval_does_not_drift(tmp_path):
+    path = write_video(tmp_path / "static.avi", [flat(128)] * (20 * FPS))
+    stamps = time_stamps(sample_frames(path, interval_sec=0.5))
+
+    assert len(stamps) == 40
+    # Every sample is the first frame at or after its slot on the 0.5 s grid
+    for slot, time_stamp in enumerate(stamps):
+        assert 0.5 * slot <= time_stamp + 1e-6 < 0.5 * slot + 1 / FPS
+
+
+def test_interval_below_the_frame_period_samples_every_frame_once(tmp_path):
+    path = write_video(tmp_path / "static.avi", [flat(128)] * (2 * FPS))
+    frame_indices = [frame_index for frame_index, _, _ in sample_frames(path, interval_sec=0.01)]
+
+    assert frame_indices == list(range(2 * FPS))
+
+
+def test_frames_are_rgb(tmp_path):
+    frame = flat(0)
+    frame[:, :, 2] = 255  # red in BGR
+    path = write_video(tmp_path / "red.avi", [frame] * FPS)
+
+    _, _, sampled = next(sample_frames(path, interval_sec=0.5))
+    assert sampled[:, :, 0].mean() > 200 and sampled[:, :, 2].mean() < 50
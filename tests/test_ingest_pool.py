@@ -0,0 +1,116 @@
+import queue
+
+import pytest
+
+from app import ingest_pool
+from app.ingest_pool import ChunkStream, _TaskChunks, run_ingest_tasks
+
+
+class RecordingBuffer:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.vectors = []
+
+    @property
+    def upserted(self):
+        return len(self.vectors)
+
+    def add(self, vector, namespace):
+        if self.fail_after is not None and len(self.vectors) >= self.fail_after:
+            raise RuntimeError("upload failed")
+        self.vectors.append((vector, namespace))
+
+
+class RecordingProgress:
+    def __init__(self):
+        self.counters = {}
+        self.errors = []
+
+    def increment(self, key, amount=1):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, **counters):
+        self.counters.update(counters)
+
+    def add_error(self, message):
+        self.errors.append(message)
+
+
+# Module level, so the spawned workers can unpickle them
+def ingest_file(name, count, upsert_buffer, progress):
+    if name.startswith("broken"):
+        raise ValueError(f"cannot decode {name}")
+    for i in range(count):
+        upsert_buffer.add({"id": f"{name}-{i}"}, namespace="faces")
+    progress.increment("files_processed")
+    return name
+
+
+def test_in_process_tasks_report_failures_per_file(monkeypatch):
+    monkeypatch.setattr(ingest_pool, "pool_size", lambda: 1)
+    tasks = [(ingest_file, ("a", 3)), (ingest_file, ("broken", 1)), (ingest_file, ("b", 2))]
+    buffers = [RecordingBuffer() for _ in tasks]
+    progress = RecordingProgress()
+
+    results = dict(run_ingest_tasks(tasks, buffers, progress))
+    assert results[0] == "a" and results[2] == "b"
+    assert isinstance(results[1], ValueError)
+    assert [buffer.upserted for buffer in buffers] == [3, 0, 2]
+    assert progress.counters["files_processed"] == 2
+
+
+def test_chunks_are_streamed_while_the_file_runs():
+    results = queue.Queue()
+    stream = ChunkStream(results, "task", chunk_size=2)
+    buffer, progress = RecordingBuffer(), RecordingProgress()
+    chunks = _TaskChunks(buffer, progress)
+
+    stream.add({"id": 0}, "faces")
+    assert results.empty()
+    stream.increment("segments_processed")
+    stream.add({"id": 1}, "faces")
+    # A full chunk goes out right away, with the counters gathered so far
+    task_id, vectors, counters, errors, done = results.get_nowait()
+    assert (task_id, len(vectors), counters, done) == ("task", 2, {"segments_processed": 1}, False)
+    chunks.apply(vectors, counters, errors)
+    assert buffer.upserted == 2 and progress.counters["vectors_upserted"] == 2
+
+    stream.add({"id": 2}, "faces")
+    stream.add_error("frame 12 could not be read")
+    stream.flush(done=True)
+    _, vectors, counters, errors, done = results.get_nowait()
+    assert (len(vectors), errors, done) == (1, ["frame 12 could not be read"], True)
+    chunks.apply(vectors, counters, errors)
+    assert buffer.upserted == 3 and progress.errors == ["frame 12 could not be read"]
+
+
+def test_chunks_after_a_failed_add_are_dropped():
+    chunks = _TaskChunks(RecordingBuffer(fail_after=1), RecordingProgress())
+    chunks.apply([({"id": 0}, "faces"), ({"id": 1}, "faces")], {}, [])
+    assert isinstance(chunks.error, RuntimeError)
+
+    chunks.apply([({"id": 2}, "faces")], {"segments_processed": 1}, [])
+    assert chunks.upsert_buffer.upserted == 1
+    assert chunks.progress.counters == {}
+
+
+def test_pool_streams_vectors_of_every_file(monkeypatch):
+    # The workers load the model stack when they start
+    pytest.importorskip("torch")
+    # Spawned workers read their settings from the environment
+    monkeypatch.setenv("PRELOAD_MODELS", "false")
+    monkeypatch.setenv("UPSERT_BATCH_SIZE", "4")
+    monkeypatch.setattr(ingest_pool, "pool_size", lambda: 2)
+
+    tasks = [(ingest_file, ("a", 10)), (ingest_file, ("broken", 1)), (ingest_file, ("b", 7))]
+    buffers = [RecordingBuffer() for _ in tasks]
+    progress = RecordingProgress()
+    try:
+        results = dict(run_ingest_tasks(tasks, buffers, progress))
+    finally:
+        ingest_pool._discard_pool(ingest_pool.get_ingest_pool())
+
+    assert results[0] == "a" and results[2] == "b"
+    assert isinstance(results[1], ValueError)
+    assert [buffer.upserted for buffer in buffers] == [10, 0, 7]
+    assert progress.counters["files_processed"] == 2
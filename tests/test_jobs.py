@@ -0,0 +1,96 @@
+import time
+import fcntl
+
+import pytest
+
+from app.config import Config
+from app.jobs import JobQueue
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(Config, "JOB_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(Config, "JOB_PROGRESS_INTERVAL", 0.0)
+
+
+def wait_for(queue, job_id, statuses, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} is still {queue.get(job_id)['status']}")
+
+
+def test_claims_the_oldest_job_once(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0)
+    first = queue.submit("kind", {"n": 1})
+    time.sleep(0.01)
+    second = queue.submit("kind", {"n": 2})
+
+    # A second instance on the same store, like another server process
+    other = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0)
+    assert queue._claim() == (first, "kind", {"n": 1})
+    assert other._claim() == (second, "kind", {"n": 2})
+    assert queue._claim() is None
+    assert queue.get(first)["status"] == "running"
+
+
+def test_runs_jobs_and_stores_results_and_errors(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=2)
+
+    def handler(job_id, payload, progress):
+        progress.increment("files_processed")
+        if payload["fail"]:
+            raise ValueError("broken file")
+        return {"ok": True}
+
+    queue.register("kind", handler)
+    queue.start()
+    completed = queue.submit("kind", {"fail": False})
+    failed = queue.submit("kind", {"fail": True})
+
+    job = wait_for(queue, completed, {"completed", "failed"})
+    assert job["status"] == "completed"
+    assert job["result"] == {"ok": True}
+    assert job["progress"]["files_processed"] == 1
+
+    job = wait_for(queue, failed, {"completed", "failed"})
+    assert job["status"] == "failed"
+    assert job["error"] == "broken file"
+
+
+def test_requeues_running_jobs_after_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    stopped = JobQueue(path, workers=0)
+    job_id = stopped.submit("kind", {"n": 1})
+    # Claimed by a process that then exited
+    assert stopped._claim()[0] == job_id
+
+    restarted = JobQueue(path, workers=1)
+    restarted.register("kind", lambda job_id, payload, progress: payload)
+    restarted.start()
+
+    job = wait_for(restarted, job_id, {"completed", "failed"})
+    assert job["status"] == "completed"
+    assert job["result"] == {"n": 1}
+
+
+def test_only_the_lock_holder_runs_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(path, workers=1)
+    queue.register("kind", lambda job_id, payload, progress: payload)
+
+    # Another process leads the store
+    with open(f"{path}.lock", "w") as leader:
+        fcntl.flock(leader, fcntl.LOCK_EX)
+        queue.start()
+        job_id = queue.submit("kind", {"n": 1})
+        time.sleep(0.3)
+        assert queue.get(job_id)["status"] == "queued"
+        assert queue._threads == []
+
+    # The leader exited, this process takes over
+    job = wait_for(queue, job_id, {"completed", "failed"})
+    assert job["status"] == "completed"
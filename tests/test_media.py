@@ -0,0 +1,64 @@
+import shutil
+import wave
+
+import numpy as np
+import pytest
+
+from app.config import Config
+from app.media import window_samples, iter_audio_windows, is_voiced
+
+
+def chunked(samples, size):
+    return (samples[i:i + size] for i in range(0, len(samples), size))
+
+
+def test_windows_overlap_by_the_hop():
+    samples = np.arange(100, dtype=np.float32)
+    windows = list(window_samples(chunked(samples, 7), window=40, hop=20, min_segment=10))
+
+    assert [start for start, _ in windows] == [0, 20, 40, 60]
+    for start, window in windows:
+        np.testing.assert_array_equal(window, samples[start:start + 40])
+
+
+def test_trailing_samples_are_kept_only_when_uncovered_and_long_enough():
+    # 0-40 and 20-60 cover up to 60, the 10 trailing samples 60-70 are uncovered
+    windows = list(window_samples(chunked(np.zeros(70, dtype=np.float32), 16), window=40, hop=20, min_segment=10))
+    assert [(start, len(window)) for start, window in windows] == [(0, 40), (20, 40), (40, 30)]
+
+    windows = list(window_samples(chunked(np.zeros(70, dtype=np.float32), 16), window=40, hop=20, min_segment=31))
+    assert [(start, len(window)) for start, window in windows] == [(0, 40), (20, 40)]
+
+    # Shorter than a window: one segment if long enough, nothing otherwise
+    assert [(start, len(window)) for start, window in window_samples([np.zeros(15, dtype=np.float32)], 40, 20, 10)] == [(0, 15)]
+    assert list(window_samples([np.zeros(5, dtype=np.float32)], 40, 20, 10)) == []
+
+
+def test_is_voiced_follows_the_share_of_loud_frames(monkeypatch):
+    monkeypatch.setattr(Config, "AUDIO_VAD_THRESHOLD_DB", -40.0)
+    monkeypatch.setattr(Config, "AUDIO_VAD_MIN_VOICED_RATIO", 0.3)
+    rate = 16000
+    tone = 0.5 * np.sin(2 * np.pi * 220 * np.arange(rate) / rate).astype(np.float32)
+    silence = np.zeros(rate, dtype=np.float32)
+
+    assert is_voiced(tone)
+    assert not is_voiced(silence)
+    assert not is_voiced(np.concatenate([tone[:rate // 5], silence[:4 * rate // 5]]))
+    assert is_voiced(np.concatenate([tone[:rate // 2], silence[:rate // 2]]))
+    # Shorter than one 30 ms frame
+    assert not is_voiced(tone[:100])
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs the ffmpeg binary")
+def test_audio_windows_of_a_file(tmp_path):
+    rate = 16000
+    path = str(tmp_path / "clip.wav")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((np.sin(np.arange(int(7.5 * rate)) / 10) * 10000).astype(np.int16).tobytes())
+
+    windows = list(iter_audio_windows(path, window_sec=3.0, hop_sec=1.5))
+    assert [(start, end) for start, end, _ in windows] == [(0.0, 3.0), (1.5, 4.5), (3.0, 6.0), (4.5, 7.5)]
+    assert all(len(samples) == 3 * rate for _, _, samples in windows)
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from app.pipeline import Pipeline, Stage, batched
+
+
+def test_batched_groups_items():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
+
+
+def test_pipeline_runs_every_item_through_every_stage():
+    results = []
+    lock = threading.Lock()
+
+    def collect(item):
+        with lock:
+            results.append(item)
+
+    pipeline = Pipeline("test", [
+        Stage("double", lambda item: [item * 2], workers=2, queue_size=2),
+        Stage("split", lambda item: [item, item + 1], workers=3, queue_size=2),
+        Stage("collect", collect, queue_size=2)
+    ])
+    stats = pipeline.run(iter(range(50)))
+
+    assert sorted(results) == sorted([2 * i for i in range(50)] + [2 * i + 1 for i in range(50)])
+    assert stats["double"]["items"] == 50
+    assert stats["collect"]["items"] == 100
+    assert pipeline.source_items == 50
+
+
+def test_pipeline_reraises_the_first_stage_error():
+    def fail_on_five(item):
+        if item == 5:
+            raise ValueError("bad item")
+        return [item]
+
+    pipeline = Pipeline("test", [Stage("check", fail_on_five, queue_size=1), Stage("sink", lambda item: None)])
+    with pytest.raises(ValueError, match="bad item"):
+        pipeline.run(iter(range(1000)))
+
+
+def test_pipeline_reraises_a_source_error():
+    def source():
+        yield 1
+        raise RuntimeError("decode failed")
+
+    with pytest.raises(RuntimeError, match="decode failed"):
+        Pipeline("test", [Stage("sink", lambda item: None)]).run(source())
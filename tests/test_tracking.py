@@ -0,0 +1,78 @@
+import numpy as np
+
+from app.tracking import FaceTracker, box_iou
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def make_tracker(**kwargs):
+    settings = dict(
+        iou_threshold=0.3,
+        match_similarity=0.5,
+        reid_similarity=0.8,
+        max_gap_sec=3.0,
+        max_representatives=3,
+        representative_similarity=0.85
+    )
+    settings.update(kwargs)
+    return FaceTracker(**settings)
+
+
+def test_box_iou():
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert box_iou([0, 0, 10, 10], [20, 20, 30, 30]) == 0.0
+    assert abs(box_iou([0, 0, 10, 10], [5, 0, 15, 10]) - 1 / 3) < 1e-9
+
+
+def test_overlapping_similar_faces_form_one_track(rng):
+    identity = rng.standard_normal(64)
+    tracker = make_tracker()
+    for sequence in range(5):
+        embedding = unit(identity + 0.05 * rng.standard_normal(64))
+        tracker.add_frame(sequence, sequence * 0.5, [{"box": [10 + sequence, 10, 60 + sequence, 60], "embedding": embedding}])
+
+    tracks = tracker.finish()
+    assert len(tracks) == 1
+    assert tracks[0].detections == 5
+    assert tracks[0].first_seen == 0.0 and tracks[0].last_seen == 2.0
+    assert tracker.detections == 5
+
+
+def test_different_faces_get_separate_tracks(rng):
+    tracker = make_tracker()
+    first, second = unit(rng.standard_normal(64)), unit(rng.standard_normal(64))
+    for sequence in range(3):
+        tracker.add_frame(sequence, float(sequence), [
+            {"box": [0, 0, 50, 50], "embedding": first},
+            {"box": [200, 0, 250, 50], "embedding": second}
+        ])
+    assert len(tracker.finish()) == 2
+
+
+def test_tracks_finish_after_the_gap_and_frames_are_reordered(rng):
+    embedding = unit(rng.standard_normal(64))
+    face = {"box": [0, 0, 50, 50], "embedding": embedding}
+    tracker = make_tracker(max_gap_sec=1.0)
+
+    # Frame 1 arrives before frame 0 and is held until frame 0 is in
+    assert tracker.add_frame(1, 0.5, [face]) == []
+    assert tracker.add_frame(0, 0.0, [face]) == []
+
+    finished = tracker.add_frame(2, 5.0, [face])
+    assert len(finished) == 1
+    assert finished[0].detections == 2
+    assert len(tracker.finish()) == 1
+    assert tracker.tracks == 2
+
+
+def test_representatives_are_capped(rng):
+    tracker = make_tracker(match_similarity=-1.0, max_representatives=2, representative_similarity=0.99)
+    for sequence in range(5):
+        tracker.add_frame(sequence, float(sequence), [{"box": [0, 0, 50, 50], "embedding": unit(rng.standard_normal(64))}])
+
+    tracks = tracker.finish()
+    assert len(tracks) == 1
+    assert len(tracks[0].representatives) == 2
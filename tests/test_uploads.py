@@ -0,0 +1,98 @@
+import io
+import os
+import threading
+from concurrent.futures import Future
+
+import pytest
+from flask import Flask, request, jsonify
+
+from app.config import Config
+from app.uploads import SpooledUpload, StreamingRequest, save_upload, remove_uploads
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    spool_path = tmp_path / "incoming"
+    monkeypatch.setattr(Config, "UPLOAD_SPOOL_MAX_BYTES", 1024)
+    monkeypatch.setattr(Config, "UPLOAD_SPOOL_PATH", str(spool_path))
+    return spool_path
+
+
+@pytest.fixture
+def client(tmp_path, spool):
+    app = Flask(__name__)
+    app.request_class = StreamingRequest
+
+    @app.route("/upload", methods=["POST"])
+    def upload():
+        file = request.files["file"]
+        spilled = file.stream.path is not None
+        if request.form.get("save") == "true":
+            save_upload(file, str(tmp_path / file.filename))
+        return jsonify({"spilled": spilled, "spool": os.listdir(spool) if spool.exists() else []})
+
+    return app.test_client()
+
+
+def post(client, name, data, save=True):
+    return client.post(
+        "/upload",
+        data={"file": (io.BytesIO(data), name), "save": "true" if save else "false"},
+        content_type="multipart/form-data"
+    ).get_json()
+
+
+def test_small_uploads_stay_in_memory(client, spool, tmp_path):
+    result = post(client, "small.bin", b"x" * 100)
+
+    assert result == {"spilled": False, "spool": []}
+    assert (tmp_path / "small.bin").read_bytes() == b"x" * 100
+
+
+def test_large_uploads_are_spilled_once_and_renamed(client, spool, tmp_path):
+    data = os.urandom(10_000)
+    result = post(client, "large.bin", data)
+
+    assert result["spilled"] is True
+    # The spill file was renamed into place, nothing is left to copy or remove
+    assert result["spool"] == []
+    assert (tmp_path / "large.bin").read_bytes() == data
+
+
+def test_unclaimed_spill_files_are_removed(client, spool):
+    result = post(client, "large.bin", os.urandom(10_000), save=False)
+
+    assert result["spilled"] is True
+    assert len(result["spool"]) == 1
+    assert os.listdir(spool) == []
+
+
+def test_spooled_upload_keeps_the_position_across_the_rollover(tmp_path):
+    upload = SpooledUpload(max_size=8, directory=str(tmp_path))
+    upload.write(b"abcdef")
+    upload.write(b"ghijkl")
+    assert upload.path is not None and upload.tell() == 12
+
+    upload.seek(0)
+    assert upload.read() == b"abcdefghijkl"
+    path = upload.path
+    upload.close()
+    assert not os.path.exists(path)
+
+
+def test_remove_uploads_waits_for_pending_transfers(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "KEEP_UPLOADS", False)
+    directory = tmp_path / "job"
+    directory.mkdir()
+    (directory / "file.bin").write_bytes(b"data")
+
+    transfer = Future()
+    threading.Timer(0.1, transfer.set_result, ["s3://bucket/file.bin"]).start()
+    remove_uploads(str(directory), [transfer])
+    assert transfer.done()
+    assert not directory.exists()
+
+    monkeypatch.setattr(Config, "KEEP_UPLOADS", True)
+    directory.mkdir()
+    remove_uploads(str(directory))
+    assert directory.exists()
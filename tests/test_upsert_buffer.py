@@ -0,0 +1,142 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from app.upsert_buffer import UpsertBuffer, UploadGate
+
+
+class FakeIndex:
+    def __init__(self, failing_namespaces=()):
+        self.failing_namespaces = set(failing_namespaces)
+        self.upserted = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors, namespace):
+        if namespace in self.failing_namespaces:
+            raise ConnectionError("index unavailable")
+        with self._lock:
+            self.upserted.setdefault(namespace, []).extend(vector["id"] for vector in vectors)
+
+
+def vectors(count, prefix="v"):
+    return [{"id": f"{prefix}{i}", "values": [float(i)]} for i in range(count)]
+
+
+def test_upserts_in_batches_and_flushes_the_rest_on_close():
+    index = FakeIndex()
+    with UpsertBuffer(index, batch_size=10, flush_interval=60, parallelism=2) as buffer:
+        for vector in vectors(25):
+            buffer.add(vector, namespace="ns")
+
+    assert sorted(index.upserted["ns"]) == sorted(f"v{i}" for i in range(25))
+    assert buffer.upserted == 25
+    assert buffer.failures == []
+
+
+def test_failed_batches_are_reported_not_raised():
+    index = FakeIndex(failing_namespaces={"broken"})
+    with UpsertBuffer(index, batch_size=5, flush_interval=60, parallelism=2) as buffer:
+        for vector in vectors(7, "ok"):
+            buffer.add(vector, namespace="ns")
+        for vector in vectors(7, "bad"):
+            buffer.add(vector, namespace="broken")
+
+    assert buffer.upserted == 7
+    assert sorted(index.upserted["ns"]) == sorted(f"ok{i}" for i in range(7))
+    assert {failure["namespace"] for failure in buffer.failures} == {"broken"}
+    assert sorted(vector_id for failure in buffer.failures for vector_id in failure["ids"]) == sorted(f"bad{i}" for i in range(7))
+    assert "index unavailable" in buffer.failures[0]["error"]
+
+
+def test_periodic_flush_sends_partial_batches():
+    index = FakeIndex()
+    buffer = UpsertBuffer(index, batch_size=100, flush_interval=0.05, parallelism=1)
+    try:
+        buffer.add(vectors(1)[0], namespace="ns")
+        for _ in range(100):
+            if index.upserted.get("ns"):
+                break
+            threading.Event().wait(0.02)
+        assert index.upserted.get("ns") == ["v0"]
+    finally:
+        buffer.close()
+
+
+def test_gate_holds_vectors_until_the_upload_succeeds():
+    index = FakeIndex()
+    upload = Future()
+    with UpsertBuffer(index, batch_size=1, flush_interval=60, parallelism=1) as buffer:
+        gate = UploadGate(buffer, upload)
+        for vector in vectors(3):
+            gate.add(vector, namespace="ns")
+        assert buffer.upserted == 0
+
+        upload.set_result("s3://bucket/file")
+        assert gate.release() == "s3://bucket/file"
+        gate.add(vectors(1, "late")[0], namespace="ns")
+
+    assert sorted(index.upserted["ns"]) == ["late0", "v0", "v1", "v2"]
+
+
+def test_gate_drops_vectors_of_a_failed_upload():
+    index = FakeIndex()
+    upload = Future()
+    with UpsertBuffer(index, batch_size=1, flush_interval=60, parallelism=1) as buffer:
+        gate = UploadGate(buffer, upload)
+        for vector in vectors(3):
+            gate.add(vector, namespace="ns")
+
+        upload.set_exception(OSError("upload failed"))
+        with pytest.raises(OSError):
+            gate.release()
+        with pytest.raises(OSError):
+            gate.add(vectors(1, "late")[0], namespace="ns")
+
+    assert index.upserted == {}
+    assert buffer.upserted == 0
+
+
+class SlowIndex(FakeIndex):
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.release = threading.Event()
+
+    def upsert(self, vectors, namespace):
+        with self._lock:
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        self.release.wait()
+        with self._lock:
+            self.in_flight -= 1
+        super().upsert(vectors, namespace)
+
+
+def test_add_blocks_while_too_many_batches_are_in_flight():
+    index = SlowIndex()
+    buffer = UpsertBuffer(index, batch_size=1, flush_interval=60, parallelism=2)
+    added = []
+
+    def produce():
+        for vector in vectors(20):
+            buffer.add(vector, namespace="ns")
+            added.append(vector["id"])
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    producer.join(timeout=0.5)
+
+    # Two batches are sent, two more are queued, the fifth add waits for a slot
+    assert producer.is_alive()
+    assert len(added) == 4
+    assert index.most_in_flight == 2
+
+    index.release.set()
+    producer.join(timeout=5)
+    buffer.close()
+
+    assert not producer.is_alive()
+    assert buffer.upserted == 20
+    assert index.most_in_flight == 2
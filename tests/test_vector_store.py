@@ -0,0 +1,164 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from app.config import Config
+from app.vector_store import LocalVectorStore, VectorStore
+
+
+def records(values, prefix="v"):
+    return [{"id": f"{prefix}{i}", "values": list(map(float, row)), "metadata": {"i": i}} for i, row in enumerate(values)]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_query_returns_nearest_with_metadata(tmp_path, rng, monkeypatch, dtype):
+    monkeypatch.setattr(Config, "LOCAL_VECTOR_DTYPE", dtype)
+    values = rng.standard_normal((50, 16))
+    store = LocalVectorStore(str(tmp_path), "index")
+    store.upsert(records(values), "ns")
+
+    matches = store.query("ns", values[7].tolist(), top_k=3)["matches"]
+    assert len(matches) == 3
+    assert matches[0]["id"] == "v7"
+    assert matches[0]["metadata"] == {"i": 7}
+    assert matches[0]["score"] == pytest.approx(1.0, abs=1e-2)
+    assert [match["score"] for match in matches] == sorted((match["score"] for match in matches), reverse=True)
+
+
+def test_upsert_overwrites_existing_ids(tmp_path, rng):
+    store = LocalVectorStore(str(tmp_path), "index")
+    values = rng.standard_normal((3, 8))
+    store.upsert(records(values), "ns")
+    store.upsert([{"id": "v0", "values": values[2].tolist(), "metadata": {"i": "moved"}}], "ns")
+
+    namespace = store._namespace("ns")
+    assert namespace.count == 3
+    matches = store.query("ns", values[2].tolist(), top_k=2)["matches"]
+    assert {match["id"] for match in matches} == {"v0", "v2"}
+    assert {match["metadata"]["i"] for match in matches} == {"moved", 2}
+
+
+def test_dimension_mismatch_is_rejected(tmp_path, rng):
+    store = LocalVectorStore(str(tmp_path), "index")
+    store.upsert(records(rng.standard_normal((2, 8))), "ns")
+    with pytest.raises(ValueError):
+        store.upsert(records(rng.standard_normal((1, 4)), "w"), "ns")
+
+
+def test_namespaces_are_separate_and_persisted(tmp_path, rng):
+    values = rng.standard_normal((20, 8))
+    store = LocalVectorStore(str(tmp_path), "index")
+    store.upsert(records(values[:10], "a"), "first")
+    store.upsert(records(values[10:], "b"), "second")
+    store.save()
+
+    reopened = LocalVectorStore(str(tmp_path), "index")
+    assert reopened.query("first", values[3].tolist(), top_k=1)["matches"][0]["id"] == "a3"
+    assert reopened.query("second", values[13].tolist(), top_k=1)["matches"][0]["id"] == "b3"
+    assert reopened.query("empty", values[0].tolist(), top_k=1) == {"matches": []}
+
+
+def test_exact_search_scans_in_chunks(tmp_path, rng, monkeypatch):
+    monkeypatch.setattr(Config, "LOCAL_SEARCH_CHUNK_ROWS", 7)
+    values = rng.standard_normal((100, 8))
+    store = LocalVectorStore(str(tmp_path), "index")
+    store.upsert(records(values), "ns")
+
+    scores = (values / np.linalg.norm(values, axis=1, keepdims=True)) @ (values[42] / np.linalg.norm(values[42]))
+    expected = [f"v{i}" for i in np.argsort(-scores)[:5]]
+    assert [match["id"] for match in store.query("ns", values[42].tolist(), top_k=5)["matches"]] == expected
+
+
+def test_hnsw_index_is_rebuilt_from_the_embeddings_on_disk(tmp_path, rng, monkeypatch):
+    pytest.importorskip("hnswlib")
+    values = rng.standard_normal((200, 16))
+    LocalVectorStore(str(tmp_path), "index").upsert(records(values), "ns")
+
+    monkeypatch.setattr(Config, "LOCAL_INDEX_TYPE", "hnsw")
+    store = LocalVectorStore(str(tmp_path), "index")
+    assert store._namespace("ns")._hnsw is not None
+    assert store.query("ns", values[17].tolist(), top_k=1)["matches"][0]["id"] == "v17"
+
+
+def test_two_instances_see_each_others_writes(tmp_path, rng):
+    values = rng.standard_normal((3, 8))
+    a, b, c = ({"id": name, "values": row.tolist(), "metadata": {"name": name}} for name, row in zip("abc", values))
+
+    writer = LocalVectorStore(str(tmp_path), "index")
+    writer.upsert([a], "ns")
+    reader = LocalVectorStore(str(tmp_path), "index")
+    assert reader.query("ns", a["values"], top_k=1)["matches"][0]["id"] == "a"
+
+    writer.upsert([b], "ns")
+    assert reader.query("ns", b["values"], top_k=1)["matches"][0]["id"] == "b"
+
+    # The reader must append after b instead of reusing its row
+    reader.upsert([c], "ns")
+    fresh = LocalVectorStore(str(tmp_path), "index")
+    for vector in (a, b, c):
+        match = fresh.query("ns", vector["values"], top_k=1)["matches"][0]
+        assert match["id"] == vector["id"]
+        assert match["metadata"] == {"name": vector["id"]}
+    assert fresh._namespace("ns").count == 3
+
+    # Overwrites by the other instance are visible too
+    writer.upsert([{"id": "a", "values": values[2].tolist(), "metadata": {"name": "a2"}}], "ns")
+    matches = reader.query("ns", values[2].tolist(), top_k=2)["matches"]
+    assert {match["id"] for match in matches} == {"a", "c"}
+
+
+def test_two_instances_grow_the_files(tmp_path, rng):
+    values = rng.standard_normal((3000, 8))
+    first = LocalVectorStore(str(tmp_path), "index")
+    second = LocalVectorStore(str(tmp_path), "index")
+    first.upsert(records(values[:10], "a"), "ns")
+    # Past the initial capacity, the first instance must remap before searching
+    second.upsert(records(values[10:], "b"), "ns")
+
+    assert first.query("ns", values[2500].tolist(), top_k=1)["matches"][0]["id"] == "b2490"
+    assert first._namespace("ns").count == 3000
+
+
+def test_two_instances_with_hnsw(tmp_path, rng, monkeypatch):
+    pytest.importorskip("hnswlib")
+    monkeypatch.setattr(Config, "LOCAL_INDEX_TYPE", "hnsw")
+    values = rng.standard_normal((100, 8))
+    first = LocalVectorStore(str(tmp_path), "index")
+    second = LocalVectorStore(str(tmp_path), "index")
+    first.upsert(records(values[:50], "a"), "ns")
+    second.upsert(records(values[50:], "b"), "ns")
+
+    assert first.query("ns", values[70].tolist(), top_k=1)["matches"][0]["id"] == "b20"
+    assert second.query("ns", values[20].tolist(), top_k=1)["matches"][0]["id"] == "a20"
+
+
+def _upsert_from_process(root, prefix, values):
+    store = LocalVectorStore(root, "index")
+    for start in range(0, len(values), 5):
+        store.upsert(records(values[start:start + 5], f"{prefix}{start}-"), "ns")
+
+
+def test_concurrent_processes_do_not_overwrite_each_other(tmp_path, rng):
+    context = multiprocessing.get_context("fork")
+    values = rng.standard_normal((4, 100, 8))
+    processes = [
+        context.Process(target=_upsert_from_process, args=(str(tmp_path), f"p{i}-", values[i]))
+        for i in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    store = LocalVectorStore(str(tmp_path), "index")
+    assert store._namespace("ns").count == 400
+    for i in range(4):
+        match = store.query("ns", values[i][37].tolist(), top_k=1)["matches"][0]
+        assert match["id"] == f"p{i}-35-2"
+
+
+def test_vector_store_is_abstract():
+    with pytest.raises(TypeError):
+        VectorStore()
@@ -0,0 +1,6 @@
+from app import create_app
+
+# Production entry point: `gunicorn -c gunicorn.conf.py wsgi:app`.
+# Kept apart from run.py, the spawned ingest workers re-import `__main__`
+# and must not build the app.
+app = create_app()